@@ -0,0 +1,50 @@
+"""Benchmark of aggregating a metric across many runs, versus a loop over
+runs (and steps) in Python.
+
+Run with `python benchmarks/bench_aggregate.py`.
+"""
+
+import time
+
+import numpy as np
+
+from thatch.track.aggregate import aggregate_metrics
+
+N_RUNS = 2_000
+N_STEPS = 1_000
+
+
+def loop_aggregate(metrics):
+    by_step: dict[int, list[float]] = {}
+    for steps, values in metrics:
+        for step, value in zip(steps.tolist(), values.tolist()):
+            by_step.setdefault(step, []).append(value)
+    return {
+        step: (np.mean(v), np.std(v), np.quantile(v, [0.05, 0.95]))
+        for step, v in sorted(by_step.items())
+    }
+
+
+def main():
+    rng = np.random.default_rng(0)
+    metrics = []
+    for _ in range(N_RUNS):
+        # runs log at slightly different steps, and some stop early
+        steps = np.arange(0, rng.integers(N_STEPS // 2, N_STEPS), rng.integers(1, 3))
+        metrics.append((steps, rng.normal(size=len(steps))))
+    aggr = ['mean', 'std', 'q5', 'q95']
+
+    for align in ['exact', 'interpolate']:
+        start = time.perf_counter()
+        aggregate_metrics(metrics, aggr, align=align)
+        t = time.perf_counter() - start
+        print(f'{N_RUNS} runs, align={align:<11}: {t * 1e3:8.1f} ms')
+
+    start = time.perf_counter()
+    loop_aggregate(metrics)
+    t = time.perf_counter() - start
+    print(f'{N_RUNS} runs, python loop      : {t * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
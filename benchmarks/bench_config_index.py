@@ -0,0 +1,55 @@
+"""Benchmark of config lookups for deep (depth 12) and wide (10k keys) configs.
+
+Compares `index_dots` on a plain nested dict against `read_config`, which goes
+through the flat index of `GLOBAL_CONFIG`, and times `flatten_dict`/
+`expand_dots` on the same configs.
+
+Run with `python benchmarks/bench_config_index.py`.
+"""
+
+import timeit
+
+from thatch.config import configure, read_config
+from thatch.config.util import expand_dots, flatten_dict, index_dots
+
+N = 100_000
+
+
+def deep_config(depth: int) -> tuple[dict, str]:
+    path = '.'.join(f'level{i}' for i in range(depth))
+    return expand_dots({path: 1, 'other': 2}), path
+
+
+def wide_config(width: int) -> tuple[dict, str]:
+    config = {f'group{i}': {'value': i, 'name': str(i)} for i in range(width)}
+    return config, f'group{width // 2}.value'
+
+
+def per_call(stmt, number: int = N) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number
+
+
+def main():
+    for name, (config, path) in [
+        ('deep (12)', deep_config(12)),
+        ('wide (10k)', wide_config(10_000)),
+    ]:
+        t_dict = per_call(lambda config=config, path=path: index_dots(config, path))
+        with configure(config):
+            read_config(path)
+            t_stack = per_call(lambda path=path: read_config(path))
+        flat = dict(flatten_dict(config))
+        t_flatten = per_call(
+            lambda config=config: list(flatten_dict(config)), number=20
+        )
+        t_expand = per_call(lambda flat=flat: expand_dots(flat), number=20)
+
+        print(f'{name}:')
+        print(f'  index_dots on dict       {t_dict * 1e9:10.1f} ns')
+        print(f'  read_config (flat index) {t_stack * 1e9:10.1f} ns')
+        print(f'  flatten_dict             {t_flatten * 1e6:10.1f} us')
+        print(f'  expand_dots              {t_expand * 1e6:10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Microbenchmark for the per-call overhead of `@configurable`.
+
+Run with `python benchmarks/bench_configurable.py`.
+"""
+
+import timeit
+
+from thatch.config import configurable, configure, profile
+
+N = 200_000
+
+
+def bare(a, *, x=1, y=2, z=3):
+    return a + x + y + z
+
+
+@configurable()
+def wrapped(a, *, x=1, y=2, z=3):
+    return a + x + y + z
+
+
+def report(name: str, stmt, baseline: float | None = None) -> float:
+    t = min(timeit.repeat(stmt, number=N, repeat=5)) / N
+    line = f'{name:<40} {t * 1e9:8.1f} ns/call'
+    if baseline is not None:
+        line += f'  (+{(t - baseline) * 1e9:.1f} ns overhead)'
+    print(line)
+    return t
+
+
+def main():
+    base = report('bare function', lambda: bare(1, y=5))
+    report('@configurable, empty config', lambda: wrapped(1, y=5), base)
+    with configure({'x': 10, 'wrapped': {'z': 30}, 'other': {'w': 0}}):
+        report('@configurable, configured', lambda: wrapped(1, y=5), base)
+        with profile.profiling():
+            report('@configurable, profiling', lambda: wrapped(1, y=5), base)
+
+
+if __name__ == '__main__':
+    main()
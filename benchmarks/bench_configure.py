@@ -0,0 +1,29 @@
+"""Benchmark of entering/exiting nested `configure` blocks as the size of the
+outer config grows. With the layered `ConfigStack`, this should stay flat.
+
+Run with `python benchmarks/bench_configure.py`.
+"""
+
+import timeit
+
+from thatch.config import configure
+
+N = 20_000
+
+
+def main():
+    for size in [10, 1_000, 100_000]:
+        base = configure({f'group{i}': {'value': i} for i in range(size)})
+        step = configure(eval_step=0)
+
+        def enter_exit(step=step):
+            with step:
+                pass
+
+        with base:
+            t = min(timeit.repeat(enter_exit, number=N, repeat=5)) / N
+        print(f'config size {size:>7}: {t * 1e9:8.1f} ns per nested enter+exit')
+
+
+if __name__ == '__main__':
+    main()
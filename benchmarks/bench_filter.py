@@ -0,0 +1,45 @@
+"""Benchmark of `DirRoot.filter`/`group_by` on config params, using the
+`run_params` index versus checking each run's `config.json` in Python.
+
+Run with `python benchmarks/bench_filter.py`.
+"""
+
+import tempfile
+import time
+
+from thatch.track import DirRoot, Param, ThatchRoot, ThatchRun
+
+N_RUNS = 5_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        root = DirRoot(path)
+        for i in range(N_RUNS):
+            config = {'dropout': (i % 10) / 10, 'optim': {'lr': 10 ** -(i % 4)}}
+            ThatchRun(root=root, config_source=config).save()
+
+        condition = (Param('dropout') > 0.75) & (Param('optim.lr') == 0.01)
+        uuids = root.uuids()
+
+        start = time.perf_counter()
+        n_sql = len(root.filter(condition))
+        t_sql = time.perf_counter() - start
+
+        start = time.perf_counter()
+        n_py = len(ThatchRoot.select(root, condition, uuids))
+        t_py = time.perf_counter() - start
+        assert n_sql == n_py
+
+        start = time.perf_counter()
+        root.group_by(('dropout', 'optim.lr'))
+        t_group = time.perf_counter() - start
+
+        print(f'{N_RUNS} runs, {n_sql} matching')
+        print(f'filter (sql):    {t_sql * 1e3:8.1f} ms')
+        print(f'filter (python): {t_py * 1e3:8.1f} ms')
+        print(f'group_by (sql):  {t_group * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
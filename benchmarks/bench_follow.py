@@ -0,0 +1,53 @@
+"""Benchmark of following many runs in progress: the cost of a `Follower`
+poll, against re-reading each run's whole log, as the logs grow.
+
+Run with `python benchmarks/bench_follow.py`.
+"""
+
+import tempfile
+import time
+
+from thatch.track import DirRoot, ThatchRun
+from thatch.track.follow import Follower
+
+N_RUNS = 200
+STEPS_PER_SAVE = 1_000
+N_SAVES = 5
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        root = DirRoot(path)
+        runs = [ThatchRun(root=root, config_source={'i': i}) for i in range(N_RUNS)]
+        follower = Follower(root)
+        print(f'{N_RUNS} runs, {STEPS_PER_SAVE} steps appended to each per update')
+        for save in range(N_SAVES):
+            with root.transaction():
+                for run in runs:
+                    for step in range(
+                        save * STEPS_PER_SAVE, (save + 1) * STEPS_PER_SAVE
+                    ):
+                        run.track(step=step, loss=1 / (step + 1))
+                    run.save()
+
+            start = time.perf_counter()
+            n_polled = sum(len(records) for _, records in follower.poll())
+            t_poll = time.perf_counter() - start
+
+            start = time.perf_counter()
+            n_read = sum(len(list(root.read_log(run.uuid))) for run in runs)
+            t_read = time.perf_counter() - start
+            assert n_polled == N_RUNS * STEPS_PER_SAVE
+
+            print(
+                f'update {save}: poll {t_poll * 1e3:7.1f} ms, '
+                f're-read {n_read:>8} records {t_read * 1e3:7.1f} ms'
+            )
+            # an update without anything new
+            start = time.perf_counter()
+            assert follower.poll() == []
+            print(f'          idle poll {(time.perf_counter() - start) * 1e3:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
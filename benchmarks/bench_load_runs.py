@@ -0,0 +1,44 @@
+"""Benchmark of loading many runs from a `DirRoot`: one at a time, with
+`load_runs` (in this process, as there are few), on a process pool (as it's
+started, and once it's running), and again from the log cache.
+
+Run with `python benchmarks/bench_load_runs.py`.
+"""
+
+import tempfile
+import time
+
+from thatch.track import DirRoot, ThatchRun
+
+N_RUNS = 200
+N_STEPS = 5_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        root = DirRoot(path)
+        for i in range(N_RUNS):
+            run = ThatchRun(root=root, config_source={'i': i})
+            for step in range(N_STEPS):
+                run.track(step=step, loss=1 / (step + 1), acc=step / N_STEPS)
+            run.finish()
+        uuids = root.uuids()
+
+        for name, load in [
+            ('one at a time', lambda: [root.load_run(uuid) for uuid in uuids]),
+            ('load_runs', lambda: root.load_runs(uuids)),
+            ('process pool', lambda: root.load_runs(uuids, executor='process')),
+            ('pool started', lambda: root.load_runs(uuids, executor='process')),
+            ('cached', lambda: root.load_runs(uuids)),
+        ]:
+            if name != 'cached':
+                root.log_cache.clear()
+            start = time.perf_counter()
+            load()
+            t = time.perf_counter() - start
+            print(f'{N_RUNS} runs, {name:<13}: {t * 1e3:8.1f} ms')
+        print(root.log_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark of `MemoryRoot.filter`/`group_by` on config params, using its
+`ParamIndex` versus checking each run's config in Python, and of
+`aggregate` over its in-memory logs.
+
+Run with `python benchmarks/bench_mem_root.py`.
+"""
+
+import time
+
+from thatch.track import MemoryRoot, Param, ThatchRoot, ThatchRun
+
+N_RUNS = 20_000
+N_STEPS = 100
+
+
+def main():
+    root = MemoryRoot()
+    for i in range(N_RUNS):
+        config = {'dropout': (i % 10) / 10, 'optim': {'lr': 10 ** -(i % 4)}}
+        with ThatchRun(root=root, config_source=config) as run:
+            for step in range(N_STEPS):
+                run.track(step=step, loss=1 / (step + 1 + i % 7))
+
+    condition = (Param('dropout') > 0.75) & (Param('optim.lr') == 0.01)
+    uuids = root.uuids()
+
+    start = time.perf_counter()
+    n_index = len(root.filter(condition))
+    t_index = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_py = len(ThatchRoot.select(root, condition, uuids))
+    t_py = time.perf_counter() - start
+    assert n_index == n_py
+
+    start = time.perf_counter()
+    root.group_by(('dropout', 'optim.lr'))
+    t_group = time.perf_counter() - start
+
+    start = time.perf_counter()
+    root.aggregate('loss')
+    t_aggregate = time.perf_counter() - start
+
+    print(f'{N_RUNS} runs, {n_index} matching, {root.nbytes / 2**20:.1f} MiB')
+    print(f'filter (index):   {t_index * 1e3:8.1f} ms')
+    print(f'filter (python):  {t_py * 1e3:8.1f} ms')
+    print(f'group_by (index): {t_group * 1e3:8.1f} ms')
+    print(f'aggregate:        {t_aggregate * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark of reading a plot's worth of points of a long metric: all raw
+values versus `read_metric_summary` from the compacted metric's pyramid.
+
+Run with `python benchmarks/bench_metric_summary.py`.
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from thatch.track import DirRoot, ThatchRun
+
+N_STEPS = 10_000_000
+POINTS = 1_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        root = DirRoot(path)
+        run = ThatchRun(root=root)
+        run.save()
+        # written as a column segment directly, as tracking 10M steps one at a
+        # time would take most of the benchmark
+        steps = np.arange(N_STEPS, dtype=np.int64)
+        rng = np.random.default_rng(0)
+        loss = 1 / np.sqrt(steps + 1) + rng.normal(0, 0.01, N_STEPS)
+        root.write_columns(
+            run.uuid,
+            0,
+            {
+                '__range__': np.array([0, N_STEPS]),
+                'loss/rows': steps,
+                'loss/steps': steps,
+                'loss/values': loss,
+            },
+        )
+
+        start = time.perf_counter()
+        root.compact(run.uuid)
+        t_compact = time.perf_counter() - start
+
+        def timed(fn):
+            start = time.perf_counter()
+            fn()
+            return time.perf_counter() - start
+
+        t_raw = timed(lambda: np.asarray(root.read_metric(run.uuid, 'loss')[1]).sum())
+        t_all = timed(lambda: root.read_metric_summary(run.uuid, 'loss', POINTS))
+        t_range = timed(
+            lambda: root.read_metric_summary(
+                run.uuid, 'loss', POINTS, start=5_000_000, stop=5_500_000
+            )
+        )
+        print(f'{N_STEPS} steps of one metric, {POINTS} points:')
+        print(f'raw values:        {t_raw * 1e3:8.2f} ms')
+        print(f'summary, all:      {t_all * 1e3:8.2f} ms')
+        print(f'summary, 500k:     {t_range * 1e3:8.2f} ms')
+        print(f'(compaction took {t_compact * 1e3:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
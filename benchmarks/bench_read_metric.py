@@ -0,0 +1,44 @@
+"""Benchmark of reading a range of one metric from a long run, before and
+after compacting it into the memory-mapped layout.
+
+Run with `python benchmarks/bench_read_metric.py`.
+"""
+
+import tempfile
+import time
+
+from thatch.track import DirRoot, ThatchRun
+
+N_STEPS = 2_000_000
+CHUNK = 100_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        root = DirRoot(path)
+        run = ThatchRun(root=root)
+        for step in range(N_STEPS):
+            run.track(step=step, loss=1 / (step + 1))
+            if step % CHUNK == CHUNK - 1:
+                run.save()
+        run.finish()
+
+        def read():
+            start = time.perf_counter()
+            _, values = root.read_metric(run.uuid, 'loss', 1_000_000, 1_100_000)
+            values.sum()
+            return time.perf_counter() - start
+
+        t_segments = read()
+        start = time.perf_counter()
+        root.compact(run.uuid)
+        t_compact = time.perf_counter() - start
+        t_mapped = read()
+        print(f'{N_STEPS} steps, read 100k steps of one metric:')
+        print(f'from segments: {t_segments * 1e3:8.2f} ms')
+        print(f'memory-mapped: {t_mapped * 1e3:8.2f} ms')
+        print(f'(compaction took {t_compact * 1e3:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
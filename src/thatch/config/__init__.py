@@ -1,12 +1,21 @@
 from .configurable import configurable
-from .configure import configure, configure_from_args
-from .globals import GLOBAL_CONFIG
+from .configure import configure, configure_from_args, read_config
+from .files import load_config_file
+from .globals import GLOBAL_CONFIG, ConfigStack
+from .sweep import Grid, RandomSearch, Trial, sweep
 from .util import expand_dots
 
 __all__ = [
     'configurable',
     'configure',
     'configure_from_args',
+    'read_config',
+    'load_config_file',
     'GLOBAL_CONFIG',
+    'ConfigStack',
     'expand_dots',
+    'sweep',
+    'Grid',
+    'RandomSearch',
+    'Trial',
 ]
@@ -1,21 +1,45 @@
 import functools
-import inspect
+import warnings
+from collections.abc import Mapping
 from types import FunctionType
 from typing import Any
 
-from .globals import GLOBAL_CONFIG
+from . import profile
+from .globals import GLOBAL_CONFIG, ConfigStack, _Layer
 from .util import index_dots
 
+_missing = object()
+
+# `profile.state.enabled`, kept as a global so each call only checks this
+_profiling = False
+
+
+def _set_profiling(enabled: bool):
+    global _profiling
+    _profiling = enabled
+
+
+profile.on_change(_set_profiling)
+
 
 def _resolve_keys(
     keys: tuple[str, ...],
     fn: FunctionType,
 ) -> tuple[str, ...]:
+    return _resolve_keys_by_name(keys, fn.__name__, fn.__qualname__)
+
+
+def _resolve_keys_by_name(
+    keys: tuple[str, ...],
+    name: str,
+    qualname: str,
+) -> tuple[str, ...]:
+    """`_resolve_keys`, for when only the function's names are known (such as
+    when scanning source code)."""
     if keys == ():
-        name = fn.__name__
         # If it's an __init__ of a class, grab the class name instead
         if name == '__init__':
-            name = fn.__qualname__.split('.')[-2]
+            name = qualname.split('.')[-2]
         return ('', name)
     else:
         return keys
@@ -55,7 +79,7 @@ def _update_object_config(
 def configurable(
     *keys: str,
     reconfigure: bool = True,
-    source: dict[str, Any] = GLOBAL_CONFIG,
+    source: Mapping[str, Any] = GLOBAL_CONFIG,
     setattr_config_if_init: bool = True,
 ):
     """Function decorator to add default values to keyword-only arguments.
@@ -77,14 +101,17 @@ def configurable(
         - passed-in values override configured values.
 
     reconfigure:bool=True
-        Re-scan the configuration source on each call, and not just the first.
-        It's convenient but a bit slow, so it can be disabled if it becomes a
-        bottleneck.
-    source:dict=GLOBAL_CONFIG
-        The dict to grab configuration data from.
-    """
+        Re-scan the configuration source whenever it has changed since the
+        last call, and not just until the first non-empty config. Resolved
+        values are cached on the top layer of a `ConfigStack`, so calls within
+        an unchanged config don't re-scan anything.
+    source:Mapping=GLOBAL_CONFIG
+        The mapping to grab configuration data from. Usually a `ConfigStack`;
+        a plain dict is re-scanned on every call instead.
 
-    config = dict()
+    Call counts and overhead of `@configurable` functions can be measured with
+    `thatch.config.profile`.
+    """
 
     # Removing the ParamSpec like this prevents pyright complaining about
     # missing arguments...
@@ -98,46 +125,139 @@ def configurable(
 
         use_keys = _resolve_keys(keys, fn)
 
-        @functools.wraps(fn)
-        def decorated(*args, **kwargs) -> R:
-            # @configurable does nothing with no/empty source
-            if source is None or len(source) == 0:
-                return fn(*args, **kwargs)
+        # imported here so that `import thatch` doesn't need it
+        import inspect
+
+        # Everything derivable from the signature is computed once here, so the
+        # per-call path below only has to merge the config with the kwargs.
+        sig = inspect.signature(fn)
+        kwonly_names: tuple[str, ...] = tuple(
+            name
+            for name, param in sig.parameters.items()
+            if param.kind is inspect.Parameter.KEYWORD_ONLY
+        )
+        kwonly_defaults: dict[str, Any] = {
+            name: sig.parameters[name].default
+            for name in kwonly_names
+            if sig.parameters[name].default is not inspect.Parameter.empty
+        }
+        # Non-kwonly params are never configured, but a config key sharing the
+        # name of one is almost certainly a mistake, so it gets a warning.
+        positional_names = frozenset(sig.parameters) - frozenset(kwonly_names)
+        warned_names: set[str] = set()
+        is_init = setattr_config_if_init and fn.__name__ == '__init__'
+        stack = source if isinstance(source, ConfigStack) else None
+        # dot-delimited path of each param within each of the keys, in order
+        lookup_paths = [
+            (name, f'{key}.{name}' if key else name)
+            for key in use_keys
+            for name in sig.parameters
+        ]
 
-            if config == dict() or reconfigure:
-                config.clear()
+        def resolve() -> tuple[dict[str, Any], bool]:
+            """Returns the function's config and whether anything was found."""
+            # Only the param names are looked up, rather than copying whole
+            # config groups, so this doesn't scale with the size of the config.
+            config = dict()
+            if stack is not None:
+                # each is a single lookup in the `ConfigStack`'s flat index
+                for name, path in lookup_paths:
+                    value = index_dots(stack, path, default=_missing)
+                    if value is not _missing:
+                        config[name] = value
+            else:
                 for key in use_keys:
-                    config.update(index_dots(source, key, default=dict()))
+                    group = index_dots(source, key, default=dict())
+                    if isinstance(group, Mapping):
+                        config.update(
+                            {k: group[k] for k in sig.parameters if k in group}
+                        )
 
-            sig = inspect.signature(fn)
+            for name in (positional_names & config.keys()) - warned_names:
+                warned_names.add(name)
+                warnings.warn(
+                    f'{fn.__qualname__}: config key "{name}" matches a param '
+                    'which is not keyword-only, so it is not configured',
+                    stacklevel=4,
+                )
 
             # just the parts of the config which are relevant to the function.
-            fn_config = dict()
-
-            for name, param in sig.parameters.items():
-                if param.kind is not inspect.Parameter.KEYWORD_ONLY:
-                    # If we find a non-kwonly param with a configured name, emit
-                    # a warning the first time we see it.
-                    if param.name in config:
-                        ...  # TODO
-                    continue
-
-                # The function's configuration is defined by the keyword-only
-                # params, so those are added to `fn_config`.
-                if name in kwargs:
-                    fn_config[name] = kwargs[name]
-                elif name in config:
-                    fn_config[name] = config[name]
-                elif param.default is not inspect._empty:
-                    fn_config[name] = param.default
-
-            if setattr_config_if_init and fn.__name__ == '__init__':
+            # The function's configuration is defined by the keyword-only
+            # params; configured values override defaults.
+            fn_config = kwonly_defaults | {
+                name: config[name] for name in kwonly_names if name in config
+            }
+            if _profiling:
+                profile.record_resolve(stats)
+            return fn_config, config != dict()
+
+        # Without `reconfigure`, the first non-empty resolved config is kept.
+        fixed_config: dict[str, Any] | None = None
+
+        def bind(
+            args: tuple,
+            kwargs: dict[str, Any],
+            layer: '_Layer | None' = None,
+        ) -> dict[str, Any]:
+            """Returns the kwargs to call `fn` with. `layer` is the source's
+            (non-empty) head, if the caller already has it."""
+            nonlocal fixed_config
+
+            # @configurable does nothing with no/empty source
+            if stack is not None:
+                if layer is None:
+                    layer = stack.head
+                    if layer is None or not layer.nonempty:
+                        return kwargs
+            elif not source:
+                return kwargs
+
+            # A `ConfigStack` caches each function's resolved config on its top
+            # layer, so it's only resolved again once the config has changed.
+            # Plain dict sources can't tell us when they change, so they're
+            # always re-resolved.
+            if fixed_config is not None:
+                fn_config = fixed_config
+            elif stack is not None:
+                assert layer is not None
+                fn_config = layer.resolved.get(decorated)
+                if fn_config is None:
+                    fn_config, found = resolve()
+                    layer.resolved[decorated] = fn_config
+                    if found and not reconfigure:
+                        fixed_config = fn_config
+            else:
+                fn_config, found = resolve()
+                if found and not reconfigure:
+                    fixed_config = fn_config
+
+            if is_init:
+                # passed-in values override configured values
+                fn_config = dict(fn_config)
+                for name in kwonly_names:
+                    if name in kwargs:
+                        fn_config[name] = kwargs[name]
                 _update_object_config(args[0], fn_config)
 
             # `fn_config` only contains keyword-only args, we we need to add
             # back in the rest of the keyword args before calling it.
-            new_kwargs = fn_config | kwargs
-            return fn(*args, **new_kwargs)
+            return fn_config | kwargs
+
+        stats = profile.register(fn)
+
+        @functools.wraps(fn)
+        def decorated(*args, **kwargs) -> R:
+            if _profiling:
+                return profile.call(stats, fn, bind, args, kwargs)
+            layer = None
+            if stack is not None:
+                # `stack.head` without the property, as it's checked on every call
+                layer = stack._var.get()
+                if layer is None:
+                    layer = stack._shared
+                if layer is None or not layer.nonempty:
+                    return fn(*args, **kwargs)
+            return fn(*args, **bind(args, kwargs, layer))
 
         return decorated
 
@@ -1,17 +1,10 @@
-import argparse
-import copy
-import json
-import re
-import tomllib
 from collections.abc import Iterator
 from contextlib import nullcontext
-from pathlib import Path
 from typing import Any
 
-import yaml
-
-from .globals import GLOBAL_CONFIG
-from .util import expand_dots, flatten_dict, is_dict_str_Any
+from .files import load_config_file
+from .globals import GLOBAL_CONFIG, ConfigStack
+from .util import expand_dots, flatten_dict, index_dots, is_dict_str_Any
 
 
 def _flat_iter_to_dict(kv_pairs: Iterator[tuple[str, Any]]):
@@ -25,7 +18,7 @@ def _flat_iter_to_dict(kv_pairs: Iterator[tuple[str, Any]]):
     return out
 
 
-def configure_from_args():
+def configure_from_args(precompile: bool = False):
     """Gather configuration values from program arguments.
 
     Using `argparse`, it registers `-c` and `--config` to set configuration
@@ -41,7 +34,16 @@ def configure_from_args():
     for configuration values. Then, the configuration key "overflow" is set to
     value 1. This is applied as a context manager, just as if those same values
     had been set with a `configure()` call.
+
+    Config files are loaded with `load_config_file`, so files which were
+    already parsed aren't parsed again. With `precompile=True`, parsed files
+    are also cached on disk, for use by later processes.
     """
+    # imported here, since they're only needed for this
+    import argparse
+    import json
+    import re
+
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', type=str, action='append')
     args, _ = parser.parse_known_args()
@@ -74,21 +76,7 @@ def configure_from_args():
             continue
 
         # third case is to read it as a file
-        p = Path(c)
-        assert p.exists()
-        match p.suffix:
-            case '.json':
-                with open(p, 'rt') as f:
-                    config = json.load(f)
-            case '.toml':
-                with open(p, 'rb') as f:
-                    config = tomllib.load(f)
-            case '.yaml':
-                with open(p, 'rt') as f:
-                    config = yaml.safe_load(f)
-            case _:
-                raise ValueError(f'unsupported config filetype: "{p.suffix}"')
-        assert is_dict_str_Any(config)
+        config = load_config_file(c, precompile=precompile)
         flat_config = _flat_iter_to_dict(flatten_dict(config))
         combined_flat_config.update(flat_config)
 
@@ -129,23 +117,42 @@ def configure(
     return ConfigContextManager(expanded_source | expanded_kwargs)
 
 
+def read_config(key: str = '', default: Any = None) -> Any:
+    """Read a (dot-delimited) config key in the current context's scope.
+
+    Prefer making the key a param of a `@configurable` function where
+    possible, so that used config keys can be listed statically.
+    > with thatch.configure(optim={'lr': 1e-3}):
+    >     read_config('optim.lr')  # 1e-3
+    """
+    if key == '':
+        return GLOBAL_CONFIG.to_dict()
+    return index_dots(GLOBAL_CONFIG, key, default=default)
+
+
 class ConfigContextManager:
     """Context manager handling changes to the config, as well as reverting
     said changes upon end. By default, it targets changing/reverting
     GLOBAL_CONFIG.
 
+    Entering pushes `config` as a new layer onto the target `ConfigStack`, and
+    exiting pops it, so nothing is copied either way. Note that the layer holds
+    `config` by reference; values should not be mutated while it's applied.
+
+    The same instance may be entered from several threads/tasks at once, since
+    each of them has its own scope in the `ConfigStack`.
+
     TODO: may be worthwhile to allow indexing into it, but that might have
     problems.
     """
 
-    def __init__(self, config: dict, target: dict = GLOBAL_CONFIG):
+    def __init__(self, config: dict, target: ConfigStack = GLOBAL_CONFIG):
+        assert isinstance(target, ConfigStack)
         self.config = config
         self.target = target
 
     def __enter__(self):
-        self.prev = copy.deepcopy(self.target)
-        self.target.update(self.config)
+        self.target.push(self.config, owner=self)
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        self.target.clear()
-        self.target.update(self.prev)
+        self.target.pop(owner=self)
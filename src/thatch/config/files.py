@@ -0,0 +1,124 @@
+import os
+from typing import Any
+
+from .util import is_dict_str_Any
+
+# Parsers are imported on first use, since e.g. `yaml` is slow to import and
+# most programs only ever read one kind of config file (if any).
+
+
+def _load_json(path: str) -> Any:
+    import json
+
+    with open(path, 'rt') as f:
+        return json.load(f)
+
+
+def _load_toml(path: str) -> Any:
+    import tomllib
+
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def _load_yaml(path: str) -> Any:
+    import yaml
+
+    with open(path, 'rt') as f:
+        return yaml.safe_load(f)
+
+
+_PARSERS = {
+    '.json': _load_json,
+    '.toml': _load_toml,
+    '.yaml': _load_yaml,
+}
+
+# path -> ((mtime_ns, size), parsed config)
+_cache: dict[str, tuple[tuple[int, int], dict[str, Any]]] = dict()
+
+
+def _precompiled_path(path: str) -> str:
+    # `marshal` rather than `pickle`, since loading it can't run any code; a
+    # config cached by whoever can write to the cache dir is just data.
+    import hashlib
+
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    name = hashlib.sha1(path.encode()).hexdigest()
+    return os.path.join(cache_dir, 'thatch', 'configs', f'{name}.marshal')
+
+
+def _read_precompiled(path: str, stamp: tuple[int, int]) -> dict[str, Any] | None:
+    import marshal
+
+    try:
+        with open(_precompiled_path(path), 'rb') as f:
+            cached_path, cached_stamp, config = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if cached_path != path or cached_stamp != stamp:
+        return None
+    return config if is_dict_str_Any(config) else None
+
+
+def _write_precompiled(path: str, stamp: tuple[int, int], config: dict[str, Any]):
+    # Written to a temp file first, since many processes (e.g. a job array)
+    # may be doing this at once. Failing to write it is fine, e.g. with a
+    # read-only home directory; it's only a cache. So is a config `marshal`
+    # can't store, such as one with the dates of a toml file.
+    import marshal
+
+    try:
+        data = marshal.dumps((path, stamp, config))
+    except ValueError:
+        return
+    out_path = _precompiled_path(path)
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, out_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_config_file(
+    path: str | os.PathLike,
+    precompile: bool = False,
+) -> dict[str, Any]:
+    """Load a `.json`, `.toml`, or `.yaml` config file.
+
+    Parsed configs are cached in memory by path, and reused for as long as the
+    file's mtime and size are unchanged. The returned dict is shared with that
+    cache, so it should not be modified.
+
+    precompile:bool=False
+        Also cache the parsed config on disk, in `$XDG_CACHE_HOME/thatch/configs`
+        (by default `~/.cache/thatch/configs`), so that other processes loading
+        the same file can skip parsing it. Useful for e.g. repeated launches of
+        a job array.
+    """
+    path = os.path.abspath(path)
+    suffix = os.path.splitext(path)[1]
+    if suffix not in _PARSERS:
+        raise ValueError(f'unsupported config filetype: "{suffix}"')
+
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    config = _read_precompiled(path, stamp) if precompile else None
+    if config is None:
+        config = _PARSERS[suffix](path)
+        assert is_dict_str_Any(config)
+        if precompile:
+            _write_precompiled(path, stamp, config)
+
+    _cache[path] = (stamp, config)
+    return config
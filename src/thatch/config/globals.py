@@ -1,8 +1,224 @@
+import itertools
+import sys
+import threading
+from collections.abc import Iterator, Mapping
+from contextvars import ContextVar
 from typing import Any
 
+_generation_counter = itertools.count(1)
+
+# Sentinels for `_Layer.lookups`: `_MISSING` is a cached miss
+_MISSING = object()
+_UNCACHED = object()
+
+
+def _flat_index(config: dict[str, Any]) -> dict[str, Any]:
+    """Map every dot-delimited path within a nested dict to its value,
+    including paths to the nested dicts themselves. Dicts with keys other than
+    strings are values, not nested configs (as for `util.flatten_dict`)."""
+    flat = dict()
+    stack = [('', config)]
+    while stack:
+        prefix, d = stack.pop()
+        for k, v in d.items():
+            path = prefix + k
+            flat[path] = v
+            if isinstance(v, dict) and all(isinstance(k, str) for k in v):
+                stack.append((path + '.', v))
+    return flat
+
+
+class _Layer:
+    """One entry of a `ConfigStack`. A layer's config and parent never change
+    once created, so a layer fully determines the config visible while it's on
+    top. Layers are shared between contexts, and only ever appended to."""
+
+    __slots__ = (
+        'config',
+        'parent',
+        'below',
+        'owner',
+        'generation',
+        'nonempty',
+        'resolved',
+        'lookups',
+        '_flat',
+        '_merged',
+    )
+
+    def __init__(self, config: dict[str, Any], parent: '_Layer | None', owner: Any):
+        self.config = config
+        self.parent = parent
+        # what the context's `ContextVar` held before this layer was pushed,
+        # which differs from `parent` when that's the main thread's scope
+        self.below: _Layer | None = None
+        self.owner = owner
+        self.generation = next(_generation_counter)
+        self.nonempty = bool(config) or (parent is not None and parent.nonempty)
+        # Per-`@configurable` function cache of resolved values
+        self.resolved: dict[Any, dict[str, Any]] = {}
+        # Cache of `ConfigStack.lookup` results while this layer is on top
+        self.lookups: dict[str, Any] = {}
+        self._flat: dict[str, Any] | None = None
+        self._merged: dict[str, Any] | None = None
+
+    def flat(self) -> dict[str, Any]:
+        """Flat index of just this layer's config, computed on first use."""
+        if self._flat is None:
+            self._flat = _flat_index(self.config)
+        return self._flat
+
+    def find(self, path: str) -> Any:
+        """Resolve a dot-delimited path through this layer and those below."""
+        top = path.partition('.')[0]
+        layer = self
+        while layer is not None:
+            # the first layer containing the top-level key decides everything
+            # below it, just like `dict.update` would
+            if top in layer.config:
+                return layer.flat().get(path, _MISSING)
+            layer = layer.parent
+        return _MISSING
+
+    def merged(self) -> dict[str, Any]:
+        """All layers flattened into one dict, computed on first use."""
+        if self._merged is None:
+            base = self.parent.merged() if self.parent is not None else {}
+            self._merged = base | self.config
+        return self._merged
+
+
+class ConfigStack(Mapping[str, Any]):
+    """Read-only mapping over a stack of config layers.
+
+    Entering a `configure` pushes its values as a new layer, and exiting pops
+    it again, so both are O(1) regardless of the config size. Lookups resolve
+    from the top layer down, with each layer overriding top-level keys of the
+    layers below it (i.e. just like `dict.update`). Each layer keeps a flat
+    index of its dot-delimited paths, so `lookup` of a nested key doesn't have
+    to walk nested dicts.
+
+    The top of the stack is held in a `ContextVar`, so every thread and asyncio
+    task has its own `configure` scope. Tasks start from the scope they were
+    created in. A thread which hasn't entered any `configure` of its own sees
+    the scope of the main thread instead, like it would with a plain dict.
+    """
+
+    def __init__(self):
+        # Top layer of the current context. `None` (or unset) means the context
+        # has no scope of its own, and follows `_shared` instead.
+        self._var: ContextVar[_Layer | None] = ContextVar(
+            f'thatch_config_{id(self):x}', default=None
+        )
+        # Top layer of the main thread
+        self._shared: _Layer | None = None
+
+    @property
+    def head(self) -> _Layer | None:
+        """Top layer in the current context, or `None` if the stack is empty."""
+        head = self._var.get()
+        return self._shared if head is None else head
+
+    @property
+    def generation(self) -> int:
+        """Unique id of the current state of the stack. It changes whenever a
+        layer is pushed or popped, so it can be used to invalidate anything
+        derived from the config."""
+        head = self.head
+        return 0 if head is None else head.generation
+
+    def push(self, config: dict[str, Any], owner: Any = None):
+        """Add `config` as the top layer in the current context. `owner` is
+        whatever will later `pop` it, such as a `ConfigContextManager`."""
+        below = self._var.get()
+        layer = _Layer(config, self._shared if below is None else below, owner)
+        layer.below = below
+        self._var.set(layer)
+        self._publish()
+
+    def pop(self, owner: Any = None):
+        """Restore the current context to before the most recent `push` by
+        `owner`. Anything pushed after it is dropped as well."""
+        layer = self.head
+        while layer is not None and layer.owner is not owner:
+            layer = layer.parent
+        assert layer is not None, f'{owner} is not applied in this context'
+        # not `layer.parent`, which would pin the main thread's scope at the
+        # time of the push into a context that had none of its own
+        self._var.set(layer.below)
+        self._publish()
+
+    def _publish(self):
+        """Share the main thread's scope with threads that have none."""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        # asyncio tasks get their own scopes, even in the main thread
+        asyncio = sys.modules.get('asyncio')
+        if asyncio is not None and asyncio._get_running_loop() is not None:
+            return
+        self._shared = self._var.get()
+
+    def lookup(
+        self,
+        path: str,
+        default: Any = None,
+        raise_on_missing: bool = False,
+    ) -> Any:
+        """Equivalent to `index_dots(self, path, ...)`, but a single dict lookup
+        once a path has been resolved for the current top layer."""
+        head = self.head
+        if head is None:
+            value = _MISSING
+        else:
+            value = head.lookups.get(path, _UNCACHED)
+            if value is _UNCACHED:
+                value = head.lookups[path] = head.find(path)
+        if value is _MISSING:
+            if raise_on_missing:
+                raise KeyError(f"Path '{path}' not found")
+            return default
+        return value
+
+    def to_dict(self) -> dict[str, Any]:
+        """Shallow copy of the current config as a plain dict."""
+        head = self.head
+        return {} if head is None else dict(head.merged())
+
+    def __getitem__(self, key: str) -> Any:
+        layer = self.head
+        while layer is not None:
+            if key in layer.config:
+                return layer.config[key]
+            layer = layer.parent
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        layer = self.head
+        while layer is not None:
+            if key in layer.config:
+                return True
+            layer = layer.parent
+        return False
+
+    def __bool__(self) -> bool:
+        head = self.head
+        return head is not None and head.nonempty
+
+    def __iter__(self) -> Iterator[str]:
+        head = self.head
+        return iter({} if head is None else head.merged())
+
+    def __len__(self) -> int:
+        head = self.head
+        return 0 if head is None else len(head.merged())
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
 """
 Global variable containing the most recently loaded configuration.
-It's literally just a dict (with string keys)
+It's a read-only mapping (with string keys), layered by `configure` contexts.
 
 `GLOBAL_CONFIG` should NOT be altered directly. Instead, use the `configure`
 context manager or variants like `configure_from_args`.
@@ -10,4 +226,4 @@ context manager or variants like `configure_from_args`.
 A "default" config can be achieved by chaining a `configure` with default
 values into the modified values.
 """
-GLOBAL_CONFIG: dict[str, Any] = dict()
+GLOBAL_CONFIG: ConfigStack = ConfigStack()
@@ -0,0 +1,178 @@
+"""Optional profiling of `@configurable` functions.
+
+While enabled, every call of a `@configurable` function records how long was
+spent resolving its config versus running the function itself, and whether
+the resolved config had to be (re)computed or came from the cache. While
+disabled, the only cost is checking a flag once per call: `@configurable`
+keeps its own copy of `state.enabled`, updated through `on_change`.
+
+> with thatch.config.profile.profiling():
+>     train()
+> print(thatch.config.profile.report())
+
+A `ThatchRun` finished while profiling is enabled saves the stats of calls
+made during the run in its `summary`.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from typing import Any
+
+
+class _State:
+    __slots__ = ('enabled',)
+
+    def __init__(self):
+        self.enabled = False
+
+
+state = _State()
+
+# called with `state.enabled` whenever it's changed
+_listeners: list[Callable[[bool], None]] = []
+
+
+def on_change(listener: Callable[[bool], None]):
+    """Call `listener` with whether profiling is enabled, now and whenever that
+    changes."""
+    _listeners.append(listener)
+    listener(state.enabled)
+
+
+def _set_enabled(enabled: bool):
+    state.enabled = enabled
+    for listener in _listeners:
+        listener(enabled)
+
+
+class FnStats:
+    """Accumulated stats of a single `@configurable` function."""
+
+    __slots__ = ('name', 'calls', 'resolves', 'overhead_ns', 'fn_ns')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.resolves = 0
+        self.overhead_ns = 0
+        self.fn_ns = 0
+
+
+# 'module.qualname' -> stats. A function that's decorated again (e.g. when
+# its module is reloaded) shares the stats of the previous one.
+_registry: dict[str, FnStats] = dict()
+_lock = threading.Lock()
+
+
+def register(fn: Callable) -> FnStats:
+    name = f'{fn.__module__}.{fn.__qualname__}'
+    with _lock:
+        return _registry.setdefault(name, FnStats(name))
+
+
+def call(
+    stats: FnStats,
+    fn: Callable,
+    bind: Callable[[tuple, dict[str, Any]], dict[str, Any]],
+    args: tuple,
+    kwargs: dict[str, Any],
+) -> Any:
+    """Profiled version of a `@configurable` wrapper's call."""
+    start = time.perf_counter_ns()
+    new_kwargs = bind(args, kwargs)
+    mid = time.perf_counter_ns()
+    try:
+        return fn(*args, **new_kwargs)
+    finally:
+        end = time.perf_counter_ns()
+        with _lock:
+            stats.calls += 1
+            stats.overhead_ns += mid - start
+            stats.fn_ns += end - mid
+
+
+def record_resolve(stats: FnStats):
+    with _lock:
+        stats.resolves += 1
+
+
+def enable():
+    _set_enabled(True)
+
+
+def disable():
+    _set_enabled(False)
+
+
+def is_enabled() -> bool:
+    return state.enabled
+
+
+@contextmanager
+def profiling():
+    """Enable profiling within a context."""
+    prev = state.enabled
+    _set_enabled(True)
+    try:
+        yield
+    finally:
+        _set_enabled(prev)
+
+
+def reset():
+    """Zero the stats of all functions."""
+    with _lock:
+        for stats in _registry.values():
+            stats.calls = stats.resolves = stats.overhead_ns = stats.fn_ns = 0
+
+
+def snapshot() -> dict[str, dict[str, int]]:
+    """Current stats of each function which has been called while profiling.
+
+    `resolves` counts calls which had to resolve the function's config, rather
+    than using the cached one. Times are in nanoseconds.
+    """
+    with _lock:
+        return {
+            name: {
+                'calls': stats.calls,
+                'resolves': stats.resolves,
+                'overhead_ns': stats.overhead_ns,
+                'fn_ns': stats.fn_ns,
+            }
+            for name, stats in _registry.items()
+            if stats.calls > 0
+        }
+
+
+def diff(
+    after: dict[str, dict[str, int]],
+    before: dict[str, dict[str, int]],
+) -> dict[str, dict[str, int]]:
+    """Stats accumulated between two snapshots."""
+    out = dict()
+    for name, stats in after.items():
+        prev = before.get(name, {})
+        delta = {k: v - prev.get(k, 0) for k, v in stats.items()}
+        if delta['calls'] > 0:
+            out[name] = delta
+    return out
+
+
+def report(snap: dict[str, dict[str, int]] | None = None) -> str:
+    """Format a snapshot as a table, sorted by total overhead."""
+    snap = snapshot() if snap is None else snap
+    lines = [
+        f'{"function":<48} {"calls":>10} {"hit rate":>9} '
+        f'{"overhead/call":>14} {"overhead":>9} {"in fn":>9}'
+    ]
+    for name, s in sorted(snap.items(), key=lambda kv: -kv[1]['overhead_ns']):
+        hit_rate = 1 - s['resolves'] / s['calls']
+        lines.append(
+            f'{name[-48:]:<48} {s["calls"]:>10} {hit_rate:>9.1%} '
+            f'{s["overhead_ns"] / s["calls"]:>11.0f} ns '
+            f'{s["overhead_ns"] / 1e9:>8.3f}s {s["fn_ns"] / 1e9:>8.3f}s'
+        )
+    return '\n'.join(lines)
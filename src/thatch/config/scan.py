@@ -0,0 +1,217 @@
+"""Statically list `@configurable` functions and their config keys.
+
+Source files are parsed with `ast` rather than imported, so scanning doesn't
+pull in any of the (possibly heavy) dependencies of the scanned code.
+
+> python -m thatch.config.scan src/ --cache .thatch/scan_cache.json
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import warnings
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from .configurable import _resolve_keys_by_name
+
+
+class ConfigurableInfo(NamedTuple):
+    """A `@configurable` function found in source code."""
+
+    path: str
+    lineno: int
+    qualname: str
+    keys: tuple[str, ...]
+    # keyword-only param -> source code of its default (`None` if no default)
+    params: dict[str, str | None]
+
+    def config_keys(self) -> list[str]:
+        """All dot-delimited config keys which would configure this function."""
+        return [
+            f'{key}.{param}' if key else param
+            for key in self.keys
+            for param in self.params
+        ]
+
+
+def _is_configurable_decorator(node: ast.expr) -> bool:
+    """Matches `@configurable(...)`, `@config.configurable(...)`, etc."""
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        return func.attr == 'configurable'
+    return isinstance(func, ast.Name) and func.id == 'configurable'
+
+
+class _Visitor(ast.NodeVisitor):
+    def __init__(self, path: str):
+        self.path = path
+        # qualname parts of the enclosing classes/functions
+        self.scope: list[str] = []
+        self.found: list[ConfigurableInfo] = []
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef):
+        qualname = '.'.join([*self.scope, node.name])
+        for decorator in node.decorator_list:
+            if _is_configurable_decorator(decorator):
+                assert isinstance(decorator, ast.Call)
+                self.found.append(self._info(node, decorator, qualname))
+
+        self.scope += [node.name, '<locals>']
+        self.generic_visit(node)
+        del self.scope[-2:]
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _info(
+        self,
+        node: ast.FunctionDef | ast.AsyncFunctionDef,
+        decorator: ast.Call,
+        qualname: str,
+    ) -> ConfigurableInfo:
+        keys = []
+        for arg in decorator.args:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                keys.append(arg.value)
+            else:
+                warnings.warn(
+                    f'{self.path}:{node.lineno}: skipping non-literal '
+                    f'@configurable key `{ast.unparse(arg)}`',
+                    stacklevel=2,
+                )
+
+        params = {
+            arg.arg: None if default is None else ast.unparse(default)
+            for arg, default in zip(node.args.kwonlyargs, node.args.kw_defaults)
+        }
+        return ConfigurableInfo(
+            path=self.path,
+            lineno=node.lineno,
+            qualname=qualname,
+            keys=_resolve_keys_by_name(tuple(keys), node.name, qualname),
+            params=params,
+        )
+
+
+def scan_source(source: str | bytes, path: str = '<unknown>') -> list[ConfigurableInfo]:
+    """Find the `@configurable` functions within a single source file."""
+    visitor = _Visitor(path)
+    visitor.visit(ast.parse(source, filename=path))
+    return visitor.found
+
+
+def _iter_py_files(path: Path) -> Iterator[Path]:
+    if path.is_file():
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        # skip hidden directories (.git, .venv, ...) and caches
+        dirnames[:] = sorted(
+            d for d in dirnames if not d.startswith('.') and d != '__pycache__'
+        )
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                yield Path(dirpath) / filename
+
+
+class Scanner:
+    """Scans source trees for `@configurable` functions, caching the results of
+    each file by its mtime and content hash.
+
+    A file whose mtime and size are unchanged isn't even read again. One that
+    was touched but has the same contents is only hashed, not parsed. The cache
+    can be saved to a json file, so re-scanning a large repo is incremental
+    across processes as well.
+    """
+
+    def __init__(self, cache_path: str | Path | None = None):
+        self.cache_path = None if cache_path is None else Path(cache_path)
+        self.cache: dict[str, dict[str, Any]] = dict()
+        if self.cache_path is not None and self.cache_path.exists():
+            with open(self.cache_path, 'rt') as f:
+                self.cache = json.load(f)
+
+    def save(self):
+        assert self.cache_path is not None
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'wt') as f:
+            json.dump(self.cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def scan_file(self, path: Path) -> list[ConfigurableInfo]:
+        key = str(path)
+        stat = path.stat()
+        entry = self.cache.get(key)
+        if not (
+            entry is not None
+            and entry['mtime_ns'] == stat.st_mtime_ns
+            and entry['size'] == stat.st_size
+        ):
+            source = path.read_bytes()
+            digest = hashlib.sha256(source).hexdigest()
+            if entry is None or entry['sha256'] != digest:
+                try:
+                    found = scan_source(source, key)
+                except SyntaxError as e:
+                    warnings.warn(f'skipping {key}: {e}', stacklevel=2)
+                    found = []
+                entry = {
+                    'sha256': digest,
+                    'found': [info._asdict() for info in found],
+                }
+            entry |= {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            self.cache[key] = entry
+
+        return [
+            ConfigurableInfo(**(info | {'keys': tuple(info['keys'])}))
+            for info in entry['found']
+        ]
+
+    def scan(self, *paths: str | Path) -> list[ConfigurableInfo]:
+        """Scan files and/or directories (recursively, for `.py` files)."""
+        found = []
+        for path in paths:
+            for file_path in _iter_py_files(Path(path)):
+                found += self.scan_file(file_path)
+        if self.cache_path is not None:
+            self.save()
+        return found
+
+
+def scan(
+    *paths: str | Path,
+    cache_path: str | Path | None = None,
+) -> list[ConfigurableInfo]:
+    """List the `@configurable` functions in the given files/directories,
+    without importing them. See `Scanner` for caching."""
+    return Scanner(cache_path).scan(*paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Statically list `@configurable` functions and their config keys.'
+    )
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--cache', default=None, help='json file to cache results')
+    args = parser.parse_args()
+
+    for info in scan(*args.paths, cache_path=args.cache):
+        print(f'{info.path}:{info.lineno} {info.qualname}')
+        for key in info.config_keys():
+            default = info.params[key.rpartition('.')[2]]
+            print(f'    {key}' + ('' if default is None else f' = {default}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import itertools
+import os
+import random
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .configure import configure
+from .globals import GLOBAL_CONFIG
+from .util import expand_dots, flatten_dict
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+
+class Grid:
+    """Search space of every combination of the given values.
+
+    > Grid({'optim.lr': [1e-3, 1e-2], 'dropout': [0.0, 0.1, 0.2]})  # 6 points
+    """
+
+    def __init__(self, space: Mapping[str, Sequence[Any]]):
+        self.space = dict(space)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        keys = list(self.space)
+        for values in itertools.product(*self.space.values()):
+            yield dict(zip(keys, values))
+
+    def __len__(self) -> int:
+        n = 1
+        for values in self.space.values():
+            n *= len(values)
+        return n
+
+
+class RandomSearch:
+    """Search space of `n` randomly sampled points.
+
+    Each value is either a sequence to choose from uniformly, or a function
+    taking a `random.Random` and returning a sample. Iterating with the same
+    `seed` always gives the same points.
+
+    > RandomSearch({'optim.lr': lambda rng: 10 ** rng.uniform(-4, -2)}, n=20)
+    """
+
+    def __init__(
+        self,
+        space: Mapping[str, Sequence[Any] | Callable[[random.Random], Any]],
+        n: int,
+        seed: int | None = None,
+    ):
+        self.space = dict(space)
+        self.n = n
+        self.seed = seed
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        rng = random.Random(self.seed)
+        for _ in range(self.n):
+            yield {
+                k: v(rng) if callable(v) else rng.choice(v)
+                for k, v in self.space.items()
+            }
+
+    def __len__(self) -> int:
+        return self.n
+
+
+class Trial(NamedTuple):
+    """Outcome of running one point of a `sweep`."""
+
+    index: int
+    config: dict[str, Any]
+    result: Any = None
+    error: BaseException | None = None
+
+
+def expand_point(
+    base: dict[str, Any] | None,
+    point: Mapping[str, Any],
+) -> dict[str, Any]:
+    """Merge a search space point into a base config.
+
+    Unlike `configure`, which replaces whole top-level keys, the point is
+    merged at the level of individual (dot-delimited) keys, so setting
+    `optim.lr` keeps the rest of `optim` from the base config.
+    """
+    flat = dict(flatten_dict(base or {}))
+    flat.update(flatten_dict(dict(point)))
+    return expand_dots(flat)
+
+
+def _run_trial(
+    fn: Callable[[], Any],
+    outer: dict[str, Any],
+    config: dict[str, Any],
+) -> Any:
+    # `outer` is the caller's config, which threads would see anyway but
+    # other processes wouldn't.
+    with configure(outer), configure(config):
+        return fn()
+
+
+def sweep(
+    fn: Callable[[], Any],
+    space: Iterable[Mapping[str, Any]],
+    base: dict[str, Any] | None = None,
+    *,
+    executor: 'str | Executor' = 'thread',
+    max_workers: int | None = None,
+) -> Iterator[Trial]:
+    """Run `fn` once for each point in a search space, in parallel.
+
+    Each call happens within `configure(config)`, with the config being `base`
+    merged with the point (see `expand_point`), so `@configurable` functions
+    called from `fn` pick up the trial's values. This is layered over the
+    config active where the sweep is iterated, with either kind of executor. `space` is a `Grid`, a
+    `RandomSearch`, or just a list of (possibly dot-delimited) dicts.
+
+    Trials are yielded as they finish, so not necessarily in order. A trial
+    which raises has the exception stored in `Trial.error`, and doesn't stop
+    the other trials.
+
+    executor:str|Executor='thread'
+        'thread' or 'process' to use a new pool of that kind, or an existing
+        `Executor`. For processes, `fn` has to be picklable.
+    max_workers:int|None=None
+        Maximum number of trials in flight at once. Points are only expanded
+        as they're submitted, so large (lazy) spaces are fine. Defaults to the
+        number of CPUs.
+    """
+    # imported here, as `concurrent.futures` is slow to import
+    from concurrent.futures import (
+        FIRST_COMPLETED,
+        CancelledError,
+        Executor,
+        ProcessPoolExecutor,
+        ThreadPoolExecutor,
+        wait,
+    )
+
+    max_workers = max_workers or os.cpu_count() or 1
+    match executor:
+        case 'thread':
+            pool = ThreadPoolExecutor(max_workers)
+        case 'process':
+            pool = ProcessPoolExecutor(max_workers)
+        case Executor():
+            pool = executor
+        case _:
+            raise ValueError(f'unsupported executor: "{executor}"')
+
+    pending: 'dict[Future, tuple[int, dict[str, Any]]]' = {}
+
+    def finished() -> Iterator[Trial]:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, config = pending.pop(future)
+            # an `Executor` passed in may have its futures cancelled elsewhere
+            if future.cancelled():
+                error = CancelledError()
+            else:
+                error = future.exception()
+            result = None if error is not None else future.result()
+            yield Trial(index, config, result, error)
+
+    try:
+        for index, point in enumerate(space):
+            while len(pending) >= max_workers:
+                yield from finished()
+            config = expand_point(base, point)
+            outer = GLOBAL_CONFIG.to_dict()
+            future = pool.submit(_run_trial, fn, outer, config)
+            pending[future] = (index, config)
+        while pending:
+            yield from finished()
+    finally:
+        # also reached if the caller stops iterating early
+        for future in pending:
+            future.cancel()
+        if pool is not executor:
+            pool.shutdown(wait=True)
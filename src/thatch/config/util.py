@@ -1,6 +1,8 @@
-from collections.abc import Iterator
+from collections.abc import Iterator, Mapping
 from typing import Any, TypeGuard
 
+from .globals import ConfigStack
+
 # type ConfigValue = str | int | float
 # """Arbitrarily nestable dict with str keys
 # Extra conditions:
@@ -26,12 +28,18 @@ def flatten_dict(
     dictionaries."""
     assert is_dict_str_Any(d)
 
-    for k, v in d.items():
-        if is_dict_str_Any(v):
-            for sub_k, sub_v in flatten_dict(v, sep=sep):
-                yield (f'{k}{sep}{sub_k}', sub_v)
+    # Depth-first with an explicit stack of (key prefix, items iterator), which
+    # yields in the same order as recursing would.
+    stack = [('', iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            if isinstance(v, dict) and is_dict_str_Any(v):
+                stack.append((prefix + k + sep, iter(v.items())))
+                break
+            yield (prefix + k, v)
         else:
-            yield (k, v)
+            stack.pop()
 
 
 def expand_dots(d: dict[str, Any]) -> dict[str, Any]:
@@ -43,15 +51,24 @@ def expand_dots(d: dict[str, Any]) -> dict[str, Any]:
     assert is_dict_str_Any(d)
 
     out = dict()
+    # nested dict of each dot-delimited prefix, so that keys sharing a prefix
+    # don't each walk down from `out` again
+    nodes: dict[str, dict] = dict()
     for k, v in flatten_dict(d):
-        *k_parts, k_last = k.split('.')
+        prefix, dot, k_last = k.rpartition('.')
 
-        current = out
-        for k_part in k_parts:
-            if k_part not in current:
-                current[k_part] = dict()
-            current = current[k_part]
-            assert isinstance(current, dict)
+        if not dot:
+            current = out
+        elif prefix in nodes:
+            current = nodes[prefix]
+        else:
+            current = out
+            for k_part in prefix.split('.'):
+                if k_part not in current:
+                    current[k_part] = dict()
+                current = current[k_part]
+                assert isinstance(current, dict)
+            nodes[prefix] = current
 
         if k_last in current:
             assert current[k_last] == v
@@ -62,7 +79,7 @@ def expand_dots(d: dict[str, Any]) -> dict[str, Any]:
 
 
 def index_dots(
-    d: dict[str, Any],
+    d: Mapping[str, Any],
     keys_str: str,
     default: Any = None,
     raise_on_missing: bool = False,
@@ -75,8 +92,16 @@ def index_dots(
 
     The dict is assumed to NOT contain an empty string key or keys with dots.
     See `tests/test_config_util.py:test_index_dots` for clarification.
+
+    Any `Mapping` works in place of a dict. For a `ConfigStack` such as
+    `GLOBAL_CONFIG`, this is a single lookup in its flat index.
     """
-    assert is_dict_str_Any(d)
+    if isinstance(d, ConfigStack):
+        if keys_str == '':
+            return d
+        return d.lookup(keys_str, default, raise_on_missing)
+
+    assert isinstance(d, (dict, Mapping))
     assert '' not in d
 
     if keys_str == '':
@@ -84,7 +109,7 @@ def index_dots(
 
     keys = keys_str.split('.')
     for sub_key in keys:
-        if not (isinstance(d, dict) and sub_key in d):
+        if not (isinstance(d, (dict, Mapping)) and sub_key in d):
             if raise_on_missing:
                 raise KeyError(f"Path '{keys_str}' failed at '{sub_key}'")
             return default
@@ -1,6 +1,15 @@
-
-
-#from . import run
-#from . import root
-
-
+from .dir_root import DirRoot
+from .mem_root import MemoryRoot
+from .param import Param
+from .root import RunSubset, ThatchRoot
+from .run import BaseRun, ThatchRun
+
+__all__ = [
+    'BaseRun',
+    'ThatchRun',
+    'ThatchRoot',
+    'DirRoot',
+    'MemoryRoot',
+    'RunSubset',
+    'Param',
+]
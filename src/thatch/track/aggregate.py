@@ -0,0 +1,154 @@
+"""Aggregating a metric across many runs, per step.
+
+The metrics of all runs are stacked into a single `(runs, steps)` array, with
+NaN wherever a run has no value at a step, so every statistic is one NumPy
+operation over all runs at once.
+"""
+
+import re
+import warnings
+from collections.abc import Sequence
+
+import numpy as np
+
+Metric = tuple[np.ndarray, np.ndarray]
+
+_QUANTILE = re.compile(r'q(\d+(?:\.\d+)?)')
+
+
+def stack_metrics(
+    metrics: Sequence[Metric],
+    align: str = 'exact',
+    steps: np.ndarray | int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Stack `(steps, values)` of several runs into `(steps, values)`, where
+    `values` has shape `(len(metrics), len(steps))`.
+
+    With `align='exact'`, `steps` is every step logged by any run (or those
+    given, sorted), and runs' values are placed at their steps as they are.
+    With `align='interpolate'`, runs' values are linearly interpolated at
+    `steps` (or at that many evenly spaced steps, 200 by default), within the
+    range of steps each run logged.
+    """
+    assert align in ('exact', 'interpolate')
+    lengths = np.array([len(s) for s, _ in metrics], dtype=np.int64)
+    run_index = np.repeat(np.arange(len(metrics)), lengths)
+    all_steps = np.concatenate(
+        [np.asarray(s) for s, _ in metrics] + [np.zeros(0, dtype=np.int64)]
+    )
+    all_values = np.concatenate(
+        [np.asarray(v, dtype=np.float64) for _, v in metrics] + [np.zeros(0)]
+    )
+
+    if align == 'exact':
+        if steps is None:
+            steps, cols = np.unique(all_steps, return_inverse=True)
+        else:
+            assert not isinstance(steps, int), 'exact steps must be listed'
+            steps = np.asarray(steps)
+            cols = np.searchsorted(steps, all_steps)
+            found = cols < len(steps)
+            found[found] = steps[cols[found]] == all_steps[found]
+            run_index, cols, all_values = (
+                run_index[found],
+                cols[found],
+                all_values[found],
+            )
+        out = np.full((len(metrics), len(steps)), np.nan)
+        out[run_index, cols] = all_values
+        return steps, out
+
+    if steps is None or isinstance(steps, int):
+        n = 200 if steps is None else steps
+        if len(all_steps) == 0:
+            steps = np.zeros(0)
+        else:
+            steps = np.linspace(all_steps.min(), all_steps.max(), n)
+    steps = np.asarray(steps, dtype=np.float64)
+    out = np.full((len(metrics), len(steps)), np.nan)
+    if len(all_steps) == 0 or len(steps) == 0:
+        return steps, out
+
+    # Interpolate all runs with a single `np.interp`, by shifting each run
+    # into its own range of x, beyond the end of the previous run's.
+    order = np.lexsort((all_steps, run_index))
+    all_steps, all_values = all_steps[order], all_values[order]
+    lo = min(all_steps.min(), steps.min())
+    span = max(all_steps.max(), steps.max()) - lo + 1
+    has_values = lengths > 0
+    shift = (np.arange(len(metrics)) * span)[has_values]
+    xs = all_steps - lo + np.repeat(shift, lengths[has_values])
+    queries = (steps - lo)[None, :] + shift[:, None]
+    interpolated = np.interp(queries.ravel(), xs, all_values).reshape(queries.shape)
+
+    # only within each run's own range of steps
+    ends = np.cumsum(lengths[has_values])
+    first, last = all_steps[ends - lengths[has_values]], all_steps[ends - 1]
+    inside = (steps[None, :] >= first[:, None]) & (steps[None, :] <= last[:, None])
+    out[has_values] = np.where(inside, interpolated, np.nan)
+    return steps, out
+
+
+def nan_quantiles(values: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    """Quantiles along the first axis, ignoring NaN, as `(len(qs), ...)`.
+
+    Unlike `np.nanquantile`, this doesn't loop over columns in Python.
+    """
+    # NaN sorts last, so each column's first `count` values are its own
+    ordered = np.sort(values, axis=0)
+    count = np.sum(~np.isnan(values), axis=0)
+    out = np.full((len(qs), *values.shape[1:]), np.nan)
+    valid = count > 0
+    cols, count = ordered[:, valid], count[valid]
+    for i, q in enumerate(qs):
+        position = q * (count - 1)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, count - 1)
+        frac = position - below
+        lower = np.take_along_axis(cols, below[None], axis=0)[0]
+        upper = np.take_along_axis(cols, above[None], axis=0)[0]
+        out[i, valid] = lower + frac * (upper - lower)
+    return out
+
+
+def aggregate_metrics(
+    metrics: Sequence[Metric],
+    aggr: str | Sequence[str] = ('mean', 'std', 'min', 'max'),
+    align: str = 'exact',
+    steps: np.ndarray | int | None = None,
+) -> dict[str, np.ndarray]:
+    """Aggregate the metrics of several runs per step (see `stack_metrics`).
+
+    `aggr` names the statistics to compute: any of 'mean', 'std', 'min',
+    'max', 'median', 'sum', and quantiles as 'q<percent>' (e.g. 'q5', 'q95').
+    Returns a dict with an array per statistic, along with 'step' and 'count'
+    (number of runs with a value at each step).
+    """
+    aggr = [aggr] if isinstance(aggr, str) else list(aggr)
+    steps, values = stack_metrics(metrics, align, steps)
+
+    out = {'step': steps, 'count': np.sum(~np.isnan(values), axis=0)}
+    quantiles = dict()
+    reductions = {
+        'mean': np.nanmean,
+        'std': np.nanstd,
+        'min': np.nanmin,
+        'max': np.nanmax,
+        'sum': np.nansum,
+    }
+    # steps without any values are NaN, which isn't worth a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for name in aggr:
+            if name in reductions:
+                out[name] = reductions[name](values, axis=0)
+            elif name == 'median':
+                quantiles[name] = 0.5
+            elif (match := _QUANTILE.fullmatch(name)) is not None:
+                quantiles[name] = float(match.group(1)) / 100
+            else:
+                raise ValueError(f'unknown aggregation {name!r}')
+    if quantiles:
+        computed = nan_quantiles(values, list(quantiles.values()))
+        out |= dict(zip(quantiles, computed))
+    return out
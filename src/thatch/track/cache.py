@@ -0,0 +1,75 @@
+"""Memory-bounded LRU cache of decoded run logs."""
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from .columns import ColumnarLog
+
+
+class LogCache:
+    """Decoded logs by uuid, evicting the least recently used ones once they
+    take more than `max_bytes` in total.
+
+    Each log is stored along with a signature of the file it was decoded from
+    (its mtime and size), and only returned for a matching signature, so a run
+    which was written to since is decoded again.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[Any, ColumnarLog, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uuid: str, signature: Any) -> ColumnarLog | None:
+        with self._lock:
+            entry = self._entries.get(uuid)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uuid)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, uuid: str, signature: Any, log: ColumnarLog):
+        nbytes = log.nbytes
+        with self._lock:
+            self._discard(uuid)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[uuid] = (signature, log, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, uuid: str):
+        entry = self._entries.pop(uuid, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counts (since creation), and the cache's current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+            }
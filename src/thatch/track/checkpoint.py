@@ -0,0 +1,234 @@
+"""Incremental checkpoints of a run's state, stored in an `ObjectStore`.
+
+Arrays (and torch tensors) in the state are split into fixed-size chunks of
+their raw bytes, each stored by its digest, so chunks which haven't changed
+since an earlier checkpoint (of any run) are stored once and never rewritten.
+The rest of the state is pickled, with each array replaced by a reference to
+its chunks. A checkpoint is then just a small JSON manifest:
+
+```
+{
+    "format": "thatch-checkpoint",
+    "step": 1000,
+    "state": ["5d0e..."],  # chunks of the pickled state
+    "arrays": [
+        {"type": "numpy", "dtype": "<f4", "shape": [512, 512],  # (or fields)
+         "chunks": ["3fa9...", ...]},
+        {"type": "torch", "dtype": "|u1", "shape": [4096],  # raw bytes
+         "torch": {"dtype": "bfloat16", "shape": [32, 64], "device": "cuda:0",
+                   "requires_grad": true, "parameter": true},
+         "chunks": [...]},
+        ...
+    ]
+}
+```
+
+Only plain `np.ndarray`s and torch `Tensor`s/`Parameter`s are stored this way.
+Subclasses (e.g. masked arrays) are pickled as usual, so they keep whatever
+else they hold. An array referred to several times in the state is stored
+once, and loaded as a single array again.
+
+which `DirRoot.write_checkpoint` saves as the artifact `checkpoints/<step>.ckpt`,
+and as `checkpoints/latest.ckpt`.
+"""
+
+import io
+import json
+import pickle
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+
+from .objects import ObjectStore
+
+FORMAT = 'thatch-checkpoint'
+CHUNK_SIZE = 1 << 20
+
+
+def _is_tensor(obj: Any) -> bool:
+    # checked by name, so torch is only imported by states which contain it
+    return type(obj).__module__.startswith('torch') and type(obj).__name__ in (
+        'Tensor',
+        'Parameter',
+    )
+
+
+def _put_chunks(objects: ObjectStore, data: memoryview, chunk_size: int) -> list[str]:
+    return [
+        objects.put_bytes(bytes(data[i : i + chunk_size]))
+        for i in range(0, len(data), chunk_size)
+    ]
+
+
+def _tensor_array(tensor: Any) -> tuple[np.ndarray, dict[str, Any]]:
+    """The data of a tensor as an array, and what else it takes to restore it."""
+    import torch
+
+    info = {
+        'dtype': str(tensor.dtype).removeprefix('torch.'),
+        'shape': list(tensor.shape),
+        'device': str(tensor.device),
+        'requires_grad': tensor.requires_grad,
+        'parameter': isinstance(tensor, torch.nn.Parameter),
+    }
+    tensor = tensor.detach().cpu()
+    try:
+        array = tensor.numpy()
+    except TypeError:
+        # dtypes numpy doesn't have (e.g. bfloat16) are stored as raw bytes
+        array = tensor.contiguous().reshape(-1).view(torch.uint8).numpy()
+    return array, info
+
+
+def _array_tensor(array: np.ndarray, info: dict[str, Any]) -> Any:
+    import torch
+
+    tensor = torch.from_numpy(array)
+    dtype = getattr(torch, info['dtype'])
+    if tensor.dtype != dtype:
+        tensor = tensor.view(dtype).reshape(info['shape'])
+    tensor = tensor.to(info['device'])
+    if info['parameter']:
+        return torch.nn.Parameter(tensor, requires_grad=info['requires_grad'])
+    return tensor.requires_grad_(info['requires_grad'])
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: io.BytesIO, objects: ObjectStore, chunk_size: int):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.objects = objects
+        self.chunk_size = chunk_size
+        self.arrays: list[dict[str, Any]] = []
+        # id -> (index in `arrays`, the array), so shared arrays stay shared.
+        # The array is kept so its id isn't reused while pickling.
+        self.memo_arrays: dict[int, tuple[int, Any]] = dict()
+
+    def persistent_id(self, obj: Any) -> int | None:
+        # exact types only: subclasses may hold more than their data
+        if type(obj) is np.ndarray:
+            array, info = obj, None
+        elif _is_tensor(obj):
+            array, info = _tensor_array(obj)
+        else:
+            return None
+        if array.dtype.hasobject:
+            return None
+        if id(obj) in self.memo_arrays:
+            return self.memo_arrays[id(obj)][0]
+
+        array = np.ascontiguousarray(array)
+        entry: dict[str, Any] = {
+            'type': 'numpy' if info is None else 'torch',
+            'dtype': _dtype_json(array.dtype),
+            'shape': list(array.shape),
+            'chunks': _put_chunks(
+                self.objects,
+                memoryview(array.reshape(-1).view(np.uint8)),
+                self.chunk_size,
+            ),
+        }
+        if info is not None:
+            entry['torch'] = info
+        self.arrays.append(entry)
+        self.memo_arrays[id(obj)] = (len(self.arrays) - 1, obj)
+        return len(self.arrays) - 1
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, objects: ObjectStore, arrays: list[dict]):
+        super().__init__(file)
+        self.objects = objects
+        self.arrays = arrays
+        self.loaded: dict[int, Any] = dict()
+
+    def persistent_load(self, pid: int) -> Any:
+        if pid in self.loaded:
+            return self.loaded[pid]
+        info = self.arrays[pid]
+        dtype = _json_dtype(info['dtype'])
+        buffer = _read_chunks(self.objects, info['chunks'])
+        array = np.frombuffer(buffer, dtype).reshape(info['shape'])
+        if info['type'] == 'torch':
+            if 'torch' in info:
+                array = _array_tensor(array, info['torch'])
+            else:
+                # from before tensors' dtype and device were recorded
+                import torch
+
+                array = torch.from_numpy(array)
+        self.loaded[pid] = array
+        return array
+
+
+def _dtype_json(dtype: np.dtype) -> str | list:
+    """A dtype as JSON: its `str`, or for structured dtypes (whose `str` is just
+    their size, e.g. `|V12`) the list of its fields, as in `.npy` headers."""
+    if dtype.fields is None:
+        return dtype.str
+    return np.lib.format.dtype_to_descr(dtype)
+
+
+def _json_dtype(descr: str | list) -> np.dtype:
+    if isinstance(descr, str):
+        return np.dtype(descr)
+    return np.lib.format.descr_to_dtype(_descr_tuples(descr))
+
+
+def _descr_tuples(descr: list) -> list:
+    """Undo JSON turning the tuples of a dtype's descr into lists."""
+    fields = []
+    for name, *rest in descr:
+        name = tuple(name) if isinstance(name, list) else name
+        field_type = rest[0] if isinstance(rest[0], str) else _descr_tuples(rest[0])
+        shape = [tuple(rest[1])] if len(rest) > 1 else []
+        fields.append((name, field_type, *shape))
+    return fields
+
+
+def _read_chunks(objects: ObjectStore, chunks: list[str]) -> bytearray:
+    buffer = bytearray()
+    for digest in chunks:
+        buffer += objects.read(digest)
+    return buffer
+
+
+def dump_checkpoint(
+    objects: ObjectStore,
+    state: Any,
+    step: int,
+    chunk_size: int = CHUNK_SIZE,
+) -> bytes:
+    """Store the chunks of `state` which aren't stored yet, returning the
+    checkpoint's manifest."""
+    f = io.BytesIO()
+    pickler = _Pickler(f, objects, chunk_size)
+    pickler.dump(state)
+    manifest = {
+        'format': FORMAT,
+        'step': step,
+        'state': _put_chunks(objects, f.getbuffer(), chunk_size),
+        'arrays': pickler.arrays,
+    }
+    return json.dumps(manifest).encode()
+
+
+def load_checkpoint(objects: ObjectStore, manifest: bytes) -> tuple[int, Any]:
+    """`(step, state)` of a checkpoint, from its manifest."""
+    info = json.loads(manifest)
+    assert info.get('format') == FORMAT, 'not a checkpoint manifest'
+    f = io.BytesIO(_read_chunks(objects, info['state']))
+    return info['step'], _Unpickler(f, objects, info['arrays']).load()
+
+
+def manifest_digests(manifest: bytes) -> Iterator[str]:
+    """Digests of all chunks a manifest refers to; none if it isn't one."""
+    try:
+        info = json.loads(manifest)
+    except ValueError:
+        return
+    if not isinstance(info, dict) or info.get('format') != FORMAT:
+        return
+    yield from info['state']
+    for array in info['arrays']:
+        yield from array['chunks']
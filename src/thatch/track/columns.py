@@ -0,0 +1,324 @@
+import os
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from typing import Any
+
+import numpy as np
+
+# Arrays are named '<key>/<field>' within a segment, and '__range__' holds the
+# `[start, stop)` rows the segment covers.
+_RANGE = '__range__'
+_FIELDS = ('rows', 'steps', 'values')
+
+
+def _value_dtype(value: Any) -> np.dtype:
+    """dtype of a column able to hold `value`; `object` for non-scalars."""
+    if isinstance(value, (bool, np.bool_)):
+        return np.dtype(bool)
+    if isinstance(value, np.integer) or (
+        isinstance(value, int) and -(2**63) <= value < 2**63
+    ):
+        return np.dtype(np.int64)
+    if isinstance(value, (float, np.floating)):
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+
+def _promote(a: np.dtype, b: np.dtype) -> np.dtype:
+    # Mixed types go to an object column rather than e.g. int -> float, so
+    # values are read back as the same types they were tracked as.
+    return a if a == b else np.dtype(object)
+
+
+def load_segment(
+    path: str | os.PathLike,
+    keys: Iterable[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """Load a segment saved as an `.npz` (see `DirRoot.write_columns`),
+    optionally only the arrays of some keys (the others aren't read at all)."""
+    # object columns (non-scalar values) are pickled
+    with np.load(path, allow_pickle=True) as npz:
+        if keys is None:
+            names = npz.files
+        else:
+            wanted = {f'{key}/{field}' for key in keys for field in _FIELDS}
+            names = [name for name in npz.files if name in wanted]
+        return {name: npz[name] for name in [_RANGE, *names] if name in npz.files}
+
+
+def segment_range(path: str | os.PathLike) -> tuple[int, int]:
+    """`[start, stop)` rows of a saved segment, reading nothing else."""
+    with np.load(path) as npz:
+        start, stop = npz[_RANGE].tolist()
+    return start, stop
+
+
+class Column:
+    """Values tracked for a single key, in growable typed arrays.
+
+    `rows` are the indices of the log entries the values came from, and
+    `steps` their step (see `ColumnarLog`). All three arrays have the same
+    length, and are views of the used part of over-allocated buffers.
+    """
+
+    __slots__ = ('_rows', '_steps', '_values', 'n', 'sorted_steps')
+
+    def __init__(self, dtype: np.dtype, capacity: int = 16):
+        self._rows = np.empty(capacity, dtype=np.int64)
+        self._steps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=dtype)
+        self.n = 0
+        # whether steps are non-decreasing, so step ranges can be bisected
+        self.sorted_steps = True
+
+    @classmethod
+    def wrap(
+        cls,
+        rows: np.ndarray,
+        steps: np.ndarray,
+        values: np.ndarray,
+        sorted_steps: bool,
+    ) -> 'Column':
+        """A column of existing arrays (such as memmaps), without copying them.
+        They're only copied once more values are appended."""
+        column = cls.__new__(cls)
+        column.__setstate__((rows, steps, values, sorted_steps))
+        return column
+
+    def __getstate__(self):
+        # without the unused part of the buffers
+        return self.rows, self.steps, self.values, self.sorted_steps
+
+    def __setstate__(self, state):
+        self._rows, self._steps, self._values, self.sorted_steps = state
+        self.n = len(self._rows)
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows[: self.n]
+
+    @property
+    def steps(self) -> np.ndarray:
+        return self._steps[: self.n]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[: self.n]
+
+    @property
+    def last_row(self) -> int:
+        return int(self._rows[self.n - 1]) if self.n > 0 else -1
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._values.dtype
+
+    def _reserve(self, capacity: int, dtype: np.dtype | None = None):
+        dtype = self.dtype if dtype is None else dtype
+        if capacity <= len(self._rows) and dtype == self.dtype:
+            return
+        capacity = max(capacity, 2 * len(self._rows))
+        for name in ('_rows', '_steps', '_values'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=dtype if name == '_values' else old.dtype)
+            new[: self.n] = old[: self.n]
+            setattr(self, name, new)
+
+    def append(self, row: int, step: int, value: Any):
+        dtype = _promote(self.dtype, _value_dtype(value))
+        self._reserve(self.n + 1, dtype)
+        n = self.n
+        if n > 0 and step < self._steps[n - 1]:
+            self.sorted_steps = False
+        self._rows[n] = row
+        self._steps[n] = step
+        self._values[n] = value
+        self.n = n + 1
+
+    def extend(self, rows: np.ndarray, steps: np.ndarray, values: np.ndarray):
+        if len(rows) == 0:
+            return
+        dtype = _promote(self.dtype, values.dtype)
+        self._reserve(self.n + len(rows), dtype)
+        n = self.n
+        if (n > 0 and steps[0] < self._steps[n - 1]) or np.any(np.diff(steps) < 0):
+            self.sorted_steps = False
+        self._rows[n : n + len(rows)] = rows
+        self._steps[n : n + len(rows)] = steps
+        self._values[n : n + len(rows)] = values
+        self.n = n + len(rows)
+
+
+class ColumnarLog:
+    """Log of tracked values, stored as one `Column` per key.
+
+    Each entry of the log (a `dict` of values, as passed to `ThatchRun.track`)
+    is a row. A row's step is its `'step'` value if it has an integer one, and
+    otherwise its row index. Scalars are stored in typed arrays (bool/int64/float64),
+    and anything else in object arrays, as are keys with values of mixed types.
+
+    It still behaves like a list of entries (`len`, iteration, indexing), but
+    reading a single metric is just a view of its arrays:
+    > steps, losses = run.log.metric('loss')
+    > run.log.aggregate('loss', np.mean, start=1000, stop=2000)
+    """
+
+    def __init__(self):
+        self.columns: dict[str, Column] = dict()
+        self.n_rows = 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> 'ColumnarLog':
+        log = cls()
+        log.extend(records)
+        return log
+
+    def append(self, record: Mapping[str, Any]):
+        row = self.n_rows
+        step = record.get('step', row)
+        if not isinstance(step, (int, np.integer)):
+            step = row
+        for key, value in record.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = Column(_value_dtype(value))
+            column.append(row, int(step), value)
+        self.n_rows = row + 1
+
+    def extend(self, records: Iterable[Mapping[str, Any]]):
+        for record in records:
+            self.append(record)
+
+    def keys(self) -> list[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns' arrays (object values not included)."""
+        return sum(
+            c._rows.nbytes + c._steps.nbytes + c._values.nbytes
+            for c in self.columns.values()
+        )
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.columns
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def records(self, start: int = 0, stop: int | None = None) -> list[dict[str, Any]]:
+        """Rebuild the log entries of rows `[start, stop)`."""
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+        out: list[dict[str, Any]] = [dict() for _ in range(max(stop - start, 0))]
+        for key, column in self.columns.items():
+            lo, hi = np.searchsorted(column.rows, [start, stop])
+            rows = column.rows[lo:hi] - start
+            for row, value in zip(rows.tolist(), column.values[lo:hi].tolist()):
+                out[row][key] = value
+        return out
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        # in blocks, to not rebuild everything at once
+        for start in range(0, self.n_rows, 4096):
+            yield from self.records(start, start + 4096)
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(self.n_rows)
+            return self.records(start, stop)[::stride]
+        if index < 0:
+            index += self.n_rows
+        if not 0 <= index < self.n_rows:
+            raise IndexError(index)
+        return self.records(index, index + 1)[0]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (ColumnarLog, list)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def metric(
+        self,
+        key: str,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """`(steps, values)` of a key, optionally within steps `[start, stop)`.
+
+        These are views into the log's arrays, not copies.
+        """
+        column = self.columns[key]
+        steps, values = column.steps, column.values
+        if start is None and stop is None:
+            return steps, values
+        if column.sorted_steps:
+            lo = 0 if start is None else np.searchsorted(steps, start, 'left')
+            hi = len(steps) if stop is None else np.searchsorted(steps, stop, 'left')
+            return steps[lo:hi], values[lo:hi]
+        mask = np.ones(len(steps), dtype=bool)
+        if start is not None:
+            mask &= steps >= start
+        if stop is not None:
+            mask &= steps < stop
+        return steps[mask], values[mask]
+
+    def aggregate(
+        self,
+        key: str,
+        fn: Callable[[np.ndarray], Any] = np.mean,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> Any:
+        """Apply a (vectorized) function to the values of a key, such as
+        `np.mean` or `np.max`, optionally within steps `[start, stop)`."""
+        return fn(self.metric(key, start, stop)[1])
+
+    def segment(
+        self,
+        start: int,
+        stop: int | None = None,
+        offset: int = 0,
+        keys: Iterable[str] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Arrays of rows `[start, stop)`, to be saved as an `.npz`.
+
+        `offset` is added to the row numbers, for a log holding only part of
+        the rows of another. `keys` limits which columns are included.
+        """
+        stop = self.n_rows if stop is None else stop
+        out = {_RANGE: np.array([start, stop], dtype=np.int64) + offset}
+        keys = self.columns if keys is None else keys
+        for key in keys:
+            column = self.columns[key]
+            lo, hi = np.searchsorted(column.rows, [start, stop])
+            if hi > lo:
+                out[f'{key}/rows'] = column.rows[lo:hi] + offset
+                out[f'{key}/steps'] = column.steps[lo:hi]
+                out[f'{key}/values'] = column.values[lo:hi]
+        return out
+
+    @classmethod
+    def from_segments(
+        cls, segments: Iterable[Mapping[str, np.ndarray]]
+    ) -> 'ColumnarLog':
+        """Rebuild a log from segments, in order (see `extend_segments`)."""
+        log = cls()
+        log.extend_segments(segments)
+        return log
+
+    def extend_segments(self, segments: Iterable[Mapping[str, np.ndarray]]):
+        """Add the rows of segments, in order. Rows a column already has (e.g.
+        from a segment rewritten after a crash) are skipped."""
+        for segment in segments:
+            stop = int(segment[_RANGE][1])
+            keys = {name.rpartition('/')[0] for name in segment if name != _RANGE}
+            for key in keys:
+                column = self.columns.get(key)
+                rows = segment[f'{key}/rows']
+                keep = rows > (-1 if column is None else column.last_row)
+                if not keep.any():
+                    continue
+                arrays = [segment[f'{key}/{field}'][keep] for field in _FIELDS]
+                if column is None:
+                    column = self.columns[key] = Column(arrays[2].dtype, len(rows))
+                column.extend(*arrays)
+            self.n_rows = max(self.n_rows, stop)
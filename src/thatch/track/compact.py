@@ -0,0 +1,248 @@
+"""Compacted, memory-mappable layout of a run's numeric metrics.
+
+Compacting a run writes each of its numeric (bool/int/float) columns as plain
+`.npy` arrays, which are read with `np.load(..., mmap_mode='r')`, so reading a
+range of steps of one metric only touches the pages holding that range:
+
+```
+runs/<uuid>/metrics/
+    000000100000/  # compacted rows [0, 100000)
+        manifest.json
+        loss/
+            rows.npy
+            steps.npy
+            values.npy
+            index.npy  # every `index_stride`-th step, if steps are sorted
+            pyramid/  # if steps are sorted, see `pyramid`
+                4.npy
+                16.npy
+                ...
+        ...
+```
+
+Each compaction is written to a new directory named by its number of rows,
+so readers always see a complete one. Older ones are only removed once they've
+been superseded for a while (see `remove_superseded`), as readers may still
+be opening them.
+The column segments are then rewritten without the compacted columns, as
+those are only read from here (see `DirRoot.compact`).
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import numpy as np
+
+from .columns import Column, ColumnarLog
+from .pyramid import downsample, raw_level, write_pyramid
+
+INDEX_STRIDE = 4096
+
+
+class MappedMetric:
+    """Memory-mapped arrays of one compacted metric.
+
+    `read` returns views of the mapped files, so it copies nothing, and only
+    the pages of the requested range are ever read from disk.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sorted_steps: bool,
+        levels: list[int] | None = None,
+    ):
+        self.path = path
+        self.sorted_steps = sorted_steps
+        # bucket sizes of the levels of its pyramid
+        self.levels = [] if levels is None else levels
+        self.rows = np.load(path / 'rows.npy', mmap_mode='r')
+        self.steps = np.load(path / 'steps.npy', mmap_mode='r')
+        self.values = np.load(path / 'values.npy', mmap_mode='r')
+        # small enough to read whole
+        self.index = np.load(path / 'index.npy') if sorted_steps else None
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def _bisect(self, step: int) -> int:
+        """Position of the first value at or after `step` (steps are sorted)."""
+        assert self.index is not None
+        # the index narrows it down to one block, which is then bisected
+        block = max(int(np.searchsorted(self.index, step, 'left')) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + 2 * INDEX_STRIDE, len(self.steps))
+        return lo + int(np.searchsorted(self.steps[lo:hi], step, 'left'))
+
+    def read(
+        self,
+        start: int | None = None,
+        stop: int | None = None,
+        stride: int = 1,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """`(steps, values)` within steps `[start, stop)`, every `stride`-th."""
+        if self.index is None:
+            # unsorted steps can't be bisected
+            mask = np.ones(len(self.steps), dtype=bool)
+            if start is not None:
+                mask &= self.steps >= start
+            if stop is not None:
+                mask &= self.steps < stop
+            positions = np.flatnonzero(mask)[::stride]
+            return self.steps[positions], self.values[positions]
+        lo = 0 if start is None else self._bisect(start)
+        hi = len(self.steps) if stop is None else self._bisect(stop)
+        return self.steps[lo:hi:stride], self.values[lo:hi:stride]
+
+    def summary(
+        self,
+        points: int,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """At most `points` buckets of the values within steps `[start, stop)`
+        (see `pyramid.downsample`), read from the coarsest level of the
+        pyramid with at least `points` buckets in that range."""
+        if self.index is None:
+            steps, values = self.read(start, stop)
+            order = np.argsort(steps, kind='stable')
+            return downsample(raw_level(steps[order], values[order]), points)
+        lo = 0 if start is None else self._bisect(start)
+        hi = len(self.steps) if stop is None else self._bisect(stop)
+        bucket = max((b for b in self.levels if (hi - lo) // b >= points), default=1)
+        if bucket == 1:
+            level = raw_level(self.steps[lo:hi], self.values[lo:hi])
+        else:
+            level = np.load(self.path / 'pyramid' / f'{bucket}.npy', mmap_mode='r')
+            # buckets of the range's first and last values
+            level = level[lo // bucket : -(-hi // bucket)]
+        return downsample(level, points)
+
+    def column(self) -> Column:
+        return Column.wrap(self.rows, self.steps, self.values, self.sorted_steps)
+
+
+class Compacted:
+    """The latest compaction of a run, if it has one."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / 'manifest.json', 'rt') as f:
+            manifest = json.load(f)
+        self.n_rows: int = manifest['n_rows']
+        # key -> {'dir': ..., 'sorted': ..., 'levels': ...}
+        self.keys: dict[str, dict[str, Any]] = manifest['keys']
+
+    @classmethod
+    def latest(cls, run_path: Path) -> 'Compacted | None':
+        metrics_path = run_path / 'metrics'
+        if not metrics_path.exists():
+            return None
+        # incomplete ones have no manifest yet (or are still temporary)
+        done = sorted(
+            p
+            for p in metrics_path.iterdir()
+            if p.name.isdigit() and (p / 'manifest.json').exists()
+        )
+        return cls(done[-1]) if done else None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def metric(self, key: str) -> MappedMetric:
+        info = self.keys[key]
+        # compactions from before pyramids have no levels
+        levels = info.get('levels', [])
+        return MappedMetric(self.path / info['dir'], info['sorted'], levels)
+
+    def log(self) -> ColumnarLog:
+        """A log of just the compacted columns, as memory-mapped arrays."""
+        log = ColumnarLog()
+        for key in self.keys:
+            log.columns[key] = self.metric(key).column()
+        log.n_rows = self.n_rows
+        return log
+
+
+def write_compacted(
+    run_path: Path,
+    log: ColumnarLog,
+    grace: float = 3600.0,
+) -> Compacted:
+    """Write the numeric columns of `log` as a new compaction of the run, and
+    remove those superseded more than `grace` seconds ago."""
+    metrics_path = run_path / 'metrics'
+    name = f'{log.n_rows:012d}'
+    tmp_path = metrics_path / f'{name}.{os.getpid()}.tmp'
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    keys = dict()
+    for key, column in log.columns.items():
+        if column.dtype.kind not in 'bif':
+            continue
+        key_dir = quote(key, safe='')
+        key_path = tmp_path / key_dir
+        os.makedirs(key_path)
+        np.save(key_path / 'rows.npy', column.rows)
+        np.save(key_path / 'steps.npy', column.steps)
+        np.save(key_path / 'values.npy', column.values)
+        levels = []
+        if column.sorted_steps:
+            np.save(key_path / 'index.npy', column.steps[::INDEX_STRIDE])
+            levels = write_pyramid(key_path / 'pyramid', column.steps, column.values)
+        keys[key] = {'dir': key_dir, 'sorted': column.sorted_steps, 'levels': levels}
+    # written last, marking the compaction as complete
+    with open(tmp_path / 'manifest.json', 'wt') as f:
+        json.dump({'n_rows': log.n_rows, 'keys': keys}, f)
+
+    path = metrics_path / name
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # the same rows were compacted meanwhile, e.g. by another process
+        if not path.exists():
+            raise
+        shutil.rmtree(tmp_path)
+    remove_superseded(run_path, grace)
+    return Compacted(path)
+
+
+def remove_superseded(run_path: Path, grace: float = 3600.0) -> list[str]:
+    """Remove the compactions of a run which a newer one superseded more than
+    `grace` seconds ago, returning their names. Until then, they're kept for
+    readers which found them before the newer one was written, just as
+    `ObjectStore.gc` keeps recent blobs. Leftovers of interrupted compactions
+    are removed once as old."""
+    metrics_path = run_path / 'metrics'
+    if not metrics_path.exists():
+        return []
+    cutoff = time.time() - grace
+    done = sorted(
+        p
+        for p in metrics_path.iterdir()
+        if p.name.isdigit() and (p / 'manifest.json').exists()
+    )
+    removed = []
+    for old, new in zip(done, done[1:]):
+        try:
+            superseded = (new / 'manifest.json').stat().st_mtime <= cutoff
+        except FileNotFoundError:
+            continue
+        if superseded:
+            # possibly by another process at once
+            shutil.rmtree(old, ignore_errors=True)
+            removed.append(old.name)
+    for tmp_path in metrics_path.glob('*.tmp'):
+        try:
+            if tmp_path.stat().st_mtime <= cutoff:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+    return removed
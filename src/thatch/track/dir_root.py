@@ -1,3 +1,37 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+import zipfile
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+import numpy as np
+
+from . import log_file
+from .cache import LogCache
+from .checkpoint import dump_checkpoint, load_checkpoint, manifest_digests
+from .columns import ColumnarLog, load_segment, segment_range
+from .compact import Compacted, write_compacted
+from .follow import Follower
+from .objects import ObjectStore
+from .param import Condition, flatten_params, param_json, param_sql_value
+from .root import ThatchRoot
+from .run import BaseRun
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# fewest logs to decode for `load_runs` to use a process pool by default, as
+# sending decoded logs between processes costs about as much as decoding them
+PARALLEL_THRESHOLD = 256
+
 
 class DirRoot(ThatchRoot):
     """Store run data and metadata in a `.thatch/` directory.
@@ -5,74 +39,924 @@ class DirRoot(ThatchRoot):
     `.thatch/` contains a `root.sqlite` file storing run info/metadata, such as
     each run's start time, uuid, and other run info. In the `.thatch/runs/`
     directory, we have a uuid-labeled directory for each run, were run data is
-    stored. `log.pickle.zlib` stores the log of tracking information, and
-    `config.json` contains the run's config (if present).
-
-    Additional files such as visualizations or checkpoints go within a
-    subdirectory `.thatch/runs/<uuid>/artifacts/`. TODO: how exactly?
+    stored. `columns/` stores the log of tracking information, and
+    `config.json` contains the run's config (if present). `summary.json` has
+    the run's `summary` values.
+
+    `root.sqlite` also indexes the (flattened) config params of each run in a
+    `run_params` table, so `filter` with `Param` conditions and `group_by`
+    config keys are single queries, rather than reading every `config.json`.
+
+    Many processes can write runs to the same root at once (e.g. a sweep):
+    `root.sqlite` is in WAL mode, and each write waits for and retries after
+    other processes' transactions. See `transaction` to batch writes.
+
+    The log is append-only, and saved by column (see `ColumnarLog`): each
+    `write_run` writes the records tracked since the last one as a new
+    `columns/<first row>.npz` segment, holding each key's `.npy` arrays of rows,
+    steps and values. Segments are zlib-compressed at `compress_level`, which
+    defaults to 1, as for arrays of numbers it's nearly as small as higher
+    levels, and several times faster. `load_run` reads these, so that loading a
+    run's metrics is a handful of array reads rather than unpickling every
+    record, and `read_log` rebuilds the records from them. Runs written before
+    logs were saved by column only have a `log.pickle.zlib` (see `log_file`),
+    which is converted to columns once they're written to or compacted.
+
+    Other streams of a run (see `BaseRun.streams`) are appended to log files of
+    their own, `streams/<name>.pickle.zlib`, and read with `load_stream`.
+
+    `follow` and `follow_runs` yield records of runs in progress as they're
+    appended, tracking how far each log was read, so only new chunks are read.
+
+    Finished runs can be compacted (`compact`), which moves their numeric
+    columns to plain `.npy` files under `metrics/`, memory-mapped when read, so
+    `read_metric` of a range of steps only reads that range. Compaction also
+    writes a pyramid of summaries of each metric (see `pyramid`), which
+    `read_metric_summary` reads at the resolution asked for.
+
+    Additional files such as visualizations or checkpoints are saved as
+    artifacts of a run (`write_artifact`). Their contents are stored once in a
+    content-addressed `.thatch/objects/` store (see `objects`), shared by all
+    runs, and the `artifacts` table of `root.sqlite` maps each run's artifact
+    paths to them. `gc` removes contents no artifact refers to anymore.
 
     ```
     .thatch/ # root path for saving thatch run (meta)data
         root.sqlite
         runs/
             7ca873a1-9673-4d1d-89d2-82a8b5b52a7a/
-                log.pickle.zlib
+                metrics/  # once compacted
+                    000000100000/
+                        manifest.json
+                        loss/{rows,steps,values,index}.npy
+                columns/
+                    000000000000.npz
+                    000000000010.npz
+                    ...
+                streams/
+                    sys.pickle.zlib
                 config.json
-                artifacts/
-                    some_validation_vizualization.jpeg
-                    checkpoints/
-                        10.cpkt
-                        20.cpkt
-                        latest.ckpt
-                        ...
+                summary.json
 
             ...
+        objects/
+            3f/
+                a9c2...  # contents of artifacts, by sha256
+            ...
     ```
 
-    """
-
-    def __init__(self, path):
-        self.path = path
-        os.makedirs(self.path, exist_ok=True)
-        self.con = sqlite3.connect(self.path / 'root.sqlite')
-        cur = self.con.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS root(
-                id INTEGER PRIMARY KEY,
-                uuid TEXT NOT NULL UNIQUE,
-                experiment TEXT NOT NULL,
-                tags TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL
-            ) STRICT;
-        ''')
-        self.con.commit()
-
-
-    def write_run(self, run):
-        ...
-
-    def write_artifact(self, run_uuid, path, bytes):
-        ...
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    Artifact paths (e.g. `some_validation_vizualization.jpeg` or
+    `checkpoints/10.ckpt`) only exist as rows of the `artifacts` table.
 
+    Checkpoints (`write_checkpoint`) are incremental: arrays are stored in
+    `objects` by chunk, so each checkpoint only writes the chunks which changed
+    since earlier ones, plus a manifest saved as the artifact
+    `checkpoints/<step>.ckpt` (and `checkpoints/latest.ckpt`).
 
+    """
 
+    def __init__(
+        self,
+        path: str | os.PathLike = '.thatch',
+        compress_level: int = 1,
+        timeout: float = 30.0,
+        retries: int = 5,
+        cache_bytes: int = 1 << 30,
+    ):
+        self.path = Path(path)
+        self.compress_level = compress_level
+        self.retries = retries
+        os.makedirs(self.path / 'runs', exist_ok=True)
+        # Transactions are managed by `transaction`, rather than by the sqlite3
+        # module. The connection is shared with the background thread of
+        # `ThatchRun(async_write=True)`, guarded by `_lock`.
+        self.con = sqlite3.connect(
+            self.path / 'root.sqlite',
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.RLock()
+        self._depth = 0
+        # WAL lets readers and a writer work at once, from any process, and
+        # with synchronous=NORMAL commits don't each wait on an fsync.
+        _retry(lambda: self.con.execute('PRAGMA journal_mode=WAL'), retries)
+        self.con.execute('PRAGMA synchronous=NORMAL')
+
+        with self.transaction():
+            cur = self.con.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS root(
+                    id INTEGER PRIMARY KEY,
+                    uuid TEXT NOT NULL UNIQUE,
+                    experiment TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL
+                ) STRICT;
+            """)
+            has_params = cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='run_params'"
+            ).fetchone()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS run_params(
+                    run_id INTEGER NOT NULL REFERENCES root(id),
+                    key TEXT NOT NULL,
+                    value ANY,
+                    json TEXT NOT NULL,
+                    PRIMARY KEY (run_id, key)
+                ) STRICT;
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS run_params_key_value
+                ON run_params(key, value);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS run_params_key_json
+                ON run_params(key, json);
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts(
+                    run_id INTEGER NOT NULL REFERENCES root(id),
+                    path TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (run_id, path)
+                ) STRICT;
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS artifacts_digest ON artifacts(digest);
+            """)
+            if not has_params:
+                # a root from before params were indexed
+                for run_id, uuid in cur.execute('SELECT id, uuid FROM root').fetchall():
+                    config = _read_json(self.run_path(uuid) / 'config.json')
+                    self._write_params(run_id, config)
+        self.log_cache = LogCache(cache_bytes)
+        self.objects = ObjectStore(self.path / 'objects')
+        # uuid -> number of log records already in its columns
+        self._log_written: dict[str, int] = dict()
+        # (uuid, stream name) -> the same, for a stream's file
+        self._streams_written: dict[tuple[str, str], int] = dict()
+        # pools of `load_runs`, by kind and number of workers
+        self._pools: dict[tuple[str, int], Executor] = dict()
+        # uuid -> run metadata as last written by this instance, to skip
+        # unchanged writes
+        self._meta_written: dict[str, tuple] = dict()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group writes into a single sqlite transaction (and commit).
+
+        `write_run` uses one per run, but several can be batched together,
+        which is much cheaper than committing each on its own:
+        > with root.transaction():
+        >     for run in runs:
+        >         root.write_run(run)
+
+        The write lock is taken when the transaction begins, waiting for (and
+        retrying after) other processes' transactions. Nested transactions are
+        part of the outermost one.
+        """
+        with self._lock:
+            if self._depth > 0:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            _retry(lambda: self.con.execute('BEGIN IMMEDIATE'), self.retries)
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self.con.execute('ROLLBACK')
+                # whatever was written in the transaction is gone
+                self._meta_written.clear()
+                raise
+            else:
+                _retry(lambda: self.con.execute('COMMIT'), self.retries)
+            finally:
+                self._depth = 0
+
+    def run_path(self, uuid: str) -> Path:
+        return self.path / 'runs' / uuid
+
+    def log_path(self, uuid: str) -> Path:
+        return self.run_path(uuid) / 'log.pickle.zlib'
+
+    def columns_path(self, uuid: str) -> Path:
+        return self.run_path(uuid) / 'columns'
+
+    def stream_path(self, uuid: str, name: str) -> Path:
+        assert re.fullmatch(r'[\w.-]+', name), f'invalid stream name: {name!r}'
+        return self.run_path(uuid) / 'streams' / f'{name}.pickle.zlib'
+
+    def write_run(self, run: BaseRun):
+        with self.transaction():
+            self._write_run(run)
+
+    def _write_run(self, run: BaseRun):
+        run_path = self.run_path(run.uuid)
+        # (re)written on the first write of the run from this root instance
+        write_config = run.uuid not in self._meta_written
+        os.makedirs(run_path, exist_ok=True)
+
+        meta = (
+            run.experiment,
+            json.dumps(run.tags),
+            _format_time(run.start_time),
+            _format_time(run.end_time),
+        )
+        if write_config or self._meta_written.get(run.uuid) != meta:
+            self.con.execute(
+                """
+                INSERT INTO root(uuid, experiment, tags, start_time, end_time)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(uuid) DO UPDATE SET
+                    experiment=excluded.experiment,
+                    tags=excluded.tags,
+                    start_time=excluded.start_time,
+                    end_time=excluded.end_time
+                """,
+                (run.uuid, *meta),
+            )
+            self._meta_written[run.uuid] = meta
+        if write_config:
+            (run_id,) = self.con.execute(
+                'SELECT id FROM root WHERE uuid=?', (run.uuid,)
+            ).fetchone()
+            self._write_params(run_id, run.config)
+            _write_json(run_path / 'config.json', run.config)
+
+        _write_json(run_path / 'summary.json', run.summary)
+        n_written = self._n_written(run.uuid)
+        if n_written < len(run.log):
+            self._append(run.uuid, run.log, n_written)
+        for name, log in run.streams.items():
+            n_written = self._n_stream_written(run.uuid, name)
+            if n_written < len(log):
+                self._append_stream(run.uuid, name, log[n_written:])
+        if run.end_time is not None:
+            self._merge_segments(run.uuid)
+
+    def _write_params(self, run_id: int, config: dict[str, Any]):
+        """Index a run's config params, for `filter`/`group_by` queries."""
+        self.con.executemany(
+            'INSERT OR REPLACE INTO run_params(run_id, key, value, json) '
+            'VALUES (?, ?, ?, ?)',
+            [
+                (run_id, key, param_sql_value(value), param_json(value))
+                for key, value in flatten_params(config).items()
+            ],
+        )
+
+    def _n_written(self, uuid: str) -> int:
+        if uuid not in self._log_written:
+            self._columns_from_log(uuid)
+            self._log_written[uuid] = self.log_length(uuid)
+        return self._log_written[uuid]
+
+    def _columns_from_log(self, uuid: str):
+        """Save the log of a run from before logs were saved by column as a
+        column segment, if it has one."""
+        run_path = self.run_path(uuid)
+        if not self.columns_path(uuid).exists() and self.log_path(uuid).exists():
+            self.write_columns(uuid, 0, decode_log(run_path).segment(0))
+
+    def log_length(self, uuid: str) -> int:
+        """Number of records in a run's log, as written by any process, reading
+        only the row range of its last column segment."""
+        run_path = self.run_path(uuid)
+        if not self.columns_path(uuid).exists():
+            path = self.log_path(uuid)
+            if not path.exists():
+                return 0
+            with open(path, 'rb') as f:
+                return log_file.scan_chunks(f)[1]
+        compacted = Compacted.latest(run_path)
+        n_rows = 0 if compacted is None else compacted.n_rows
+        paths = sorted(self.columns_path(uuid).glob('*.npz'))
+        if paths:
+            n_rows = max(n_rows, segment_range(paths[-1])[1])
+        return n_rows
+
+    def append_log(self, uuid: str, records: list[Any]):
+        """Append records to the end of a run's log, as one chunk."""
+        if len(records) == 0:
+            return
+        with self._lock:
+            # numbered from the end of the log, for the implicit steps
+            n_written = self._n_written(uuid)
+            log = ColumnarLog()
+            log.n_rows = n_written
+            log.extend(records)
+            self._append(uuid, log, n_written)
+
+    def _append(self, uuid: str, log: ColumnarLog, start: int):
+        """Append rows `start:` of `log` to the run's columns, as a segment."""
+        n_written = self._n_written(uuid)
+        offset = n_written - start
+        self.write_columns(uuid, n_written, log.segment(start, offset=offset))
+        self._log_written[uuid] = n_written + len(log) - start
+
+    def _n_stream_written(self, uuid: str, name: str) -> int:
+        if (uuid, name) not in self._streams_written:
+            path = self.stream_path(uuid, name)
+            os.makedirs(path.parent, exist_ok=True)
+            f, n_records = log_file.open_for_append(path)
+            f.close()
+            self._streams_written[uuid, name] = n_records
+        return self._streams_written[uuid, name]
+
+    def append_stream(self, uuid: str, name: str, records: list[Any]):
+        """Append records to one of a run's streams, as one chunk."""
+        if len(records) == 0:
+            return
+        with self._lock:
+            self._n_stream_written(uuid, name)
+            self._append_stream(uuid, name, records)
+
+    def _append_stream(self, uuid: str, name: str, records: list[Any]):
+        chunk = log_file.encode_chunk(records, self.compress_level)
+        with open(self.stream_path(uuid, name), 'ab') as f:
+            f.write(chunk)
+        self._streams_written[uuid, name] += len(records)
+
+    def load_stream(self, uuid: str, name: str) -> ColumnarLog:
+        return ColumnarLog.from_records(
+            log_file.iter_records(self.stream_path(uuid, name))
+        )
+
+    def write_columns(self, uuid: str, start: int, segment: dict[str, np.ndarray]):
+        """Save a segment from `ColumnarLog.segment(start)` with the run's
+        columns. Written to a temp file first, so a segment is either complete
+        or missing, and one interrupted partway is simply written again."""
+        columns_path = self.columns_path(uuid)
+        os.makedirs(columns_path, exist_ok=True)
+        path = columns_path / f'{start:012d}.npz'
+        tmp_path = path.with_suffix('.tmp')
+        self._save_segment(tmp_path, segment)
+        os.replace(tmp_path, path)
+
+    def _save_segment(self, path: Path, segment: dict[str, np.ndarray]):
+        # as `np.savez_compressed` does, but at the root's `compress_level`
+        with zipfile.ZipFile(
+            path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compress_level
+        ) as zf:
+            for name, array in segment.items():
+                with zf.open(f'{name}.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, array, allow_pickle=True)
+
+    def _merge_segments(self, uuid: str):
+        """Merge the column segments written since the last compaction (one per
+        `write_run`, or per batch with `async_write`) into one, so finished
+        runs don't leave many small files."""
+        compacted = Compacted.latest(self.run_path(uuid))
+        start = 0 if compacted is None else compacted.n_rows
+        paths = [
+            path
+            for path in sorted(self.columns_path(uuid).glob('*.npz'))
+            if int(path.stem) >= start
+        ]
+        if len(paths) <= 1:
+            return
+        log = ColumnarLog()
+        log.extend_segments(load_segment(path) for path in paths)
+        # the merged segment replaces the first, and the rest are removed after,
+        # so rows are never missing (and only duplicated until then)
+        first = int(paths[0].stem)
+        self.write_columns(uuid, first, log.segment(first))
+        for path in paths[1:]:
+            path.unlink()
+
+    def load_log(self, uuid: str) -> ColumnarLog:
+        """A run's decoded log, from `log_cache` if it's unchanged since it was
+        last decoded. Note that cached logs are shared, so don't modify them."""
+        signature = _log_signature(self.run_path(uuid))
+        log = self.log_cache.get(uuid, signature)
+        if log is None:
+            log = decode_log(self.run_path(uuid))
+            self.log_cache.put(uuid, signature, log)
+        return log
+
+    def load_metric(self, uuid: str, key: str) -> tuple[np.ndarray, np.ndarray]:
+        return self.read_metric(uuid, key)
+
+    def read_metric(
+        self,
+        uuid: str,
+        key: str,
+        start: int | None = None,
+        stop: int | None = None,
+        stride: int = 1,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """`(steps, values)` of one metric of a run, within steps `[start,
+        stop)` and every `stride`-th value.
+
+        For compacted runs (see `compact`), these are views of memory-mapped
+        files, so only the requested range is read. Otherwise, only this key's
+        arrays are read from the column segments.
+        """
+        columns_path = self.columns_path(uuid)
+        if not columns_path.exists():
+            steps, values = super().load_metric(uuid, key)
+            return steps[::stride], values[::stride]
+
+        paths = sorted(columns_path.glob('*.npz'))
+        log = ColumnarLog()
+        compacted = Compacted.latest(self.run_path(uuid))
+        if compacted is not None:
+            if key in compacted:
+                metric = compacted.metric(key)
+                if _nothing_since(compacted, paths):
+                    return metric.read(start, stop, stride)
+                log.columns[key] = metric.column()
+            log.n_rows = compacted.n_rows
+        log.extend_segments(load_segment(path, [key]) for path in paths)
+        if key not in log:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        steps, values = log.metric(key, start, stop)
+        return steps[::stride], values[::stride]
+
+    def read_metric_summary(
+        self,
+        uuid: str,
+        key: str,
+        points: int = 1000,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Summary of one metric of a run in at most `points` buckets, within
+        steps `[start, stop)` (see `ThatchRoot.read_metric_summary`).
+
+        For compacted runs, this reads from the metric's precomputed pyramid
+        (see `pyramid`), so it takes about as long for any number of values.
+        """
+        compacted = Compacted.latest(self.run_path(uuid))
+        if compacted is not None and key in compacted:
+            paths = sorted(self.columns_path(uuid).glob('*.npz'))
+            if _nothing_since(compacted, paths):
+                return compacted.metric(key).summary(points, start, stop)
+        return super().read_metric_summary(uuid, key, points, start, stop)
+
+    def compact(self, uuid: str) -> bool:
+        """Convert a run's numeric metrics to the memory-mappable layout of
+        `compact.Compacted`, returning whether there was anything to do.
+
+        Meant for finished runs (see `compact_finished`); a run which is
+        logged to afterwards can be compacted again. Only the column segments
+        which were compacted are removed, so records appended meanwhile (e.g.
+        from another process) are kept.
+
+        The columns are read and the compaction written without holding the
+        root's write lock, so other writers aren't held up. It's only taken to
+        check that the segments read weren't rewritten meanwhile (e.g. merged
+        by the run's writer), and to swap in the new segment; if they were,
+        the run is compacted again from what's there now.
+        """
+        run_path = self.run_path(uuid)
+        columns_path = self.columns_path(uuid)
+        if not columns_path.exists():
+            with self.transaction():
+                self._columns_from_log(uuid)
+        while True:
+            stamps = {
+                path: _file_signature(path)
+                for path in sorted(columns_path.glob('*.npz'))
+            }
+            log = decode_log(run_path, list(stamps))
+            latest = Compacted.latest(run_path)
+            if latest is not None and latest.n_rows == log.n_rows:
+                return False
+
+            compacted = write_compacted(run_path, log)
+            # the other columns are left as a single segment
+            others = [key for key in log.columns if key not in compacted]
+            tmp_path = columns_path / f'{0:012d}.{os.getpid()}.tmp'
+            self._save_segment(tmp_path, log.segment(0, keys=others))
+            with self.transaction():
+                if all(_file_signature(p) == stamp for p, stamp in stamps.items()):
+                    os.replace(tmp_path, columns_path / f'{0:012d}.npz')
+                    for path in stamps:
+                        if int(path.stem) > 0:
+                            path.unlink()
+                    return True
+            tmp_path.unlink()
+
+    def compact_finished(self) -> list[str]:
+        """Compact all finished runs which aren't already, returning their uuids."""
+        with self._lock:
+            rows = self.con.execute(
+                "SELECT uuid FROM root WHERE end_time != '' ORDER BY id"
+            ).fetchall()
+        return [uuid for (uuid,) in rows if self.compact(uuid)]
+
+    def read_log(self, uuid: str) -> Iterator[Any]:
+        """Iterate over the log records of a run, rebuilt from its columns a
+        block at a time."""
+        if not self.columns_path(uuid).exists():
+            return log_file.iter_records(self.log_path(uuid))
+        return iter(decode_log(self.run_path(uuid)))
+
+    def uuids(self) -> list[str]:
+        with self._lock:
+            rows = self.con.execute('SELECT uuid FROM root ORDER BY id').fetchall()
+        return [uuid for (uuid,) in rows]
+
+    def runs_since(self, last_id: int) -> tuple[int, list[str]]:
+        """uuids of runs added after the one with id `last_id`, in order, and
+        the id of the last one (see `Follower`)."""
+        with self._lock:
+            rows = self.con.execute(
+                'SELECT id, uuid FROM root WHERE id > ? ORDER BY id', (last_id,)
+            ).fetchall()
+        return (rows[-1][0] if rows else last_id), [uuid for _, uuid in rows]
+
+    def finished(self, uuids: list[str]) -> set[str]:
+        """Those of `uuids` whose runs have an end time."""
+        out = set()
+        with self._lock:
+            # in batches, to stay within sqlite's limit of parameters
+            for i in range(0, len(uuids), 500):
+                batch = uuids[i : i + 500]
+                out.update(
+                    uuid
+                    for (uuid,) in self.con.execute(
+                        "SELECT uuid FROM root WHERE end_time != '' "
+                        f'AND uuid IN ({", ".join("?" * len(batch))})',
+                        batch,
+                    )
+                )
+        return out
+
+    def follow(
+        self,
+        uuid: str,
+        interval: float = 1.0,
+        timeout: float | None = None,
+        from_start: bool = True,
+    ) -> Iterator[Any]:
+        """Yield a run's log records as they're appended, until it finishes.
+
+        > for record in root.follow(uuid):
+        >     print(record['step'], record['loss'])
+
+        The log is polled every `interval` seconds, reading only what was
+        appended since (see `Follower`). Stops early after `timeout` seconds
+        without new records.
+        """
+        follower = Follower(self, [uuid], from_start=from_start)
+        for _, records in follower.follow(interval, timeout):
+            yield from records
+
+    def follow_runs(
+        self,
+        *predicates: Condition | Callable[[BaseRun], bool],
+        interval: float = 1.0,
+        timeout: float | None = None,
+        from_start: bool = True,
+    ) -> Iterator[tuple[str, list[Any]]]:
+        """Yield `(uuid, records)` as records are appended to the logs of runs
+        in progress which match all `predicates` (as for `filter`), including
+        runs started later on.
+
+        This only stops after `timeout` seconds without new records, if given.
+        """
+        follower = Follower(self, None, predicates, from_start)
+        yield from follower.follow(interval, timeout)
+
+    def load_config(self, uuid: str) -> dict[str, Any]:
+        return _read_json(self.run_path(uuid) / 'config.json')
+
+    def select(self, condition: Condition, uuids: list[str]) -> list[str]:
+        sql, params = condition.to_sql()
+        with self._lock:
+            rows = self.con.execute(
+                f'SELECT uuid FROM root WHERE {sql}', params
+            ).fetchall()
+        matched = {uuid for (uuid,) in rows}
+        return [uuid for uuid in uuids if uuid in matched]
+
+    def param_values(
+        self,
+        keys: tuple[str, ...],
+        uuids: list[str],
+    ) -> dict[str, tuple[Any, ...]]:
+        marks = ', '.join('?' * len(keys))
+        with self._lock:
+            rows = self.con.execute(
+                f"""
+                SELECT root.uuid, run_params.key, run_params.json
+                FROM run_params JOIN root ON root.id = run_params.run_id
+                WHERE run_params.key IN ({marks})
+                """,
+                keys,
+            ).fetchall()
+        found: dict[tuple[str, str], Any] = {
+            (uuid, key): json.loads(value) for uuid, key, value in rows
+        }
+        return {uuid: tuple(found.get((uuid, k)) for k in keys) for uuid in uuids}
+
+    def load_run(self, uuid: str) -> BaseRun:
+        return self.load_runs([uuid], executor=None)[0]
+
+    def load_runs(
+        self,
+        uuids: list[str],
+        executor: 'str | Executor | None' = 'auto',
+        max_workers: int | None = None,
+    ) -> list[BaseRun]:
+        """Load several runs at once, optionally decoding their logs in
+        parallel.
+
+        Logs which aren't in `log_cache` are decoded on a pool of `executor`
+        ('process', 'thread', or an existing `Executor`), or in this process
+        with `None` or if there's only one. With 'auto', a process pool is only
+        used for at least `PARALLEL_THRESHOLD` logs, with more than one CPU.
+        Pools are started on first use, and kept by the root for later calls.
+        See `log_cache.stats()` for how often the cache was hit.
+        """
+        rows: dict[str, tuple] = dict()
+        with self._lock:
+            # in batches, to stay within sqlite's limit of parameters
+            for i in range(0, len(uuids), 500):
+                batch = uuids[i : i + 500]
+                rows |= {
+                    row[0]: row[1:]
+                    for row in self.con.execute(
+                        'SELECT uuid, experiment, tags, start_time, end_time '
+                        f'FROM root WHERE uuid IN ({", ".join("?" * len(batch))})',
+                        batch,
+                    )
+                }
+        for uuid in uuids:
+            if uuid not in rows:
+                raise KeyError(uuid)
+
+        signatures = {uuid: _log_signature(self.run_path(uuid)) for uuid in uuids}
+        logs = {uuid: self.log_cache.get(uuid, signatures[uuid]) for uuid in uuids}
+        missing = [uuid for uuid, log in logs.items() if log is None]
+        run_paths = [self.run_path(uuid) for uuid in missing]
+        if executor == 'auto':
+            parallel = len(missing) >= PARALLEL_THRESHOLD and (os.cpu_count() or 1) > 1
+            executor = 'process' if parallel else None
+        if executor is None or len(missing) <= 1:
+            decoded = [decode_log(run_path) for run_path in run_paths]
+        else:
+            if isinstance(executor, str):
+                executor = self._pool(executor, max_workers)
+            decoded = _map(decode_log, run_paths, executor)
+        for uuid, log in zip(missing, decoded):
+            logs[uuid] = log
+            self.log_cache.put(uuid, signatures[uuid], log)
+
+        runs = []
+        for uuid in uuids:
+            experiment, tags, start_time, end_time = rows[uuid]
+            run_path = self.run_path(uuid)
+            runs.append(
+                BaseRun(
+                    uuid=uuid,
+                    log=logs[uuid],
+                    config=_read_json(run_path / 'config.json'),
+                    experiment=experiment,
+                    tags=json.loads(tags),
+                    start_time=_parse_time(start_time),
+                    end_time=_parse_time(end_time),
+                    summary=_read_json(run_path / 'summary.json'),
+                )
+            )
+        return runs
+
+    def _pool(self, kind: str, max_workers: int | None) -> 'Executor':
+        """The root's pool of `kind` ('process' or 'thread'), started on first
+        use, as starting processes takes longer than decoding many logs."""
+        # imported here, as `concurrent.futures` is slow to import
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        max_workers = max_workers or os.cpu_count() or 1
+        pool = self._pools.get((kind, max_workers))
+        if pool is None:
+            match kind:
+                case 'thread':
+                    pool = ThreadPoolExecutor(max_workers)
+                case 'process':
+                    pool = ProcessPoolExecutor(max_workers)
+                case _:
+                    raise ValueError(f'unsupported executor: "{kind}"')
+            self._pools[kind, max_workers] = pool
+            # without waiting, as this may be during garbage collection
+            weakref.finalize(self, pool.shutdown, wait=False)
+        return pool
+
+    def _run_id(self, uuid: str) -> int:
+        row = self.con.execute('SELECT id FROM root WHERE uuid=?', (uuid,)).fetchone()
+        if row is None:
+            raise KeyError(uuid)
+        return row[0]
+
+    def write_artifact(
+        self,
+        run_uuid: str,
+        path: str,
+        data: bytes | BinaryIO | os.PathLike,
+    ) -> str:
+        """Save an artifact of a (written) run at `path`, returning its digest.
+
+        `data` is the artifact's contents, a binary file object to stream them
+        from, or the path of a file to copy. Contents are stored in `objects`,
+        so identical artifacts of any runs take up space only once.
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            digest = self.objects.put_bytes(bytes(data))
+        elif isinstance(data, os.PathLike):
+            digest = self.objects.put_file(data)
+        else:
+            digest = self.objects.put_stream(data)
+        size = self.objects.object_path(digest).stat().st_size
+
+        with self.transaction():
+            self.con.execute(
+                """
+                INSERT OR REPLACE INTO artifacts(run_id, path, digest, size)
+                VALUES (?, ?, ?, ?)
+                """,
+                (self._run_id(run_uuid), path, digest, size),
+            )
+        return digest
+
+    def artifacts(self, run_uuid: str) -> dict[str, str]:
+        """Paths of a run's artifacts, and their digests."""
+        with self._lock:
+            rows = self.con.execute(
+                """
+                SELECT path, digest FROM artifacts
+                WHERE run_id = (SELECT id FROM root WHERE uuid=?)
+                ORDER BY path
+                """,
+                (run_uuid,),
+            ).fetchall()
+        return dict(rows)
+
+    def open_artifact(self, run_uuid: str, path: str) -> BinaryIO:
+        digest = self.artifacts(run_uuid).get(path)
+        if digest is None:
+            raise FileNotFoundError(f'{run_uuid}: {path}')
+        return self.objects.open(digest)
+
+    def read_artifact(self, run_uuid: str, path: str) -> bytes:
+        with self.open_artifact(run_uuid, path) as f:
+            return f.read()
+
+    def delete_artifact(self, run_uuid: str, path: str):
+        """Remove an artifact of a run. Its contents stay in `objects` until
+        `gc`, since other artifacts may have the same contents."""
+        with self.transaction():
+            self.con.execute(
+                'DELETE FROM artifacts WHERE run_id=? AND path=?',
+                (self._run_id(run_uuid), path),
+            )
+
+    def write_checkpoint(self, run_uuid: str, step: int, state: Any) -> str:
+        """Save a checkpoint of a (written) run's `state` at `step`, returning
+        the digest of its manifest.
+
+        Only chunks of arrays which changed since earlier checkpoints are
+        written (see `checkpoint`). The manifest is saved as the artifact
+        `checkpoints/<step>.ckpt`, and as `checkpoints/latest.ckpt`.
+        """
+        manifest = dump_checkpoint(self.objects, state, step)
+        with self.transaction():
+            self.write_artifact(run_uuid, f'checkpoints/{step}.ckpt', manifest)
+            return self.write_artifact(run_uuid, 'checkpoints/latest.ckpt', manifest)
+
+    def load_checkpoint(
+        self,
+        run_uuid: str,
+        step: int | None = None,
+    ) -> tuple[int, Any]:
+        """`(step, state)` of a run's checkpoint at `step`, or its latest one."""
+        name = 'latest' if step is None else str(step)
+        manifest = self.read_artifact(run_uuid, f'checkpoints/{name}.ckpt')
+        return load_checkpoint(self.objects, manifest)
+
+    def checkpoints(self, run_uuid: str) -> list[int]:
+        """Steps of a run's checkpoints, in order."""
+        return sorted(
+            int(path[len('checkpoints/') : -len('.ckpt')])
+            for path in self.artifacts(run_uuid)
+            if re.fullmatch(r'checkpoints/\d+\.ckpt', path)
+        )
+
+    def gc(self, grace: float = 3600.0) -> list[str]:
+        """Remove stored contents which no artifact refers to anymore, returning
+        their digests. See `ObjectStore.gc` for `grace`.
+
+        Chunks of checkpoints are referred to by their manifests, so those are
+        kept as long as a checkpoint is.
+        """
+        with self._lock:
+            rows = self.con.execute('SELECT DISTINCT digest FROM artifacts').fetchall()
+            manifests = self.con.execute(
+                "SELECT DISTINCT digest FROM artifacts WHERE path LIKE '%.ckpt'"
+            ).fetchall()
+        referenced = {digest for (digest,) in rows}
+        for (digest,) in manifests:
+            try:
+                manifest = self.objects.read(digest)
+            except FileNotFoundError:
+                continue
+            referenced.update(manifest_digests(manifest))
+        return self.objects.gc(referenced, grace)
+
+
+def decode_log(run_path: Path, paths: list[Path] | None = None) -> ColumnarLog:
+    """Decode the log of the run at `run_path`, preferring its columns (all of
+    its segments, or just `paths`)."""
+    columns_path = run_path / 'columns'
+    if columns_path.exists():
+        compacted = Compacted.latest(run_path)
+        log = ColumnarLog() if compacted is None else compacted.log()
+        if paths is None:
+            paths = sorted(columns_path.glob('*.npz'))
+        log.extend_segments(load_segment(path) for path in paths)
+        return log
+    return ColumnarLog.from_records(log_file.iter_records(run_path / 'log.pickle.zlib'))
+
+
+def _nothing_since(compacted: Compacted, segment_paths: list[Path]) -> bool:
+    """Whether no column segments were written since the compaction."""
+    return all(int(path.stem) < compacted.n_rows for path in segment_paths)
+
+
+def _map(fn: Callable[[Any], Any], items: list[Any], pool: 'Executor') -> list[Any]:
+    # about 4 chunks per worker, if the pool says how many it has
+    max_workers = getattr(pool, '_max_workers', None) or os.cpu_count() or 1
+    chunksize = max(1, len(items) // (4 * max_workers))
+    return list(pool.map(fn, items, chunksize=chunksize))
+
+
+def _log_signature(run_path: Path) -> tuple:
+    """Changes whenever the decoded log of a run would: its log file, and the
+    names, mtimes and sizes of its column segments and compactions."""
+    signature: list[Any] = [_file_signature(run_path / 'log.pickle.zlib')]
+    for name in ('columns', 'metrics'):
+        try:
+            with os.scandir(run_path / name) as entries:
+                signature.extend(
+                    sorted(
+                        (entry.name, *_file_signature(Path(entry.path)))
+                        for entry in entries
+                    )
+                )
+        except FileNotFoundError:
+            pass
+    return tuple(signature)
+
+
+def _file_signature(path: Path) -> tuple[int, int]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return (0, 0)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _format_time(t: datetime | None) -> str:
+    # unfinished runs have no end time
+    return '' if t is None else t.isoformat()
+
+
+def _parse_time(s: str) -> datetime | None:
+    return None if s == '' else datetime.fromisoformat(s)
+
+
+def _write_json(path: Path, data: dict[str, Any]):
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wt') as f:
+        json.dump(data, f, default=repr)
+    os.replace(tmp_path, path)
+
+
+def _retry[R](fn: Callable[[], R], retries: int) -> R:
+    """Call `fn`, retrying with backoff while the database is locked by others
+    (beyond the connection's own busy timeout)."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            locked = 'locked' in str(e) or 'busy' in str(e)
+            if not locked or attempt == retries:
+                raise
+            time.sleep(0.05 * 2**attempt)
+    raise AssertionError('unreachable')
+
+
+def _read_json(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return dict()
+    with open(path, 'rt') as f:
+        return json.load(f)
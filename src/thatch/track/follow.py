@@ -0,0 +1,164 @@
+"""Following the logs of runs in progress, as records are appended to them.
+
+A `Follower` keeps the number of rows read of each run's log. Each `poll` only
+lists the column segments of each run (see `DirRoot.write_columns`), and reads
+just those written or rewritten since, so its cost doesn't grow with the length
+of the logs: a directory listing per followed run, plus a query of the root for
+which runs have started or finished since.
+"""
+
+import os
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .columns import ColumnarLog, load_segment
+from .param import Condition, all_of
+from .run import BaseRun
+
+if TYPE_CHECKING:
+    from .dir_root import DirRoot
+
+
+class _Tail:
+    __slots__ = ('uuid', 'path', 'offset', 'seen')
+
+    def __init__(self, uuid: str, path: Path, offset: int = 0):
+        self.uuid = uuid
+        # the run's `columns/` directory
+        self.path = path
+        # rows already read
+        self.offset = offset
+        # segment name -> (mtime, size) when last read
+        self.seen: dict[str, tuple[int, int]] = dict()
+
+    def _changed(self) -> dict[str, tuple[int, int]]:
+        """Segments written (or rewritten, e.g. merged) since the last read."""
+        changed = dict()
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.npz'):
+                        continue
+                    stat = entry.stat()
+                    stamp = (stat.st_mtime_ns, stat.st_size)
+                    if self.seen.get(entry.name) != stamp:
+                        changed[entry.name] = stamp
+        except FileNotFoundError:
+            pass
+        return changed
+
+    def skip(self, n_rows: int):
+        """Start from the end of the log as it is now."""
+        self.seen |= self._changed()
+        self.offset = n_rows
+
+    def read(self) -> list[Any]:
+        """Records of the rows appended since the last read."""
+        changed = self._changed()
+        if not changed:
+            return []
+        try:
+            segments = [load_segment(self.path / name) for name in sorted(changed)]
+        except FileNotFoundError:
+            # removed by a merge of the segments, so read the merged one instead
+            return []
+        self.seen |= changed
+        log = ColumnarLog.from_segments(segments)
+        if log.n_rows <= self.offset:
+            return []
+        records = log.records(self.offset)
+        self.offset = log.n_rows
+        return records
+
+
+class Follower:
+    """Reads the records appended to the logs of runs of a `DirRoot`.
+
+    With `uuids`, those runs are followed until they finish. Otherwise, runs
+    matching all `predicates` (as for `ThatchRoot.filter`) are followed: those
+    in progress at first, and those started since, as they're found by
+    `poll`. With `from_start=False`, records already in the logs of runs in
+    progress at first are skipped.
+    """
+
+    def __init__(
+        self,
+        root: 'DirRoot',
+        uuids: list[str] | None = None,
+        predicates: tuple[Condition | Callable[[BaseRun], bool], ...] = (),
+        from_start: bool = True,
+    ):
+        self.root = root
+        self.tails: dict[str, _Tail] = dict()
+        self.discover = uuids is None
+        self.conditions = [p for p in predicates if isinstance(p, Condition)]
+        self.others = [p for p in predicates if not isinstance(p, Condition)]
+        self.last_id, started = root.runs_since(0)
+        if uuids is None:
+            # only those still in progress
+            finished = root.finished(started)
+            uuids = self._matching([u for u in started if u not in finished])
+        for uuid in uuids:
+            tail = self.tails[uuid] = _Tail(uuid, root.columns_path(uuid))
+            if not from_start:
+                tail.skip(root.log_length(uuid))
+
+    def _matching(self, uuids: list[str]) -> list[str]:
+        if self.conditions:
+            uuids = self.root.select(all_of(self.conditions), uuids)
+        if self.others:
+            uuids = [
+                uuid
+                for uuid in uuids
+                if all(
+                    p(run) for run in [self.root.load_run(uuid)] for p in self.others
+                )
+            ]
+        return uuids
+
+    @property
+    def done(self) -> bool:
+        """Whether there's nothing left to follow, which is never the case
+        while new runs are being looked for."""
+        return not self.tails and not self.discover
+
+    def poll(self) -> list[tuple[str, list[Any]]]:
+        """`(uuid, records)` of the runs with records appended since the last
+        poll, in the order the runs started."""
+        if self.discover:
+            self.last_id, started = self.root.runs_since(self.last_id)
+            for uuid in self._matching(started):
+                self.tails[uuid] = _Tail(uuid, self.root.columns_path(uuid))
+        # checked before reading, as a run's last records are in its log by
+        # the time it's marked as finished
+        finished = self.root.finished(list(self.tails))
+        out = []
+        for tail in list(self.tails.values()):
+            records = tail.read()
+            if records:
+                out.append((tail.uuid, records))
+            if tail.uuid in finished:
+                del self.tails[tail.uuid]
+        return out
+
+    def follow(
+        self,
+        interval: float = 1.0,
+        timeout: float | None = None,
+    ) -> Iterator[tuple[str, list[Any]]]:
+        """Poll every `interval` seconds, yielding what's appended, until
+        there's nothing left to follow, or nothing new for `timeout` seconds."""
+        last_new = time.monotonic()
+        while True:
+            new = self.poll()
+            yield from new
+            if self.done:
+                return
+            now = time.monotonic()
+            if new:
+                last_new = now
+            elif timeout is not None and now - last_new >= timeout:
+                return
+            time.sleep(interval)
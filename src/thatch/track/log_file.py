@@ -0,0 +1,75 @@
+"""Append-only log file format used by `DirRoot`.
+
+A log file is a sequence of chunks, each holding a batch of log records:
+
+    <u32 compressed size> <u32 number of records> <zlib(pickle(list of records))>
+
+New records are only ever appended as a new chunk, so writing never rewrites
+earlier data, and reading only needs one chunk in memory at a time. A chunk
+which is cut short (e.g. still being written, or a crash mid-write) is
+treated as not existing yet.
+"""
+
+import os
+import pickle
+import struct
+import zlib
+from collections.abc import Iterator
+from typing import Any, BinaryIO
+
+_HEADER = struct.Struct('<II')
+
+
+def encode_chunk(records: list[Any], level: int = 6) -> bytes:
+    data = zlib.compress(pickle.dumps(records, pickle.HIGHEST_PROTOCOL), level)
+    return _HEADER.pack(len(data), len(records)) + data
+
+
+def iter_chunks(f: BinaryIO, offset: int = 0) -> Iterator[tuple[int, list[Any]]]:
+    """Yield `(end offset, records)` of each complete chunk from `offset`."""
+    f.seek(offset)
+    while True:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        size, _ = _HEADER.unpack(header)
+        data = f.read(size)
+        if len(data) < size:
+            return
+        offset += _HEADER.size + size
+        yield offset, pickle.loads(zlib.decompress(data))
+
+
+def iter_records(path: str | os.PathLike) -> Iterator[Any]:
+    """Stream all records of a log file, one chunk in memory at a time."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        for _, records in iter_chunks(f):
+            yield from records
+
+
+def scan_chunks(f: BinaryIO) -> tuple[int, int]:
+    """Return `(end offset, number of records)` of the complete chunks,
+    reading only the chunk headers."""
+    file_size = f.seek(0, os.SEEK_END)
+    offset = n_records = 0
+    while offset + _HEADER.size <= file_size:
+        f.seek(offset)
+        size, n = _HEADER.unpack(f.read(_HEADER.size))
+        if offset + _HEADER.size + size > file_size:
+            break
+        offset += _HEADER.size + size
+        n_records += n
+    return offset, n_records
+
+
+def open_for_append(path: str | os.PathLike) -> tuple[BinaryIO, int]:
+    """Open a log file to append chunks to, returning it along with the number
+    of records it already contains. Any incomplete chunk at the end (from a
+    crashed writer) is truncated first, so new chunks stay readable."""
+    f = open(path, 'ab+')
+    end, n_records = scan_chunks(f)
+    if end != f.seek(0, os.SEEK_END):
+        f.truncate(end)
+    return f, n_records
@@ -0,0 +1,303 @@
+import copy
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any
+
+import numpy as np
+
+from .columns import ColumnarLog
+from .dir_root import DirRoot
+from .param import Condition, ParamIndex
+from .root import ThatchRoot
+from .run import BaseRun
+
+
+class _Run:
+    """A run as held by a `MemoryRoot`."""
+
+    __slots__ = (
+        'uuid',
+        'log',
+        'config',
+        'experiment',
+        'tags',
+        'start_time',
+        'end_time',
+        'summary',
+        'artifacts',
+        'checkpoints',
+        'streams',
+        'nbytes',
+    )
+
+    def __init__(self, run: BaseRun):
+        self.uuid = run.uuid
+        self.log = ColumnarLog()
+        self.config = copy.deepcopy(run.config)
+        # path -> contents
+        self.artifacts: dict[str, bytes] = dict()
+        # step -> pickled state, in the order they were saved
+        self.checkpoints: dict[int, bytes] = dict()
+        self.streams: dict[str, ColumnarLog] = dict()
+        self.nbytes = 0
+
+    def update(self, run: BaseRun):
+        self.experiment = run.experiment
+        self.tags = list(run.tags)
+        self.start_time = run.start_time
+        self.end_time = run.end_time
+        self.summary = copy.deepcopy(run.summary)
+
+    def measure(self) -> int:
+        """Memory held by the run's log and stream arrays, artifacts and
+        checkpoints."""
+        self.nbytes = (
+            self.log.nbytes
+            + sum(log.nbytes for log in self.streams.values())
+            + sum(len(data) for data in self.artifacts.values())
+            + sum(len(data) for data in self.checkpoints.values())
+        )
+        return self.nbytes
+
+    def to_run(self, copy_log: bool = True) -> BaseRun:
+        log = self.log
+        if copy_log:
+            log = ColumnarLog.from_segments([log.segment(0)])
+        return BaseRun(
+            uuid=self.uuid,
+            log=log,
+            config=copy.deepcopy(self.config),
+            experiment=self.experiment,
+            tags=list(self.tags),
+            start_time=self.start_time,
+            end_time=self.end_time,
+            summary=copy.deepcopy(self.summary),
+        )
+
+
+class MemoryRoot(ThatchRoot):
+    """Store runs in memory, e.g. for tests, or a quick sweep within one process.
+
+    Each run's log is kept as a `ColumnarLog`, so metrics are held in arrays
+    (`load_metric` returns views of them). Config params are indexed in a
+    `ParamIndex`, so `filter` and `group_by` on params look them up rather than
+    checking each run.
+
+    With `max_bytes`, the memory held by runs (their log arrays, artifacts and
+    checkpoints) is kept under that: once it's exceeded, the runs which
+    finished longest ago are evicted, or moved to `spill_to` (e.g. a `DirRoot`)
+    if it's given, from where they're still read. Runs which haven't finished
+    are never evicted.
+
+    Checkpoints are kept pickled, not deduplicated like `DirRoot`'s.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int | None = None,
+        spill_to: ThatchRoot | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_to = spill_to
+        self.index = ParamIndex()
+        self.nbytes = 0
+        self.evicted = 0
+        # writes may come from `AsyncWriter` threads
+        self._lock = threading.RLock()
+        # uuid -> in memory (or spilled), in order written
+        self._runs: dict[str, _Run | None] = dict()
+        # uuids of finished runs in memory, in order finished
+        self._finished: dict[str, None] = dict()
+
+    def _get(self, uuid: str) -> _Run | None:
+        """The run, if it's in memory; `None` if it's been spilled."""
+        if uuid not in self._runs:
+            raise KeyError(uuid)
+        return self._runs[uuid]
+
+    def write_run(self, run: BaseRun):
+        with self._lock:
+            if run.uuid in self._runs and self._runs[run.uuid] is None:
+                assert self.spill_to is not None
+                self.spill_to.write_run(run)
+                return
+            record = self._runs.get(run.uuid)
+            if record is None:
+                record = self._runs[run.uuid] = _Run(run)
+                self.index.add(run.uuid, record.config)
+            record.update(run)
+            if len(run.log) > len(record.log):
+                record.log.extend_segments([run.log.segment(len(record.log))])
+            for name, log in run.streams.items():
+                stream = record.streams.setdefault(name, ColumnarLog())
+                if len(log) > len(stream):
+                    stream.extend_segments([log.segment(len(stream))])
+            if run.end_time is not None:
+                self._finished[run.uuid] = None
+            self._resized(record)
+
+    def append_log(self, uuid: str, records: list[Any]):
+        with self._lock:
+            record = self._get(uuid)
+            if record is None:
+                assert self.spill_to is not None
+                self.spill_to.append_log(uuid, records)
+                return
+            record.log.extend(records)
+            self._resized(record)
+
+    def append_stream(self, uuid: str, name: str, records: list[Any]):
+        with self._lock:
+            record = self._get(uuid)
+            if record is None:
+                assert self.spill_to is not None
+                self.spill_to.append_stream(uuid, name, records)
+                return
+            record.streams.setdefault(name, ColumnarLog()).extend(records)
+            self._resized(record)
+
+    def load_stream(self, uuid: str, name: str) -> ColumnarLog:
+        with self._lock:
+            record = self._get(uuid)
+            if record is not None:
+                if name not in record.streams:
+                    return ColumnarLog()
+                return ColumnarLog.from_segments([record.streams[name].segment(0)])
+        assert self.spill_to is not None
+        return self.spill_to.load_stream(uuid, name)
+
+    def write_artifact(self, run_uuid: str, path: str, data: Any) -> str:
+        """Save an artifact of a (written) run, returning its digest. `data` is
+        as for `DirRoot.write_artifact`."""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+        elif isinstance(data, os.PathLike):
+            with open(data, 'rb') as f:
+                data = f.read()
+        else:
+            data = data.read()
+        with self._lock:
+            record = self._get(run_uuid)
+            if record is None:
+                assert self.spill_to is not None
+                return self.spill_to.write_artifact(run_uuid, path, data)
+            record.artifacts[path] = data
+            self._resized(record)
+        return hashlib.sha256(data).hexdigest()
+
+    def read_artifact(self, run_uuid: str, path: str) -> bytes:
+        with self._lock:
+            record = self._get(run_uuid)
+            if record is None:
+                assert isinstance(self.spill_to, DirRoot)
+                return self.spill_to.read_artifact(run_uuid, path)
+            if path not in record.artifacts:
+                raise FileNotFoundError(f'{run_uuid}: {path}')
+            return record.artifacts[path]
+
+    def write_checkpoint(self, run_uuid: str, step: int, state: Any) -> str:
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            record = self._get(run_uuid)
+            if record is None:
+                assert self.spill_to is not None
+                return self.spill_to.write_checkpoint(run_uuid, step, state)
+            # the latest is the last one saved, not the highest step
+            record.checkpoints.pop(step, None)
+            record.checkpoints[step] = data
+            self._resized(record)
+        return hashlib.sha256(data).hexdigest()
+
+    def load_checkpoint(
+        self,
+        run_uuid: str,
+        step: int | None = None,
+    ) -> tuple[int, Any]:
+        with self._lock:
+            record = self._get(run_uuid)
+            if record is None:
+                assert self.spill_to is not None
+                return self.spill_to.load_checkpoint(run_uuid, step)
+            if step is None and record.checkpoints:
+                step = next(reversed(record.checkpoints))
+            if step not in record.checkpoints:
+                raise FileNotFoundError(f'{run_uuid}: checkpoint {step}')
+            return step, pickle.loads(record.checkpoints[step])
+
+    def _resized(self, record: _Run):
+        self.nbytes -= record.nbytes
+        self.nbytes += record.measure()
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and self._finished:
+            uuid = next(iter(self._finished))
+            self._evict(uuid)
+
+    def _evict(self, uuid: str):
+        del self._finished[uuid]
+        record = self._runs[uuid]
+        assert record is not None
+        self.nbytes -= record.nbytes
+        if self.spill_to is None:
+            del self._runs[uuid]
+            self.index.remove(uuid)
+            self.evicted += 1
+            return
+        # params stay indexed, so filtering doesn't need to load spilled runs
+        self._runs[uuid] = None
+        self.spill_to.write_run(record.to_run(copy_log=False))
+        for name, log in record.streams.items():
+            self.spill_to.append_stream(uuid, name, log.records())
+        for path, data in record.artifacts.items():
+            self.spill_to.write_artifact(uuid, path, data)
+        for step, data in record.checkpoints.items():
+            self.spill_to.write_checkpoint(uuid, step, pickle.loads(data))
+
+    def uuids(self) -> list[str]:
+        with self._lock:
+            return list(self._runs)
+
+    def load_run(self, uuid: str) -> BaseRun:
+        with self._lock:
+            record = self._get(uuid)
+            if record is not None:
+                return record.to_run()
+        assert self.spill_to is not None
+        return self.spill_to.load_run(uuid)
+
+    def load_config(self, uuid: str) -> dict[str, Any]:
+        with self._lock:
+            record = self._get(uuid)
+            if record is not None:
+                return copy.deepcopy(record.config)
+        assert self.spill_to is not None
+        return self.spill_to.load_config(uuid)
+
+    def select(self, condition: Condition, uuids: list[str]) -> list[str]:
+        with self._lock:
+            matching = condition.lookup(self.index)
+        return [uuid for uuid in uuids if uuid in matching]
+
+    def param_values(
+        self,
+        keys: tuple[str, ...],
+        uuids: list[str],
+    ) -> dict[str, tuple[Any, ...]]:
+        with self._lock:
+            columns = [self.index.values.get(key, dict()) for key in keys]
+            return {uuid: tuple(c.get(uuid) for c in columns) for uuid in uuids}
+
+    def load_metric(self, uuid: str, key: str) -> tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            record = self._get(uuid)
+            if record is not None:
+                if key not in record.log:
+                    return np.zeros(0, dtype=np.int64), np.zeros(0)
+                return record.log.metric(key)
+        assert self.spill_to is not None
+        return self.spill_to.load_metric(uuid, key)
+
+    def __repr__(self) -> str:
+        return f'MemoryRoot(<{len(self._runs)} runs>)'
@@ -0,0 +1,132 @@
+"""Content-addressed store of blobs, shared by all runs of a `DirRoot`.
+
+Each blob is stored once, at `objects/<sha256[:2]>/<sha256[2:]>`, however many
+runs save the same contents. Blobs are written to a temporary file while
+being hashed, then renamed into place, so large files are streamed rather
+than read into memory, and a blob's path only ever holds complete contents.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+CHUNK_SIZE = 1 << 20
+
+
+class ObjectStore:
+    """Blobs stored by their sha256 digest, under `path`."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        os.makedirs(self.path / 'tmp', exist_ok=True)
+
+    def object_path(self, digest: str) -> Path:
+        return self.path / digest[:2] / digest[2:]
+
+    def __contains__(self, digest: str) -> bool:
+        return self.object_path(digest).exists()
+
+    def put_stream(self, f: BinaryIO) -> str:
+        """Store the rest of a file object's contents, returning its digest."""
+        h = hashlib.sha256()
+        out, tmp_path = self._tmp_file()
+        try:
+            with out:
+                while chunk := f.read(CHUNK_SIZE):
+                    h.update(chunk)
+                    out.write(chunk)
+            return self._commit(tmp_path, h.hexdigest())
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def put_bytes(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if not self._touch(digest):
+            f, tmp_path = self._tmp_file()
+            try:
+                with f:
+                    f.write(data)
+                self._commit(tmp_path, digest)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+        return digest
+
+    def put_file(self, path: str | os.PathLike) -> str:
+        with open(path, 'rb') as f:
+            return self.put_stream(f)
+
+    def _tmp_file(self) -> tuple[BinaryIO, Path]:
+        """A new file under `tmp/`, with a name no other thread or process is
+        using."""
+        fd, name = tempfile.mkstemp(dir=self.path / 'tmp', prefix=f'{os.getpid()}-')
+        return os.fdopen(fd, 'wb'), Path(name)
+
+    def _touch(self, digest: str) -> bool:
+        """Mark an existing blob as recently used (see `gc`), returning whether
+        it exists."""
+        try:
+            os.utime(self.object_path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _commit(self, tmp_path: Path, digest: str) -> str:
+        if not self._touch(digest):
+            path = self.object_path(digest)
+            os.makedirs(path.parent, exist_ok=True)
+            # another writer of the same contents may get here first; either
+            # way, the blob ends up complete
+            os.replace(tmp_path, path)
+        return digest
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.object_path(digest), 'rb')
+
+    def read(self, digest: str) -> bytes:
+        with self.open(digest) as f:
+            return f.read()
+
+    def copy_to(self, digest: str, path: str | os.PathLike):
+        with self.open(digest) as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    def __iter__(self) -> Iterator[str]:
+        for prefix in sorted(self.path.iterdir()):
+            if len(prefix.name) != 2 or not prefix.is_dir():
+                continue
+            for blob in sorted(prefix.iterdir()):
+                yield prefix.name + blob.name
+
+    def gc(self, referenced: set[str], grace: float = 3600.0) -> list[str]:
+        """Remove blobs which aren't `referenced`, returning their digests.
+
+        Blobs stored or re-stored within the last `grace` seconds are kept, as
+        a concurrent writer may be about to reference them.
+        """
+        removed = []
+        cutoff = time.time() - grace
+        for digest in list(self):
+            if digest in referenced:
+                continue
+            path = self.object_path(digest)
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(digest)
+            except FileNotFoundError:
+                pass
+        # leftovers of interrupted writes
+        for tmp_path in (self.path / 'tmp').iterdir():
+            try:
+                if tmp_path.stat().st_mtime < cutoff:
+                    tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+        return removed
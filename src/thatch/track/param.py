@@ -0,0 +1,342 @@
+"""Conditions on the config params of runs, for `ThatchRoot.filter`.
+
+> root.filter(Param('dropout') > 0.4, Param('optim.name') == 'adam')
+
+A condition can be checked in Python against a run's (flattened) config, and
+also compiled to SQL, so roots with an index of config params (`DirRoot`) can
+filter without loading each run's config. Roots in memory (`MemoryRoot`) look
+conditions up in a `ParamIndex` instead.
+
+Params are the leaf values of the config, named by their dot-delimited key.
+Ordering comparisons only match values of the same kind (numbers, with bools
+counting as numbers, or strings); e.g. `Param('x') > 0` doesn't match runs
+where `x` is a string, and neither does `Param('x') != 0`. Runs without the
+param never match a comparison.
+"""
+
+import bisect
+import json
+import operator
+from collections.abc import Callable, Iterable, Mapping
+from typing import TYPE_CHECKING, Any
+
+from ..config.util import flatten_dict
+
+if TYPE_CHECKING:
+    from .run import BaseRun
+
+_OPS: dict[str, Callable[[Any, Any], bool]] = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def flatten_params(config: dict[str, Any]) -> dict[str, Any]:
+    """Config params of a run, by dot-delimited key."""
+    return dict(flatten_dict(config))
+
+
+def param_json(value: Any) -> str:
+    """How a param's value is stored, to compare/group exactly by it."""
+    return json.dumps(value, sort_keys=True, default=repr)
+
+
+def param_sql_value(value: Any) -> int | float | str | None:
+    """How a param's value is stored to be compared in SQL; `None` for values
+    which can only be compared for equality (as json)."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    return None
+
+
+def _kind(value: Any) -> str | None:
+    if isinstance(value, (bool, int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'text'
+    return None
+
+
+class Condition:
+    """A condition on config params, combinable with `&`, `|` and `~`.
+
+    It's also callable on a run, so it can be used anywhere a predicate is.
+    """
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        """Check the condition against a run's flattened config params."""
+        raise NotImplementedError
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        """SQL expression (on the `root` table's `id`) and its parameters."""
+        raise NotImplementedError
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        """uuids of the runs in `index` matching the condition."""
+        raise NotImplementedError
+
+    def __call__(self, run: 'BaseRun') -> bool:
+        return self.matches(flatten_params(run.config))
+
+    def __and__(self, other: 'Condition') -> 'Condition':
+        return _And(self, other)
+
+    def __or__(self, other: 'Condition') -> 'Condition':
+        return _Or(self, other)
+
+    def __invert__(self) -> 'Condition':
+        return _Not(self)
+
+
+class _Compare(Condition):
+    def __init__(self, key: str, op: str, value: Any):
+        kind = _kind(value)
+        assert kind is not None or op in ('=', '!='), (
+            f'can only compare {value!r} for equality'
+        )
+        self.key = key
+        self.op = op
+        self.value = value
+        self.kind = kind
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        if self.key not in params:
+            return False
+        value = params[self.key]
+        if self.kind is None:
+            return _OPS[self.op](param_json(value), param_json(self.value))
+        if _kind(value) != self.kind:
+            return False
+        return _OPS[self.op](value, self.value)
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        if self.kind is None:
+            where = f'json {self.op} ?'
+            value = param_json(self.value)
+        else:
+            types = "('integer', 'real')" if self.kind == 'number' else "('text')"
+            where = f'typeof(value) IN {types} AND value {self.op} ?'
+            value = param_sql_value(self.value)
+        return (
+            f'id IN (SELECT run_id FROM run_params WHERE key = ? AND {where})',
+            [self.key, value],
+        )
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        if self.kind is not None:
+            return index.compare(self.key, self.kind, self.op, self.value)
+        equal = index.with_json(self.key, [param_json(self.value)])
+        return equal if self.op == '=' else index.with_key(self.key) - equal
+
+    def __repr__(self) -> str:
+        op = '==' if self.op == '=' else self.op
+        return f'Param({self.key!r}) {op} {self.value!r}'
+
+
+class _Exists(Condition):
+    def __init__(self, key: str):
+        self.key = key
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        return self.key in params
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        return 'id IN (SELECT run_id FROM run_params WHERE key = ?)', [self.key]
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        return index.with_key(self.key)
+
+    def __repr__(self) -> str:
+        return f'Param({self.key!r}).exists()'
+
+
+class _And(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        return all(c.matches(params) for c in self.conditions)
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        if not self.conditions:
+            return '1', []
+        parts = [c.to_sql() for c in self.conditions]
+        return (
+            ' AND '.join(f'({sql})' for sql, _ in parts),
+            [p for _, params in parts for p in params],
+        )
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        if not self.conditions:
+            return set(index.uuids)
+        return set.intersection(*(c.lookup(index) for c in self.conditions))
+
+    def __repr__(self) -> str:
+        return ' & '.join(f'({c!r})' for c in self.conditions)
+
+
+class _Or(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        return any(c.matches(params) for c in self.conditions)
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        if not self.conditions:
+            return '0', []
+        parts = [c.to_sql() for c in self.conditions]
+        return (
+            ' OR '.join(f'({sql})' for sql, _ in parts),
+            [p for _, params in parts for p in params],
+        )
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        return set().union(*(c.lookup(index) for c in self.conditions))
+
+    def __repr__(self) -> str:
+        return ' | '.join(f'({c!r})' for c in self.conditions)
+
+
+class _Not(Condition):
+    def __init__(self, condition: Condition):
+        self.condition = condition
+
+    def matches(self, params: Mapping[str, Any]) -> bool:
+        return not self.condition.matches(params)
+
+    def to_sql(self) -> tuple[str, list[Any]]:
+        sql, params = self.condition.to_sql()
+        return f'NOT ({sql})', params
+
+    def lookup(self, index: 'ParamIndex') -> set[str]:
+        return index.uuids - self.condition.lookup(index)
+
+    def __repr__(self) -> str:
+        return f'~({self.condition!r})'
+
+
+class _In(_Or):
+    # the same comparisons as `==`, so that e.g. `isin([1])` matches 1.0 too
+    def __init__(self, key: str, values: Iterable[Any]):
+        self.key = key
+        self.values = list(values)
+        super().__init__(*(_Compare(key, '=', v) for v in self.values))
+
+    def __repr__(self) -> str:
+        return f'Param({self.key!r}).isin({self.values!r})'
+
+
+def all_of(conditions: Iterable[Condition]) -> Condition:
+    return _And(*conditions)
+
+
+def _first(entry: tuple[Any, str]) -> Any:
+    return entry[0]
+
+
+class ParamIndex:
+    """Config params of runs, indexed for `Condition.lookup`, the in-memory
+    counterpart of `DirRoot`'s `run_params` table.
+
+    Each param's runs are kept by value's json (for equality), and sorted by
+    value for each kind of value (for ordering comparisons), so a lookup is a
+    dict access or a bisection rather than a check of every run.
+    """
+
+    def __init__(self):
+        self.uuids: set[str] = set()
+        # key -> uuid -> value
+        self.values: dict[str, dict[str, Any]] = dict()
+        # key -> json of value -> uuids
+        self.by_json: dict[str, dict[str, set[str]]] = dict()
+        # (key, kind) -> sorted [(value, uuid), ...]
+        self.ordered: dict[tuple[str, str], list[tuple[Any, str]]] = dict()
+
+    def add(self, uuid: str, config: dict[str, Any]):
+        self.uuids.add(uuid)
+        for key, value in flatten_params(config).items():
+            self.values.setdefault(key, dict())[uuid] = value
+            by_json = self.by_json.setdefault(key, dict())
+            by_json.setdefault(param_json(value), set()).add(uuid)
+            if (kind := _kind(value)) is not None:
+                ordered = self.ordered.setdefault((key, kind), [])
+                bisect.insort(ordered, (param_sql_value(value), uuid))
+
+    def remove(self, uuid: str):
+        self.uuids.discard(uuid)
+        for key, values in self.values.items():
+            if uuid not in values:
+                continue
+            value = values.pop(uuid)
+            self.by_json[key][param_json(value)].discard(uuid)
+            if (kind := _kind(value)) is not None:
+                ordered = self.ordered[(key, kind)]
+                del ordered[bisect.bisect_left(ordered, (param_sql_value(value), uuid))]
+
+    def with_key(self, key: str) -> set[str]:
+        return set(self.values.get(key, ()))
+
+    def with_json(self, key: str, jsons: Iterable[str]) -> set[str]:
+        by_json = self.by_json.get(key, dict())
+        return set().union(*(by_json.get(j, ()) for j in jsons))
+
+    def compare(self, key: str, kind: str, op: str, value: Any) -> set[str]:
+        """Runs whose `key` is of `kind` and compares to `value` by `op`."""
+        ordered = self.ordered.get((key, kind), [])
+        value = param_sql_value(value)
+        lo = bisect.bisect_left(ordered, value, key=_first)
+        hi = bisect.bisect_right(ordered, value, key=_first)
+        if op == '!=':
+            return {uuid for _, uuid in ordered[:lo] + ordered[hi:]}
+        start, stop = {
+            '=': (lo, hi),
+            '<': (0, lo),
+            '<=': (0, hi),
+            '>': (hi, None),
+            '>=': (lo, None),
+        }[op]
+        return {uuid for _, uuid in ordered[start:stop]}
+
+
+class Param:
+    """A config param of a run, by its dot-delimited key. Comparing it makes a
+    `Condition`."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __eq__(self, value: Any) -> Condition:  # type: ignore[override]
+        return _Compare(self.key, '=', value)
+
+    def __ne__(self, value: Any) -> Condition:  # type: ignore[override]
+        return _Compare(self.key, '!=', value)
+
+    def __lt__(self, value: Any) -> Condition:
+        return _Compare(self.key, '<', value)
+
+    def __le__(self, value: Any) -> Condition:
+        return _Compare(self.key, '<=', value)
+
+    def __gt__(self, value: Any) -> Condition:
+        return _Compare(self.key, '>', value)
+
+    def __ge__(self, value: Any) -> Condition:
+        return _Compare(self.key, '>=', value)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def isin(self, values: Iterable[Any]) -> Condition:
+        return _In(self.key, values)
+
+    def exists(self) -> Condition:
+        return _Exists(self.key)
+
+    def __repr__(self) -> str:
+        return f'Param({self.key!r})'
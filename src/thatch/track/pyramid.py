@@ -0,0 +1,129 @@
+"""Multi-resolution summaries of a metric, for reading long series quickly.
+
+Each level of a metric's pyramid splits its values (in order of steps) into
+buckets of `bucket` values, and holds for each bucket its first step, the
+min, max, mean and count of its values, and one of its points picked as by
+LTTB (Largest-Triangle-Three-Buckets), which keeps the visual shape of the
+series when plotted as a line. Levels have `FACTOR`, `FACTOR**2`, ... values
+per bucket, each built from the one below, down to at least `MIN_BUCKETS`
+buckets.
+
+Levels are written along with compacted metrics (see `compact`), as `.npy`
+arrays of `LEVEL_DTYPE`, so reading about `points` buckets of a range of
+steps (`downsample`) reads at most `FACTOR * points` entries of one level,
+however many values there are.
+"""
+
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+FACTOR = 4
+MIN_BUCKETS = 64
+
+LEVEL_FIELDS = (
+    ('step', np.int64),
+    ('min', np.float64),
+    ('max', np.float64),
+    ('mean', np.float64),
+    ('count', np.int64),
+    ('lttb_step', np.int64),
+    ('lttb_value', np.float64),
+)
+LEVEL_DTYPE = np.dtype(list(LEVEL_FIELDS))
+
+# a level, or the raw values as one (see `raw_level`)
+Level = np.ndarray | Mapping[str, np.ndarray]
+
+
+def raw_level(steps: np.ndarray, values: np.ndarray) -> dict[str, np.ndarray]:
+    """Values sorted by step, as a level with one value per bucket."""
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'step': steps,
+        'min': values,
+        'max': values,
+        'mean': values,
+        'count': np.ones(len(steps), dtype=np.int64),
+        'lttb_step': steps,
+        'lttb_value': values,
+    }
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Index of one point per bucket (beginning at `starts`, of equal size but
+    the last): the one forming the largest triangle with the means of the
+    previous and next buckets.
+
+    Anchoring on the previous bucket's mean, rather than the point picked
+    from it as in LTTB proper, lets every bucket be done at once.
+    """
+    n, k = len(x), len(starts)
+    size = int(starts[1]) if k > 1 else n
+    x = np.asarray(x, dtype=np.float64)
+    counts = np.diff(np.append(starts, n))
+    x_mean = np.add.reduceat(x, starts) / counts
+    y_mean = np.add.reduceat(y, starts) / counts
+    # the first and last buckets are anchored on the ends of the series
+    xl, yl = np.append(x[0], x_mean[:-1]), np.append(y[0], y_mean[:-1])
+    xr, yr = np.append(x_mean[1:], x[-1]), np.append(y_mean[1:], y[-1])
+
+    # the last bucket is padded with copies of its last point
+    pad = k * size - n
+    xs = np.pad(x, (0, pad), mode='edge').reshape(k, size)
+    ys = np.pad(y, (0, pad), mode='edge').reshape(k, size)
+    area = np.abs(
+        (xl - xr)[:, None] * (ys - yl[:, None])
+        - (xl[:, None] - xs) * (yr - yl)[:, None]
+    )
+    return np.minimum(starts + np.argmax(area, axis=1), n - 1)
+
+
+def coarsen(level: Level, factor: int) -> np.ndarray:
+    """Merge every `factor` buckets of a level into one."""
+    n = len(level['step'])
+    starts = np.arange(0, n, max(factor, 1))
+    out = np.empty(len(starts), dtype=LEVEL_DTYPE)
+    if n == 0:
+        return out
+    count = np.add.reduceat(level['count'], starts)
+    out['step'] = level['step'][starts]
+    out['min'] = np.minimum.reduceat(level['min'], starts)
+    out['max'] = np.maximum.reduceat(level['max'], starts)
+    out['mean'] = np.add.reduceat(level['mean'] * level['count'], starts) / count
+    out['count'] = count
+    picked = _lttb(level['lttb_step'], level['lttb_value'], starts)
+    out['lttb_step'] = level['lttb_step'][picked]
+    out['lttb_value'] = level['lttb_value'][picked]
+    return out
+
+
+def build_pyramid(steps: np.ndarray, values: np.ndarray) -> dict[int, np.ndarray]:
+    """Levels of a metric with sorted steps, by values per bucket."""
+    levels = dict()
+    level: Level = raw_level(steps, values)
+    bucket = 1
+    while len(level['step']) >= FACTOR * MIN_BUCKETS:
+        level = coarsen(level, FACTOR)
+        bucket *= FACTOR
+        levels[bucket] = level
+    return levels
+
+
+def write_pyramid(path: Path, steps: np.ndarray, values: np.ndarray) -> list[int]:
+    """Write the levels of a metric to `path`, returning their bucket sizes."""
+    levels = build_pyramid(steps, values)
+    if levels:
+        path.mkdir()
+    for bucket, level in levels.items():
+        np.save(path / f'{bucket}.npy', level)
+    return list(levels)
+
+
+def downsample(level: Level, points: int) -> dict[str, np.ndarray]:
+    """A level coarsened to at most `points` buckets, as a dict of arrays."""
+    assert points > 0
+    n = len(level['step'])
+    level = coarsen(level, -(-n // points))
+    return {name: level[name] for name, _ in LEVEL_FIELDS}
@@ -1,3 +1,14 @@
+from collections.abc import Callable, Iterator, Sequence
+from typing import Any
+
+import numpy as np
+
+from .aggregate import aggregate_metrics
+from .columns import ColumnarLog
+from .param import Condition, all_of, flatten_params, param_json
+from .pyramid import downsample, raw_level
+from .run import BaseRun
+
 
 class ThatchRoot:
     """Abstract base class representing a location for Thatch to store run data.
@@ -5,16 +16,67 @@ class ThatchRoot:
     In other words, it's just a collection of runs.
     """
 
-    #def save_run(self, run: ThatchRun):
-        #...
+    def write_run(self, run: BaseRun):
+        """Save a run, or the changes to it since it was last written."""
+        raise NotImplementedError
 
-    #def get(self, uuids: Iterable[str]|None = None) -> MultiRunData:
-        #...
+    def append_log(self, uuid: str, records: list[Any]):
+        """Append records to the log of a run which was already written."""
+        raise NotImplementedError
 
-    #def filter(self, *args, **kwargs) -> "ThatchRoot":
-    def filter(self, *predicates) -> "ThatchRoot":
-        """
+    def append_stream(self, uuid: str, name: str, records: list[Any]):
+        """Append records to one of the streams of a run which was already
+        written (see `BaseRun.streams`)."""
+        raise NotImplementedError
+
+    def load_stream(self, uuid: str, name: str) -> ColumnarLog:
+        """One of the streams of a run, empty if nothing was recorded to it."""
+        raise NotImplementedError
+
+    def write_artifact(self, run_uuid: str, path: str, data: Any) -> str:
+        """Save a file associated with a run, such as a checkpoint."""
+        raise NotImplementedError
+
+    def write_checkpoint(self, run_uuid: str, step: int, state: Any) -> str:
+        """Save a checkpoint of a run's state at `step`."""
+        raise NotImplementedError
+
+    def load_checkpoint(
+        self,
+        run_uuid: str,
+        step: int | None = None,
+    ) -> tuple[int, Any]:
+        """`(step, state)` of a run's checkpoint at `step`, or its latest one."""
+        raise NotImplementedError
+
+    def uuids(self) -> list[str]:
+        """uuids of all runs in the root."""
+        raise NotImplementedError
+
+    def load_run(self, uuid: str) -> BaseRun:
+        raise NotImplementedError
+
+    def load_runs(self, uuids: list[str]) -> list[BaseRun]:
+        """Load several runs, which some roots do faster than one at a time."""
+        return [self.load_run(uuid) for uuid in uuids]
+
+    def __iter__(self) -> Iterator[BaseRun]:
+        for uuid in self.uuids():
+            yield self.load_run(uuid)
+
+    def __len__(self) -> int:
+        return len(self.uuids())
+
+    # def get(self, uuids: Iterable[str]|None = None) -> MultiRunData:
+    # ...
 
+    # def filter(self, *args, **kwargs) -> "ThatchRoot":
+    def filter(
+        self,
+        *predicates: Condition | Callable[[BaseRun], bool],
+    ) -> 'ThatchRoot':
+        """
+        Select the runs matching all predicates, as a sub-root.
 
         ```
         sub_root = root.filter(
@@ -25,25 +87,215 @@ class ThatchRoot:
         )
         ```
 
+        `Param` conditions are checked with `select`, which roots indexing
+        config params (such as `DirRoot`) do without loading any runs. Other
+        predicates are called on each remaining run, loading it.
+
         Note: previously included **constraints in args as shorthand for equality.
         Eliminating for consistency and due to lack of flexibility of that method.
         """
-        ...
+        conditions = [p for p in predicates if isinstance(p, Condition)]
+        others = [p for p in predicates if not isinstance(p, Condition)]
+
+        uuids = self.uuids()
+        if conditions:
+            uuids = self.select(all_of(conditions), uuids)
+        if others:
+            uuids = [
+                uuid
+                for uuid in uuids
+                if all(p(run) for run in [self.load_run(uuid)] for p in others)
+            ]
+        return RunSubset(self, uuids)
 
     def group_by(
         self,
         key: (
             # note: `str` key(s) refer to config params; use lambda run mode to
             # group by other run info
-            str
-            | tuple[str, ...]
-            | Callable[['ThatchRun'], Any]
+            str | tuple[str, ...] | Callable[[BaseRun], Any]
             #| Callable[[dict], Any]
         ),
-    ) -> list[tuple[Any, "ThatchRoot"]]:
+    ) -> list[tuple[Any, 'ThatchRoot']]:
+        """
+        Split the runs into sub-roots by the value of `key`, in order of each
+        value's first run.
+
+        Config param keys are read with `param_values` (missing params are
+        `None`), so they don't need to load runs for roots indexing params. A
+        function is called on each loaded run.
+        """
+        uuids = self.uuids()
+        if callable(key):
+            values = [key(self.load_run(uuid)) for uuid in uuids]
+        else:
+            keys = (key,) if isinstance(key, str) else key
+            by_uuid = self.param_values(keys, uuids)
+            values = [by_uuid[uuid] for uuid in uuids]
+            if isinstance(key, str):
+                values = [v for (v,) in values]
+
+        # grouped by their json, so that unhashable values (lists) work too
+        groups: dict[str, tuple[Any, list[str]]] = dict()
+        for uuid, value in zip(uuids, values):
+            groups.setdefault(param_json(value), (value, []))[1].append(uuid)
+        return [(value, RunSubset(self, group)) for value, group in groups.values()]
+
+    def load_config(self, uuid: str) -> dict[str, Any]:
+        """The config of a run, without necessarily loading its log."""
+        return self.load_run(uuid).config
+
+    def select(self, condition: Condition, uuids: list[str]) -> list[str]:
+        """The `uuids` of runs whose config params match `condition`."""
+        return [
+            uuid
+            for uuid in uuids
+            if condition.matches(flatten_params(self.load_config(uuid)))
+        ]
+
+    def param_values(
+        self,
+        keys: tuple[str, ...],
+        uuids: list[str],
+    ) -> dict[str, tuple[Any, ...]]:
+        """Values of the config params `keys` (`None` if missing) of each run."""
+        out = dict()
+        for uuid in uuids:
+            params = flatten_params(self.load_config(uuid))
+            out[uuid] = tuple(params.get(k) for k in keys)
+        return out
+
+    def aggregate(
+        self,
+        key: str,
+        aggr: str | Sequence[str] = ('mean', 'std', 'min', 'max'),
+        align: str = 'exact',
+        steps: np.ndarray | int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Aggregate a tracked metric across all runs, per step.
+
+        > agg = root.aggregate('loss', ['mean', 'q5', 'q95'], align='interpolate')
+        > plt.fill_between(agg['step'], agg['q5'], agg['q95'])
+
+        Returns a dict with `'step'`, `'count'` (of runs with a value at each
+        step), and an array per statistic. See `aggregate.aggregate_metrics`
+        for the statistics and how steps are aligned. Combine with `group_by`
+        to aggregate per group:
+        > {lr: group.aggregate('loss') for lr, group in root.group_by('lr')}
+        """
+        metrics = [self.load_metric(uuid, key) for uuid in self.uuids()]
+        metrics = [m for m in metrics if len(m[0]) > 0]
+        return aggregate_metrics(metrics, aggr, align, steps)
+
+    def load_metric(self, uuid: str, key: str) -> tuple[np.ndarray, np.ndarray]:
+        """`(steps, values)` of a metric of a run (empty if it has none)."""
+        log = self.load_run(uuid).log
+        if key not in log:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return log.metric(key)
+
+    def read_metric_summary(
+        self,
+        uuid: str,
+        key: str,
+        points: int = 1000,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> dict[str, np.ndarray]:
         """
+        Summary of a metric of a run in at most `points` buckets of steps,
+        within steps `[start, stop)`, for plotting long series.
+
+        > s = root.read_metric_summary(uuid, 'loss', points=500)
+        > plt.fill_between(s['step'], s['min'], s['max'], alpha=0.3)
+        > plt.plot(s['lttb_step'], s['lttb_value'])
+
+        Returns a dict of arrays with each bucket's first `'step'`, the
+        `'min'`, `'max'`, `'mean'` and `'count'` of its values, and a point of
+        it picked to keep the shape of the series (`'lttb_step'`,
+        `'lttb_value'`). See `pyramid`.
         """
-        ...
+        steps, values = self.load_metric(uuid, key)
+        mask = np.ones(len(steps), dtype=bool)
+        if start is not None:
+            mask &= steps >= start
+        if stop is not None:
+            mask &= steps < stop
+        steps, values = steps[mask], values[mask]
+        order = np.argsort(steps, kind='stable')
+        return downsample(raw_level(steps[order], values[order]), points)
+
+
+class RunSubset(ThatchRoot):
+    """Some of the runs of another root, as returned by `filter`/`group_by`.
+
+    Reads and writes go to the original root.
+    """
+
+    def __init__(self, root: ThatchRoot, uuids: list[str]):
+        self.root = root
+        self._uuids = uuids
+
+    def write_run(self, run: BaseRun):
+        self.root.write_run(run)
+
+    def append_log(self, uuid: str, records: list[Any]):
+        self.root.append_log(uuid, records)
 
-    #def aggregate(self, key, aggr:str) -> 
+    def append_stream(self, uuid: str, name: str, records: list[Any]):
+        self.root.append_stream(uuid, name, records)
+
+    def load_stream(self, uuid: str, name: str) -> ColumnarLog:
+        return self.root.load_stream(uuid, name)
+
+    def write_artifact(self, run_uuid: str, path: str, data: Any) -> str:
+        return self.root.write_artifact(run_uuid, path, data)
+
+    def write_checkpoint(self, run_uuid: str, step: int, state: Any) -> str:
+        return self.root.write_checkpoint(run_uuid, step, state)
+
+    def load_checkpoint(
+        self,
+        run_uuid: str,
+        step: int | None = None,
+    ) -> tuple[int, Any]:
+        return self.root.load_checkpoint(run_uuid, step)
+
+    def uuids(self) -> list[str]:
+        return list(self._uuids)
+
+    def load_run(self, uuid: str) -> BaseRun:
+        return self.root.load_run(uuid)
+
+    def load_runs(self, uuids: list[str]) -> list[BaseRun]:
+        return self.root.load_runs(uuids)
+
+    def load_config(self, uuid: str) -> dict[str, Any]:
+        return self.root.load_config(uuid)
+
+    def select(self, condition: Condition, uuids: list[str]) -> list[str]:
+        return self.root.select(condition, uuids)
+
+    def param_values(
+        self,
+        keys: tuple[str, ...],
+        uuids: list[str],
+    ) -> dict[str, tuple[Any, ...]]:
+        return self.root.param_values(keys, uuids)
+
+    def load_metric(self, uuid: str, key: str) -> tuple[np.ndarray, np.ndarray]:
+        return self.root.load_metric(uuid, key)
+
+    def read_metric_summary(
+        self,
+        uuid: str,
+        key: str,
+        points: int = 1000,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        return self.root.read_metric_summary(uuid, key, points, start, stop)
 
+    def __repr__(self) -> str:
+        return f'RunSubset({self.root!r}, <{len(self._uuids)} runs>)'
@@ -1,40 +1,270 @@
-
 import copy
 import uuid
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any
 
-
+from ..config import profile
 from ..config.globals import GLOBAL_CONFIG
+from .columns import ColumnarLog
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .root import ThatchRoot
+    from .sampler import ResourceSampler
+    from .timing import Timer, Timing
+    from .writer import AsyncSaver, AsyncWriter, Backpressure
 
 
 class BaseRun:
+    """All data of a single run: the log of tracked values, the config it ran
+    with, and metadata which applies to the entire run.
+
+    The log is kept as a `ColumnarLog`; a list of entries is converted to one.
+    `summary` holds run-level values which aren't part of the log, such as
+    final metrics or stats about the run itself.
+
+    `streams` holds other logs of the run by name, such as its resource usage
+    (see `ThatchRun(sample_resources=...)`), so their records aren't rows of
+    `log` and don't shift its implicit steps. Runs loaded from a root don't
+    include them; read them with `load_stream` instead.
+    """
 
     def __init__(
         self,
-        uuid,
-        log:list = [],
-        config:dict = {},
-        experiment:str = '',
-        tags:list[str] = [],
-        start_time = None,
-        end_time = None,
+        uuid: str,
+        log: ColumnarLog | list | None = None,
+        config: dict | None = None,
+        experiment: str = '',
+        tags: list[str] | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        summary: dict[str, Any] | None = None,
+        streams: dict[str, ColumnarLog] | None = None,
     ):
-        ...
+        self.uuid = uuid
+        if not isinstance(log, ColumnarLog):
+            log = ColumnarLog.from_records([] if log is None else log)
+        self.log = log
+        self.config = {} if config is None else config
+        self.experiment = experiment
+        self.tags = [] if tags is None else list(tags)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.summary = {} if summary is None else summary
+        self.streams = {} if streams is None else streams
 
 
 class ThatchRun(BaseRun):
+    """A run being tracked by the current process.
+
+    > with ThatchRun(experiment='mnist', root=DirRoot()) as run:
+    >     for step in range(steps):
+    >         run.track(step=step, loss=loss)
+
+    With a `root`, `save()` writes the run there, which also happens when the
+    run finishes. Without one, the run is only kept in memory.
+
+    With `async_write=True`, tracked records and saves are instead queued for
+    an `AsyncWriter` to write from a background thread, so tracking doesn't
+    wait on disk I/O. `max_queue` and `backpressure` configure its queue, and
+    `flush()` waits for everything queued to be written. Finishing the run
+    flushes and closes the writer.
+
+    With `async_save=True`, checkpoints and artifacts are saved by an
+    `AsyncSaver` instead: saving only takes a snapshot of them, and returns a
+    `Future` of the digest, while they're serialized and written in the
+    background. At most `max_in_flight` saves are pending at once.
+
+    With `sample_resources`, a `ResourceSampler` records the process's CPU,
+    memory and I/O usage every that many seconds, as records of `sys/` keys
+    in the run's `sys` stream (see `streams`). Its own overhead is saved in
+    `summary['resource_sampler']`.
+
+    `timer` and `step` time the phases of each step, recording summaries of
+    their durations every `timing_every` steps in the run's `timing` stream
+    (see `timing`).
+    """
 
     def __init__(
         self,
-        experiment:str = '',
-        tags:list[str] = [],
-        config_source:dict = GLOBAL_CONFIG,
+        experiment: str = '',
+        tags: list[str] | None = None,
+        config_source: Mapping[str, Any] = GLOBAL_CONFIG,
+        root: 'ThatchRoot | None' = None,
+        async_write: bool = False,
+        max_queue: int = 10_000,
+        backpressure: 'Backpressure' = 'block',
+        async_save: bool = False,
+        max_in_flight: int = 2,
+        sample_resources: float | None = None,
+        timing_every: int = 100,
     ):
-        log = []
-        config = copy.deepcopy(config_source)
-        _uuid = uuid.uuid4().hex
+        super().__init__(
+            uuid=uuid.uuid4().hex,
+            config=copy.deepcopy(dict(config_source)),
+            experiment=experiment,
+            tags=tags,
+            start_time=datetime.now(timezone.utc),
+        )
+        self.root = root
+        # @configurable stats are saved for just the calls during this run
+        self._profile_start = profile.snapshot() if profile.is_enabled() else {}
+        self.writer: 'AsyncWriter | None' = None
+        self._saved = False
+        if async_write:
+            assert root is not None, 'async_write needs a root to write to'
+            from .writer import AsyncWriter
+
+            self.writer = AsyncWriter(self, root, max_queue, backpressure)
+            self.writer.save(self)
+        self.saver: 'AsyncSaver | None' = None
+        if async_save:
+            assert root is not None, 'async_save needs a root to save to'
+            from .writer import AsyncSaver
+
+            self.saver = AsyncSaver(self, root, max_in_flight)
+        self.sampler: 'ResourceSampler | None' = None
+        if sample_resources is not None:
+            from .sampler import ResourceSampler
+
+            self.sampler = ResourceSampler(sample_resources)
+        # created on first use
+        self.timing: 'Timing | None' = None
+        self.timing_every = timing_every
+
+    def track(self, **values: Any):
+        """Record a set of values as one entry of the log."""
+        if self.sampler is not None and self.sampler.batches:
+            self._track_samples(self.sampler.take())
+        self.log.append(values)
+        if self.writer is not None:
+            self.writer.put(values)
+
+    def timer(self, name: str) -> 'Timer':
+        """Time a phase of each step, e.g.
+
+        > with run.timer('data_load'):
+        >     batch = next(loader)
+        """
+        if self.timing is None:
+            self.timing = self._start_timing()
+        return self.timing.timer(name)
+
+    def step(self):
+        """Mark the end of a step, recording summaries of the timers and steps
+        per second every `timing_every` steps."""
+        if self.timing is None:
+            self.timing = self._start_timing()
+        record = self.timing.step()
+        if record is not None:
+            self._track_stream('timing', [record])
+
+    def _start_timing(self) -> 'Timing':
+        from .timing import Timing
+
+        return Timing(self.timing_every)
+
+    def _track_samples(self, samples: list[dict[str, Any]]):
+        self._track_stream('sys', samples)
+
+    def _track_stream(self, name: str, records: list[dict[str, Any]]):
+        """Record entries of one of the run's `streams`, rather than its log."""
+        if not records:
+            return
+        log = self.streams.get(name)
+        if log is None:
+            log = self.streams[name] = ColumnarLog()
+        log.extend(records)
+        if self.writer is not None:
+            self.writer.put_stream(name, records)
+
+    def save(self):
+        """Write the run (or what's changed since the last save) to its root."""
+        if self.sampler is not None and self.sampler.batches:
+            self._track_samples(self.sampler.take())
+        if self.writer is not None:
+            self.writer.save(self)
+        elif self.root is not None:
+            self.root.write_run(self)
+            self._saved = True
+
+    def save_artifact(self, path: str, data: Any) -> 'str | Future[str]':
+        """Save an artifact of the run to its root (see `DirRoot.write_artifact`),
+        returning its digest (or a `Future` of it, with `async_save`)."""
+        assert self.root is not None, 'artifacts need a root to be saved to'
+        self._ensure_written()
+        if self.saver is not None:
+            return self.saver.artifact(path, data)
+        return self.root.write_artifact(self.uuid, path, data)
+
+    def save_checkpoint(self, state: Any, step: int) -> 'str | Future[str]':
+        """Save a checkpoint of `state` at `step` to the run's root (see
+        `DirRoot.write_checkpoint`), returning its digest (or a `Future` of it,
+        with `async_save`)."""
+        assert self.root is not None, 'checkpoints need a root to be saved to'
+        self._ensure_written()
+        if self.saver is not None:
+            return self.saver.checkpoint(state, step)
+        return self.root.write_checkpoint(self.uuid, step, state)
+
+    def load_checkpoint(self, step: int | None = None) -> tuple[int, Any]:
+        """`(step, state)` of the run's checkpoint at `step`, or its latest."""
+        assert self.root is not None, 'checkpoints are loaded from a root'
+        if self.saver is not None:
+            self.saver.flush()
+        return self.root.load_checkpoint(self.uuid, step)
+
+    def _ensure_written(self):
+        """Artifacts and checkpoints refer to the run, so it has to be in the
+        root first."""
+        if self._saved:
+            return
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            self.save()
+        self._saved = True
 
+    def flush(self):
+        """Wait for queued writes to finish, with `async_write` or
+        `async_save`."""
+        if self.saver is not None:
+            self.saver.flush()
+        if self.writer is not None:
+            self.writer.flush()
 
-        ...
+    def finish(self):
+        """Mark the run as ended, saving any run-level stats in `summary`.
+        Finishing a run again does nothing."""
+        if self.end_time is not None:
+            return
+        self.end_time = datetime.now(timezone.utc)
+        if self.saver is not None:
+            self.saver.close()
+        if self.sampler is not None:
+            self._track_samples(self.sampler.stop())
+            self.summary['resource_sampler'] = self.sampler.overhead()
+        if self.timing is not None:
+            if (record := self.timing.record()) is not None:
+                self._track_stream('timing', [record])
+            self.summary['timing'] = self.timing.summary()
+        if profile.is_enabled():
+            self.summary['configurable_profile'] = profile.diff(
+                profile.snapshot(), self._profile_start
+            )
+        if self.writer is not None and (self.writer.dropped or self.writer.coalesced):
+            self.summary['async_write'] = {
+                'dropped': self.writer.dropped,
+                'coalesced': self.writer.coalesced,
+            }
+        self.save()
+        if self.writer is not None:
+            self.writer.close()
 
+    def __enter__(self) -> 'ThatchRun':
+        return self
 
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.finish()
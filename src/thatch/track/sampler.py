@@ -0,0 +1,149 @@
+"""Background sampling of a run's resource usage, for
+`ThatchRun(sample_resources=...)`.
+
+Every `interval` seconds, a background thread records the process's CPU, RSS,
+I/O and thread count, and the same for its child processes (summed), as a
+record of `sys/` keys:
+
+    sys/time                 seconds since sampling started
+    sys/cpu_percent          of one CPU, since the previous sample
+    sys/rss                  bytes
+    sys/read_bytes           total so far, where the OS reports it
+    sys/write_bytes
+    sys/threads
+    sys/children             number of (recursive) child processes
+    sys/children_cpu_percent
+    sys/children_rss
+    sys/sampler_ms           CPU time taken by this sample
+
+Samples are handed to the run in batches of `batch_size`, and added to its
+`sys` stream (see `BaseRun.streams`) the next time the run tracks or saves,
+so sampling never touches the run from another thread. Being a separate
+stream, samples aren't rows of the run's log, so they don't change the steps
+of its tracked records.
+"""
+
+import collections
+import threading
+import time
+from typing import Any
+
+import psutil
+
+
+class ResourceSampler:
+    """Samples the resource usage of this process and its children."""
+
+    def __init__(self, interval: float = 1.0, batch_size: int = 10):
+        assert interval > 0 and batch_size > 0
+        self.interval = interval
+        self.batch_size = batch_size
+        # batches of samples, for the run to take (see `take`)
+        self.batches: collections.deque[list[dict[str, Any]]] = collections.deque()
+        self.n_samples = 0
+        # CPU time spent sampling, in seconds
+        self.cpu_time = 0.0
+        self._process = psutil.Process()
+        # kept across samples, as `cpu_percent` is since the previous call
+        self._children: dict[int, psutil.Process] = dict()
+        self._buffer: list[dict[str, Any]] = []
+        self._start = time.monotonic()
+        self._stop = threading.Event()
+        self._metrics = [
+            ('sys/cpu_percent', lambda: self._process.cpu_percent(None)),
+            ('sys/rss', lambda: self._process.memory_info().rss),
+            ('sys/threads', self._process.num_threads),
+        ]
+        self._process.cpu_percent(None)
+        self._thread = threading.Thread(
+            target=self._run, name='thatch-sampler', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self._sample()
+            self._sample()
+        finally:
+            # whatever was sampled, even if sampling failed
+            self.batches.append(self._buffer)
+            self._buffer = []
+
+    def _sample(self):
+        cpu_start = time.thread_time()
+        record: dict[str, Any] = {'sys/time': time.monotonic() - self._start}
+        # A metric the OS refuses (e.g. `psutil.AccessDenied`) is left out of
+        # the record, rather than ending sampling.
+        with self._process.oneshot():
+            for key, get in self._metrics:
+                try:
+                    record[key] = get()
+                except psutil.Error:
+                    pass
+            # not available on all platforms (e.g. macOS)
+            if hasattr(self._process, 'io_counters'):
+                try:
+                    io = self._process.io_counters()
+                    record['sys/read_bytes'] = io.read_bytes
+                    record['sys/write_bytes'] = io.write_bytes
+                except psutil.Error:
+                    pass
+        try:
+            record |= self._sample_children()
+        except psutil.Error:
+            pass
+        cpu_time = time.thread_time() - cpu_start
+        self.cpu_time += cpu_time
+        record['sys/sampler_ms'] = cpu_time * 1e3
+
+        self.n_samples += 1
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.batches.append(self._buffer)
+            self._buffer = []
+
+    def _sample_children(self) -> dict[str, Any]:
+        children = dict()
+        cpu_percent = 0.0
+        rss = 0
+        for child in self._process.children(recursive=True):
+            # the same `Process` as before, so its CPU is since the last sample
+            child = self._children.get(child.pid, child)
+            try:
+                with child.oneshot():
+                    cpu_percent += child.cpu_percent(None)
+                    rss += child.memory_info().rss
+            except psutil.Error:
+                # exited since being listed
+                continue
+            children[child.pid] = child
+        self._children = children
+        return {
+            'sys/children': len(children),
+            'sys/children_cpu_percent': cpu_percent,
+            'sys/children_rss': rss,
+        }
+
+    def take(self) -> list[dict[str, Any]]:
+        """The samples of the batches which are ready, in order."""
+        samples = []
+        while self.batches:
+            samples.extend(self.batches.popleft())
+        return samples
+
+    def stop(self) -> list[dict[str, Any]]:
+        """Take a last sample and stop, returning the samples not yet taken."""
+        self._stop.set()
+        self._thread.join()
+        return self.take()
+
+    def overhead(self) -> dict[str, float]:
+        """CPU time spent sampling, in total and as a fraction of the time
+        sampled for."""
+        elapsed = time.monotonic() - self._start
+        return {
+            'samples': self.n_samples,
+            'cpu_seconds': self.cpu_time,
+            'cpu_fraction': self.cpu_time / elapsed if elapsed > 0 else 0.0,
+        }
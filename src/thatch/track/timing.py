@@ -0,0 +1,185 @@
+"""Timing the phases of training steps, for `ThatchRun.timer` and `step`.
+
+> for batch in loader:
+>     with run.timer('forward'):
+>         loss = model(batch)
+>     with run.timer('backward'):
+>         loss.backward()
+>     run.step()
+
+Durations are added to a `Sketch` per timer, a fixed-size histogram, so
+percentiles are kept without keeping every duration. Every `flush_every`
+steps, the summaries of the steps since are recorded in the run's `timing`
+stream (see `BaseRun.streams`), so they aren't rows of its log:
+
+    step                     steps so far
+    timing/steps_per_sec     over the steps since the last record
+    timing/<name>/mean       seconds, for each timer
+    timing/<name>/p50
+    timing/<name>/p90
+    timing/<name>/p99
+    timing/<name>/max
+
+where the time between `step()` calls is the timer named `step`. Summaries of
+the whole run are saved in `summary['timing']` when it finishes.
+"""
+
+import math
+import time
+from typing import Any
+
+import numpy as np
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+class Sketch:
+    """Counts of durations in `N_BINS` log-spaced bins, from `MIN_VALUE` to
+    `MAX_VALUE` seconds, so quantiles are within `GAMMA - 1` (relative) of the
+    true ones, in constant memory."""
+
+    GAMMA = 1.02
+    MIN_VALUE = 1e-9
+    MAX_VALUE = 1e5
+    N_BINS = math.ceil(math.log(MAX_VALUE / MIN_VALUE, GAMMA)) + 1
+    _SCALE = 1 / math.log(GAMMA)
+
+    __slots__ = ('bins', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.bins = [0] * self.N_BINS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        if value > self.MIN_VALUE:
+            i = min(
+                int(math.log(value / self.MIN_VALUE) * self._SCALE), self.N_BINS - 1
+            )
+        else:
+            i = 0
+        self.bins[i] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Sketch'):
+        self.bins = [a + b for a, b in zip(self.bins, other.bins)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, qs: list[float]) -> list[float]:
+        if self.count == 0:
+            return [math.nan] * len(qs)
+        cumulative = np.cumsum(self.bins)
+        out = []
+        for q in qs:
+            i = int(np.searchsorted(cumulative, q * self.count, 'left'))
+            # the middle of the bin, geometrically
+            value = self.MIN_VALUE * self.GAMMA ** (i + 0.5)
+            out.append(min(max(value, self.min), self.max))
+        return out
+
+    def stats(self) -> dict[str, float]:
+        """Mean, quantiles (as in `QUANTILES`) and max."""
+        if self.count == 0:
+            return dict()
+        quantiles = self.quantiles(list(QUANTILES.values()))
+        return {
+            'mean': self.total / self.count,
+            **dict(zip(QUANTILES, quantiles)),
+            'max': self.max,
+        }
+
+
+class Timer:
+    """Adds the duration of each `with` block to a sketch. Not reentrant."""
+
+    __slots__ = ('sketch', '_start')
+
+    def __init__(self, sketch: Sketch):
+        self.sketch = sketch
+        self._start = 0.0
+
+    def __enter__(self) -> 'Timer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.sketch.add(time.perf_counter() - self._start)
+
+
+class Timing:
+    """The timers and step count of a run."""
+
+    def __init__(self, flush_every: int = 100):
+        assert flush_every > 0
+        self.flush_every = flush_every
+        self.steps = 0
+        # sketches of the steps since the last record, and of the whole run
+        self.window: dict[str, Sketch] = {'step': Sketch()}
+        self.total: dict[str, Sketch] = dict()
+        self.timers: dict[str, Timer] = dict()
+        self._start = self._last_step = self._window_start = time.perf_counter()
+        self._window_steps = 0
+
+    def timer(self, name: str) -> Timer:
+        timer = self.timers.get(name)
+        if timer is None:
+            sketch = self.window.setdefault(name, Sketch())
+            timer = self.timers[name] = Timer(sketch)
+        return timer
+
+    def step(self) -> dict[str, Any] | None:
+        """Count a step, returning the record to track if one is due."""
+        now = time.perf_counter()
+        self.window['step'].add(now - self._last_step)
+        self._last_step = now
+        self.steps += 1
+        self._window_steps += 1
+        if self._window_steps >= self.flush_every:
+            return self.record()
+        return None
+
+    def record(self) -> dict[str, Any] | None:
+        """Summaries of the steps since the last record, which start anew."""
+        if not any(sketch.count for sketch in self.window.values()):
+            return None
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        record: dict[str, Any] = {
+            'step': self.steps,
+            'timing/steps_per_sec': self._window_steps / elapsed if elapsed else 0.0,
+        }
+        for name, sketch in self.window.items():
+            for stat, value in sketch.stats().items():
+                record[f'timing/{name}/{stat}'] = value
+            self.total.setdefault(name, Sketch()).merge(sketch)
+            # in place, as timers refer to these
+            sketch.reset()
+        self._window_start = now
+        self._window_steps = 0
+        return record
+
+    def summary(self) -> dict[str, Any]:
+        """Summaries of the whole run (of what's been recorded)."""
+        elapsed = self._last_step - self._start
+        return {
+            'steps': self.steps,
+            'steps_per_sec': self.steps / elapsed if elapsed else 0.0,
+            **{
+                name: {'count': sketch.count, **sketch.stats()}
+                for name, sketch in self.total.items()
+                if sketch.count
+            },
+        }
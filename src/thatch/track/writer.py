@@ -0,0 +1,314 @@
+"""Background writing of a run to its root, for `ThatchRun(async_write=True)`.
+
+Tracked records are put on a bounded queue, and a background thread collects
+them into batches which it appends to the root (so compressing and writing
+happens off the tracking thread). Saving the run's metadata goes through the
+same queue, so it's written in order with the records.
+
+When the queue is full, `backpressure` decides what `put` does:
+    - 'block': wait until there is room.
+    - 'drop': drop the record (counted in `dropped`).
+    - 'coalesce': merge it into a pending record, with later values
+      overwriting earlier ones, which is queued once there is room (counted in
+      `coalesced`). Use explicit `step` values with this, since rows are merged.
+
+Checkpoints and artifacts are saved in the background by an `AsyncSaver`,
+for `ThatchRun(async_save=True)`.
+
+Writers which aren't closed by the time the interpreter exits are flushed and
+closed then.
+"""
+
+import atexit
+import copy
+import os
+import queue
+import threading
+import time
+import warnings
+import weakref
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Literal
+
+from .run import BaseRun
+
+if TYPE_CHECKING:
+    from .root import ThatchRoot
+
+Backpressure = Literal['block', 'drop', 'coalesce']
+
+# queue items other than records (which are always dicts)
+_SAVE = 'save'
+_STREAM = 'stream'
+_FLUSH = 'flush'
+_CLOSE = 'close'
+
+
+class AsyncWriter:
+    """Writes a run's records and metadata to a root from a background thread.
+
+    Records are appended with `root.append_log`, batched for up to `interval`
+    seconds or `batch_size` records. Metadata is written with `root.write_run`,
+    with a copy of the run without its log. Records of other streams are
+    appended with `root.append_stream`, as they're put.
+    """
+
+    def __init__(
+        self,
+        run: BaseRun,
+        root: 'ThatchRoot',
+        max_queue: int = 10_000,
+        backpressure: Backpressure = 'block',
+        interval: float = 1.0,
+        batch_size: int = 10_000,
+    ):
+        assert backpressure in ('block', 'drop', 'coalesce')
+        self.uuid = run.uuid
+        self.root = root
+        self.backpressure = backpressure
+        self.interval = interval
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.coalesced = 0
+        self.closed = False
+        self._pending: dict[str, Any] | None = None
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(
+            target=self._run, name=f'thatch-writer-{run.uuid[:8]}', daemon=True
+        )
+        self._thread.start()
+        _open_writers.add(self)
+
+    def put(self, record: dict[str, Any]):
+        """Queue a record to be appended to the run's log."""
+        self._check()
+        pending = self._pending
+        if pending is not None:
+            # keep order: nothing goes in before the pending record does
+            try:
+                self.queue.put_nowait(pending)
+                self._pending = None
+            except queue.Full:
+                pending |= record
+                self.coalesced += 1
+                return
+
+        if self.backpressure == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.backpressure == 'drop':
+                self.dropped += 1
+            else:
+                self._pending = dict(record)
+
+    def put_stream(self, name: str, records: list[dict[str, Any]]):
+        """Queue records to be appended to one of the run's streams. These wait
+        for room in the queue whatever `backpressure` is, as they're few."""
+        self._check()
+        self._put_pending()
+        self.queue.put((_STREAM, (name, records)))
+
+    def save(self, run: BaseRun):
+        """Queue writing the run's metadata, as it currently is."""
+        self._check()
+        self._put_pending()
+        meta = BaseRun(
+            uuid=run.uuid,
+            config=run.config,
+            experiment=run.experiment,
+            tags=list(run.tags),
+            start_time=run.start_time,
+            end_time=run.end_time,
+            summary=copy.deepcopy(run.summary),
+        )
+        self.queue.put((_SAVE, meta))
+
+    def flush(self):
+        """Wait until everything queued so far has been written."""
+        self._check()
+        self._put_pending()
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        while not done.wait(0.1):
+            if not self._thread.is_alive():
+                self._check()
+                raise RuntimeError('writer thread exited')
+        self._check()
+
+    def close(self):
+        """Flush, then stop the background thread."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            _open_writers.discard(self)
+            if self._thread.is_alive():
+                self.queue.put((_CLOSE, None))
+                self._thread.join()
+
+    def _put_pending(self):
+        if self._pending is not None:
+            self.queue.put(self._pending)
+            self._pending = None
+
+    def _check(self):
+        if self.closed:
+            raise RuntimeError('writer is closed')
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('background write failed') from error
+
+    def _run(self):
+        while True:
+            batch: list[dict[str, Any]] = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.interval
+            # collect records until the batch is full or it's been long enough
+            while isinstance(item, dict):
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    item = None
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    item = None
+
+            try:
+                if batch:
+                    self.root.append_log(self.uuid, batch)
+                if item is not None and item[0] == _SAVE:
+                    self.root.write_run(item[1])
+                elif item is not None and item[0] == _STREAM:
+                    self.root.append_stream(self.uuid, *item[1])
+            except Exception as e:  # noqa: BLE001 - raised again by `_check`
+                # the first error, as later ones are likely caused by it
+                if self._error is None:
+                    self._error = e
+
+            if item is not None and item[0] == _FLUSH:
+                item[1].set()
+            elif item is not None and item[0] == _CLOSE:
+                return
+
+
+class AsyncSaver:
+    """Writes a run's checkpoints and artifacts to a root from a background
+    thread, for `ThatchRun(async_save=True)`.
+
+    Saving takes a snapshot of what's saved (a deep copy, so arrays are
+    copied as they are), which is then serialized and written in the
+    background, in the order saves were made. At most `max_in_flight` saves
+    are queued or being written at once; saving another waits for the oldest
+    to finish, so snapshots don't pile up in memory.
+
+    Each save returns a `Future` of its digest. Errors are also raised from
+    the next call, like `AsyncWriter`.
+    """
+
+    def __init__(self, run: BaseRun, root: 'ThatchRoot', max_in_flight: int = 2):
+        assert max_in_flight > 0
+        self.uuid = run.uuid
+        self.root = root
+        self.closed = False
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._error: BaseException | None = None
+        # a single thread, so saves are written in order
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f'thatch-saver-{run.uuid[:8]}'
+        )
+        _open_writers.add(self)
+
+    def checkpoint(self, state: Any, step: int) -> 'Future[str]':
+        """Queue saving a checkpoint of `state` as it currently is."""
+        return self._submit(
+            self.root.write_checkpoint,
+            lambda: (self.uuid, step, copy.deepcopy(state)),
+        )
+
+    def artifact(self, path: str, data: Any) -> 'Future[str]':
+        """Queue saving an artifact. Contents given as a file object are read
+        now; a path to a file is only read in the background, so the file
+        shouldn't change until the save is done."""
+        return self._submit(
+            self.root.write_artifact,
+            lambda: (self.uuid, path, _snapshot_contents(data)),
+        )
+
+    def flush(self):
+        """Wait until every save so far has been written."""
+        self._check()
+        # saves are written in order, so all are done (along with their
+        # callbacks) by the time this is
+        self._executor.submit(lambda: None).result()
+        self._check()
+
+    def close(self):
+        """Flush, then stop the background thread."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            _open_writers.discard(self)
+            self._executor.shutdown()
+
+    def _submit(
+        self,
+        fn: Callable[..., str],
+        snapshot: Callable[[], tuple[Any, ...]],
+    ) -> 'Future[str]':
+        self._check()
+        # the snapshot counts as in flight too, as it's what takes up memory
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *snapshot())
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: 'Future[str]'):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self._error = future.exception()
+
+    def _check(self):
+        if self.closed:
+            raise RuntimeError('saver is closed')
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('background save failed') from error
+
+
+def _snapshot_contents(data: Any) -> bytes | os.PathLike:
+    if isinstance(data, (bytes, os.PathLike)):
+        return data
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    return data.read()
+
+
+_open_writers: 'weakref.WeakSet[AsyncWriter | AsyncSaver]' = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_writers():
+    for writer in list(_open_writers):
+        try:
+            writer.close()
+        except RuntimeError as e:
+            # nowhere left to raise to
+            warnings.warn(
+                f'{type(writer).__name__} of run {writer.uuid}: {e.__cause__ or e!r}'
+            )
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from thatch.track import DirRoot, ThatchRun
+from thatch.track.aggregate import aggregate_metrics, nan_quantiles, stack_metrics
+
+
+def test_stack_metrics_exact():
+    metrics = [
+        (np.array([0, 1, 2]), np.array([1.0, 2.0, 3.0])),
+        (np.array([1, 3]), np.array([10.0, 30.0])),
+    ]
+    steps, values = stack_metrics(metrics)
+    assert steps.tolist() == [0, 1, 2, 3]
+    np.testing.assert_equal(
+        values, [[1.0, 2.0, 3.0, np.nan], [np.nan, 10.0, np.nan, 30.0]]
+    )
+
+    steps, values = stack_metrics(metrics, steps=np.array([1, 3]))
+    np.testing.assert_equal(values, [[2.0, np.nan], [10.0, 30.0]])
+
+
+def test_stack_metrics_interpolate():
+    metrics = [
+        (np.array([0, 10]), np.array([0.0, 10.0])),
+        (np.array([5, 20, 15]), np.array([0.0, 30.0, 20.0])),
+        (np.zeros(0, dtype=np.int64), np.zeros(0)),
+    ]
+    steps, values = stack_metrics(
+        metrics, 'interpolate', steps=np.array([0, 5, 10, 20])
+    )
+    np.testing.assert_allclose(
+        values,
+        [
+            [0.0, 5.0, 10.0, np.nan],
+            [np.nan, 0.0, 10.0, 30.0],
+            [np.nan] * 4,
+        ],
+    )
+    steps, _ = stack_metrics(metrics, 'interpolate', steps=5)
+    assert steps.tolist() == [0, 5, 10, 15, 20]
+
+
+def test_aggregate_metrics():
+    rng = np.random.default_rng(0)
+    metrics = [(np.arange(50), rng.normal(size=50)) for _ in range(20)]
+    # one run with fewer steps
+    metrics.append((np.arange(10), rng.normal(size=10)))
+    stacked = stack_metrics(metrics)[1]
+
+    out = aggregate_metrics(metrics, ['mean', 'std', 'max', 'median', 'q5', 'q95'])
+    assert out['count'].tolist() == [21] * 10 + [20] * 40
+    np.testing.assert_allclose(out['mean'], np.nanmean(stacked, axis=0))
+    np.testing.assert_allclose(out['std'], np.nanstd(stacked, axis=0))
+    np.testing.assert_allclose(out['max'], np.nanmax(stacked, axis=0))
+    np.testing.assert_allclose(
+        [out['q5'], out['median'], out['q95']],
+        np.nanquantile(stacked, [0.05, 0.5, 0.95], axis=0),
+    )
+    with pytest.raises(ValueError):
+        aggregate_metrics(metrics, 'q')
+
+    # steps without any values are NaN
+    assert np.isnan(nan_quantiles(np.full((3, 2), np.nan), [0.5])).all()
+
+
+def test_root_aggregate(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    for lr in [0.1, 0.2]:
+        for seed in range(3):
+            with ThatchRun(root=root, config_source={'lr': lr}) as run:
+                for step in range(10):
+                    run.track(step=step, loss=lr * step + seed)
+    # a run without the metric is left out
+    ThatchRun(root=root).finish()
+
+    out = root.aggregate('loss', ['mean', 'min'])
+    assert out['step'].tolist() == list(range(10))
+    assert out['count'].tolist() == [6] * 10
+    np.testing.assert_allclose(out['min'], 0.1 * np.arange(10))
+
+    groups = {lr: group.aggregate('loss', 'mean') for lr, group in root.group_by('lr')}
+    np.testing.assert_allclose(groups[0.2]['mean'], 0.2 * np.arange(10) + 1)
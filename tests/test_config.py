@@ -1,4 +1,7 @@
-# import pytest
+import warnings
+
+import pytest
+
 from thatch.config import configurable, configure
 from thatch.config.globals import GLOBAL_CONFIG
 
@@ -105,3 +108,170 @@ def test_configurable_basic():
         assert trainer_object._config == {'lr': 0.03, 'foo': 'bar'}
         special_trainer = SubClass()
         assert special_trainer._config == {'lr': 0.04, 'foo': 'bar', 'fast': True}
+
+
+def test_configurable_positional_collision_warns():
+    @configurable()
+    def scale(x, *, factor: float = 1.0):
+        return x * factor
+
+    with configure(x=5, factor=2.0):
+        with pytest.warns(UserWarning, match='"x"'):
+            assert scale(3) == 6.0
+        # only warned the first time
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            assert scale(4) == 8.0
+
+
+def test_configurable_reuses_resolved_config(monkeypatch):
+    import importlib
+
+    # `thatch.config.configurable` is shadowed by the decorator of the same name
+    configurable_module = importlib.import_module('thatch.config.configurable')
+
+    calls = []
+    index_dots = configurable_module.index_dots
+
+    def counting_index_dots(*args, **kwargs):
+        calls.append(args[1])
+        return index_dots(*args, **kwargs)
+
+    monkeypatch.setattr(configurable_module, 'index_dots', counting_index_dots)
+
+    @configurable()
+    def get_lr(*, lr: float = 0.0):
+        return lr
+
+    with configure(lr=0.1):
+        assert get_lr() == 0.1
+        n_calls = len(calls)
+        assert get_lr() == 0.1
+        assert get_lr(lr=0.5) == 0.5
+        # nothing changed, so nothing was re-resolved
+        assert len(calls) == n_calls
+
+        with configure(get_lr={'lr': 0.2}):
+            assert get_lr() == 0.2
+        assert get_lr() == 0.1
+    assert len(calls) > n_calls
+
+
+def test_configure_layers():
+    big = {'weights': list(range(1000))}
+    outer = configure(a=1, b={'c': 2}, data=big)
+    inner = configure(b={'d': 3})
+
+    with outer:
+        # values are layered by reference, not copied
+        assert GLOBAL_CONFIG['data']['weights'] is big['weights']
+        with inner:
+            # like `dict.update`, top-level keys of later layers replace earlier
+            assert GLOBAL_CONFIG == {'a': 1, 'b': {'d': 3}, 'data': big}
+            with outer:
+                assert GLOBAL_CONFIG['b'] == {'c': 2}
+            assert GLOBAL_CONFIG['b'] == {'d': 3}
+        assert GLOBAL_CONFIG == {'a': 1, 'b': {'c': 2}, 'data': big}
+    assert GLOBAL_CONFIG == dict()
+    assert not GLOBAL_CONFIG
+
+    # exiting out of order drops everything entered since, like restoring a
+    # snapshot would
+    outer.__enter__()
+    inner.__enter__()
+    outer.__exit__(None, None, None)
+    assert GLOBAL_CONFIG == dict()
+
+
+def test_configure_per_thread_scope():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from thatch.config import read_config
+
+    @configurable()
+    def trial_value(*, value: int = -1):
+        return value
+
+    barrier = threading.Barrier(4)
+
+    def run_trial(i: int):
+        with configure(value=i):
+            # make sure all trials are inside their configure at once
+            barrier.wait()
+            return trial_value(), read_config('value')
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(run_trial, range(4))) == [(i, i) for i in range(4)]
+    assert GLOBAL_CONFIG == dict()
+
+    # threads without a scope of their own see the main thread's config
+    with configure(value=100):
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(trial_value).result() == 100
+
+
+def test_configure_thread_scope_not_pinned():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from thatch.config import read_config
+
+    entered, exited = threading.Event(), threading.Event()
+
+    def worker():
+        # enters while the main thread's scope is shared, and exits after it
+        # was exited
+        with configure(y=2):
+            entered.set()
+            exited.wait()
+        return GLOBAL_CONFIG.to_dict()
+
+    def current():
+        return GLOBAL_CONFIG.to_dict(), read_config('x')
+
+    with ThreadPoolExecutor(1) as pool:
+        with configure(x=1):
+            future = pool.submit(worker)
+            entered.wait()
+        exited.set()
+        # back to following the main thread, rather than its old scope
+        assert future.result() == dict()
+        assert pool.submit(current).result() == (dict(), None)
+        with configure(z=3):
+            assert pool.submit(current).result() == ({'z': 3}, None)
+
+
+def test_configure_per_task_scope():
+    import asyncio
+
+    @configurable()
+    def trial_value(*, value: int = -1):
+        return value
+
+    async def run_trial(i: int):
+        with configure(value=i):
+            await asyncio.sleep(0.01)
+            return trial_value()
+
+    async def main():
+        return await asyncio.gather(*(run_trial(i) for i in range(4)))
+
+    with configure(value=100):
+        assert asyncio.run(main()) == [0, 1, 2, 3]
+        assert trial_value() == 100
+
+
+def test_configure_non_str_keyed_dict():
+    from thatch.config import read_config
+
+    @configurable()
+    def weighted(*, weights: dict | None = None):
+        return weights
+
+    # a value, rather than a nested config
+    with configure(weights={0: 1.0, 1: 0.5}, nested={'a': {2: 'b'}}):
+        assert weighted() == {0: 1.0, 1: 0.5}
+        assert read_config('weights') == {0: 1.0, 1: 0.5}
+        assert read_config('nested.a') == {2: 'b'}
+        assert read_config('weights.0') is None
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+from thatch.config import GLOBAL_CONFIG, configure_from_args, load_config_file
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    import thatch.config.files as files_module
+
+    parsed = []
+    for suffix, parser in list(files_module._PARSERS.items()):
+
+        def counting_parser(path, parser=parser):
+            parsed.append(path)
+            return parser(path)
+
+        monkeypatch.setitem(files_module._PARSERS, suffix, counting_parser)
+    monkeypatch.setattr(files_module, '_cache', dict())
+    return parsed
+
+
+def test_load_config_file(tmp_path, count_parses):
+    (tmp_path / 'a.json').write_text('{"x": {"y": 1}}')
+    (tmp_path / 'b.toml').write_text('[x]\ny = 2\n')
+    (tmp_path / 'c.yaml').write_text('x:\n  y: 3\n')
+
+    for i, name in enumerate(['a.json', 'b.toml', 'c.yaml']):
+        assert load_config_file(tmp_path / name) == {'x': {'y': i + 1}}
+    assert len(count_parses) == 3
+
+    # cached while unchanged
+    assert load_config_file(tmp_path / 'a.json') == {'x': {'y': 1}}
+    assert len(count_parses) == 3
+
+    (tmp_path / 'a.json').write_text('{"x": {"y": 10}}')
+    os.utime(tmp_path / 'a.json', ns=(0, 0))
+    assert load_config_file(tmp_path / 'a.json') == {'x': {'y': 10}}
+    assert len(count_parses) == 4
+
+    with pytest.raises(ValueError):
+        load_config_file(tmp_path / 'd.ini')
+
+
+def test_load_config_file_precompiled(tmp_path, count_parses, monkeypatch):
+    import thatch.config.files as files_module
+
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    path = tmp_path / 'configs' / 'config.yaml'
+    path.parent.mkdir()
+    path.write_text('lr: 0.1\n')
+    assert load_config_file(path, precompile=True) == {'lr': 0.1}
+    # cached outside of the config's directory
+    assert os.listdir(path.parent) == ['config.yaml']
+    assert len(os.listdir(tmp_path / 'cache' / 'thatch' / 'configs')) == 1
+
+    # e.g. another process, with an empty in-memory cache
+    monkeypatch.setattr(files_module, '_cache', dict())
+    assert load_config_file(path, precompile=True) == {'lr': 0.1}
+    assert len(count_parses) == 1
+
+    # a stale cache entry is ignored
+    monkeypatch.setattr(files_module, '_cache', dict())
+    path.write_text('lr: 0.25\n')
+    assert load_config_file(path, precompile=True) == {'lr': 0.25}
+    assert len(count_parses) == 2
+
+    # configs `marshal` can't store just aren't cached
+    dated = tmp_path / 'configs' / 'dated.toml'
+    dated.write_text('day = 2024-01-01\n')
+    assert str(load_config_file(dated, precompile=True)['day']) == '2024-01-01'
+    assert len(os.listdir(tmp_path / 'cache' / 'thatch' / 'configs')) == 1
+
+
+def test_configure_from_args(tmp_path, monkeypatch):
+    (tmp_path / 'base.yaml').write_text('optim:\n  lr: 0.1\n  momentum: 0.9\n')
+    argv = ['train.py', '-c', str(tmp_path / 'base.yaml'), '-c', 'optim.lr=0.2']
+    monkeypatch.setattr(sys, 'argv', argv)
+
+    with configure_from_args():
+        assert GLOBAL_CONFIG == {'optim': {'lr': 0.2, 'momentum': 0.9}}
+    assert GLOBAL_CONFIG == dict()
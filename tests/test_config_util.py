@@ -75,3 +75,35 @@ def test_index_dots():
         index_dots(d, 'a.x', raise_on_missing=True)
     with pytest.raises(Exception):
         index_dots(d, 'a.b.c.x', raise_on_missing=True)
+
+
+def test_index_dots_config_stack():
+    from thatch.config import ConfigStack
+    from thatch.config.util import index_dots
+
+    stack = ConfigStack()
+    stack.push({'a': {'b': {'c': 10}, 'd': 20}, 'e': 30}, owner='outer')
+    assert index_dots(stack, 'a.b.c') == 10
+    assert index_dots(stack, 'a.b') == {'c': 10}
+    assert index_dots(stack, 'e') == 30
+    assert index_dots(stack, 'a.x') is None
+    assert index_dots(stack, 'a.b.c.x', default=-1) == -1
+    with pytest.raises(KeyError):
+        index_dots(stack, 'a.x', raise_on_missing=True)
+
+    # top-level keys of later layers replace those of earlier ones entirely
+    stack.push({'a': {'d': 21}}, owner='inner')
+    assert index_dots(stack, 'a.d') == 21
+    assert index_dots(stack, 'a.b.c') is None
+    assert index_dots(stack, 'e') == 30
+
+    stack.pop(owner='inner')
+    assert index_dots(stack, 'a.b.c') == 10
+
+
+def test_flatten_dict():
+    from thatch.config.util import flatten_dict
+
+    d = {'a': {'b': {'c': 1}, 'd': 2}, 'e': 3, 'f': {}}
+    assert list(flatten_dict(d)) == [('a.b.c', 1), ('a.d', 2), ('e', 3)]
+    assert list(flatten_dict(d, sep='/'))[0] == ('a/b/c', 1)
@@ -0,0 +1,56 @@
+from thatch.config import configurable, configure, profile
+
+
+@configurable()
+def scaled(x, *, factor: float = 1.0):
+    return x * factor
+
+
+def key(fn) -> str:
+    return f'{fn.__module__}.{fn.__qualname__}'
+
+
+def test_profile():
+    profile.reset()
+
+    # nothing is recorded while disabled
+    with configure(factor=2.0):
+        scaled(1)
+    assert key(scaled) not in profile.snapshot()
+
+    with profile.profiling():
+        with configure(factor=2.0):
+            for i in range(10):
+                assert scaled(i) == i * 2.0
+        with configure(factor=3.0):
+            scaled(1)
+    assert not profile.is_enabled()
+
+    stats = profile.snapshot()[key(scaled)]
+    assert stats['calls'] == 11
+    # resolved once for each config, cached otherwise
+    assert stats['resolves'] == 2
+    assert stats['overhead_ns'] > 0 and stats['fn_ns'] > 0
+    assert 'scaled' in profile.report()
+
+    before = profile.snapshot()
+    with profile.profiling():
+        scaled(1)
+    assert profile.diff(profile.snapshot(), before)[key(scaled)]['calls'] == 1
+
+
+def test_profile_saved_with_run():
+    from thatch.track.run import ThatchRun
+
+    with profile.profiling():
+        scaled(1)
+        with ThatchRun() as run:
+            with configure(factor=2.0):
+                scaled(1)
+                scaled(2)
+    # only the calls made during the run
+    assert run.summary['configurable_profile'][key(scaled)]['calls'] == 2
+
+    with ThatchRun() as run:
+        scaled(1)
+    assert 'configurable_profile' not in run.summary
@@ -0,0 +1,91 @@
+import textwrap
+
+from thatch.config.scan import Scanner, scan, scan_source
+
+SOURCE = textwrap.dedent("""
+    import heavy_dependency_which_is_not_installed
+    from thatch import config
+    from thatch.config import configurable
+
+
+    @configurable()
+    def train(steps, *, lr: float = 1e-3, epochs=10, model):
+        ...
+
+
+    @config.configurable('optim', 'optim.sgd')
+    def make_optimizer(*, momentum=0.9):
+        ...
+
+
+    class Trainer:
+        @configurable()
+        def __init__(self, *, batch_size=32):
+            ...
+
+        def not_configurable(self, *, x=1):
+            ...
+""")
+
+
+def test_scan_source():
+    train, make_optimizer, trainer = scan_source(SOURCE)
+
+    assert train.qualname == 'train'
+    assert train.keys == ('', 'train')
+    assert train.params == {'lr': '0.001', 'epochs': '10', 'model': None}
+    assert train.config_keys() == [
+        'lr',
+        'epochs',
+        'model',
+        'train.lr',
+        'train.epochs',
+        'train.model',
+    ]
+
+    assert make_optimizer.keys == ('optim', 'optim.sgd')
+    assert make_optimizer.config_keys() == ['optim.momentum', 'optim.sgd.momentum']
+
+    # same as `_resolve_keys`, using the class name for __init__
+    assert trainer.qualname == 'Trainer.__init__'
+    assert trainer.keys == ('', 'Trainer')
+
+
+def test_scanner_cache(tmp_path, monkeypatch):
+    import thatch.config.scan as scan_module
+
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'train.py').write_text(SOURCE)
+    (tmp_path / 'pkg' / 'empty.py').write_text('x = 1\n')
+    cache_path = tmp_path / 'cache.json'
+
+    parsed = []
+    scan_source = scan_module.scan_source
+
+    def counting_scan_source(source, path='<unknown>'):
+        parsed.append(path)
+        return scan_source(source, path)
+
+    monkeypatch.setattr(scan_module, 'scan_source', counting_scan_source)
+
+    found = scan(tmp_path, cache_path=cache_path)
+    assert len(found) == 3
+    assert len(parsed) == 2
+
+    # unchanged files aren't parsed again, even from a new scanner
+    assert Scanner(cache_path).scan(tmp_path) == found
+    assert len(parsed) == 2
+
+    # nor are files with new mtimes but the same content
+    (tmp_path / 'pkg' / 'empty.py').write_text('x = 1\n')
+    assert scan(tmp_path, cache_path=cache_path) == found
+    assert len(parsed) == 2
+
+    (tmp_path / 'pkg' / 'empty.py').write_text(
+        'from thatch.config import configurable\n'
+        '@configurable("extra")\n'
+        'def f(*, y=2): ...\n'
+    )
+    found = scan(tmp_path, cache_path=cache_path)
+    assert len(parsed) == 3
+    assert [info.config_keys() for info in found][0] == ['extra.y']
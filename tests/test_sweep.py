@@ -0,0 +1,89 @@
+from concurrent.futures import CancelledError, Executor, Future
+
+import pytest
+
+from thatch.config import (
+    Grid,
+    RandomSearch,
+    configurable,
+    configure,
+    read_config,
+    sweep,
+)
+from thatch.config.sweep import expand_point
+
+
+@configurable()
+def objective(*, lr: float = 0.0, depth: int = 1):
+    if depth < 0:
+        raise ValueError('negative depth')
+    return lr * depth
+
+
+def read_trial_config():
+    return read_config('')
+
+
+def test_search_spaces():
+    grid = Grid({'a': [1, 2], 'b.c': ['x', 'y', 'z']})
+    assert len(grid) == 6
+    assert list(grid)[:2] == [{'a': 1, 'b.c': 'x'}, {'a': 1, 'b.c': 'y'}]
+
+    space = RandomSearch({'a': [1, 2, 3], 'b': lambda rng: rng.random()}, n=5, seed=0)
+    points = list(space)
+    assert len(points) == 5
+    assert all(p['a'] in (1, 2, 3) and 0 <= p['b'] < 1 for p in points)
+    # same seed, same points
+    assert list(space) == points
+
+
+def test_expand_point():
+    base = {'optim': {'lr': 0.1, 'momentum': 0.9}, 'seed': 0}
+    assert expand_point(base, {'optim.lr': 0.2}) == {
+        'optim': {'lr': 0.2, 'momentum': 0.9},
+        'seed': 0,
+    }
+    assert expand_point(None, {'a.b': 1}) == {'a': {'b': 1}}
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_sweep(executor):
+    space = [{'lr': lr, 'objective.depth': d} for lr in (1.0, 2.0) for d in (-1, 2)]
+    trials = list(sweep(objective, space, executor=executor, max_workers=2))
+    assert sorted(t.index for t in trials) == [0, 1, 2, 3]
+
+    for t in trials:
+        if t.config['objective']['depth'] < 0:
+            # failures are reported, without stopping other trials
+            assert isinstance(t.error, ValueError)
+        else:
+            assert t.error is None
+            assert t.result == t.config['lr'] * 2
+
+
+def test_sweep_base_config():
+    trials = sweep(read_trial_config, Grid({'b': [1, 2]}), base={'a': 0, 'b': 0})
+    results = sorted((t.result for t in trials), key=lambda c: c['b'])
+    assert results == [{'a': 0, 'b': 1}, {'a': 0, 'b': 2}]
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_sweep_outer_config(executor):
+    # trials are layered over the config active around the sweep
+    with configure({'a': 0, 'c': 3}):
+        trials = list(sweep(read_trial_config, [{'a': 1}], executor=executor))
+    assert trials[0].result == {'a': 1, 'c': 3}
+
+
+class CancellingExecutor(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        # as an executor's worker would, on reaching a cancelled future
+        future = Future()
+        future.cancel()
+        future.set_running_or_notify_cancel()
+        return future
+
+
+def test_sweep_cancelled():
+    trials = list(sweep(read_trial_config, [{'a': 1}], executor=CancellingExecutor()))
+    assert isinstance(trials[0].error, CancelledError)
@@ -0,0 +1,900 @@
+import threading
+
+import numpy as np
+import pytest
+
+from thatch.config import configure
+from thatch.track import DirRoot, MemoryRoot, Param, ThatchRoot, ThatchRun, log_file
+from thatch.track.compact import Compacted
+
+
+def test_dir_root_write_run(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+
+    with configure(lr=0.1):
+        run = ThatchRun(experiment='test', tags=['a'], root=root)
+    for step in range(10):
+        run.track(step=step, loss=1 / (step + 1))
+    run.save()
+    for step in range(10, 25):
+        run.track(step=step, loss=1 / (step + 1))
+    run.save()
+    # nothing new to write
+    run.save()
+    # written incrementally, as one segment per save
+    segments = sorted(p.name for p in root.columns_path(run.uuid).iterdir())
+    assert segments == ['000000000000.npz', '000000000010.npz']
+    run.finish()
+
+    assert root.uuids() == [run.uuid]
+    loaded = root.load_run(run.uuid)
+    assert loaded.log == run.log
+    assert loaded.config == {'lr': 0.1}
+    assert loaded.experiment == 'test'
+    assert loaded.tags == ['a']
+    assert loaded.start_time == run.start_time
+    assert loaded.end_time == run.end_time
+
+    # a new root instance picks up where the log left off
+    root = DirRoot(tmp_path / '.thatch')
+    run.root = root
+    run.track(step=25, loss=0.0)
+    run.save()
+    assert list(root.read_log(run.uuid)) == run.log
+    assert root.log_length(run.uuid) == 26
+
+
+def test_dir_root_legacy_log(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root)
+    for step in range(10):
+        run.track(step=step, loss=float(step))
+    run.save()
+
+    # a run written before logs were saved by column
+    import shutil
+
+    shutil.rmtree(root.columns_path(run.uuid))
+    with open(root.log_path(run.uuid), 'wb') as f:
+        f.write(log_file.encode_chunk(list(run.log)))
+    root = DirRoot(tmp_path / '.thatch')
+    assert root.load_run(run.uuid).log == run.log
+    assert list(root.read_log(run.uuid)) == run.log
+    assert root.log_length(run.uuid) == 10
+
+    # it's converted to columns once written to
+    run.root = root
+    run.track(step=10, loss=10.0)
+    run.finish()
+    root.log_cache.clear()
+    assert root.load_run(run.uuid).log == run.log
+    assert root.columns_path(run.uuid).exists()
+
+
+def test_log_file_truncated_chunk(tmp_path):
+    path = tmp_path / 'log.pickle.zlib'
+    with open(path, 'wb') as f:
+        f.write(log_file.encode_chunk([{'a': 1}, {'a': 2}]))
+        # e.g. a writer crashing partway through a chunk
+        f.write(log_file.encode_chunk([{'a': 3}])[:-3])
+
+    assert list(log_file.iter_records(path)) == [{'a': 1}, {'a': 2}]
+
+    f, n_records = log_file.open_for_append(path)
+    assert n_records == 2
+    f.write(log_file.encode_chunk([{'a': 4}]))
+    f.close()
+    assert list(log_file.iter_records(path)) == [{'a': 1}, {'a': 2}, {'a': 4}]
+
+
+def test_columnar_log():
+    import numpy as np
+
+    from thatch.track.columns import ColumnarLog
+
+    records = [{'step': step, 'loss': 1 / (step + 1)} for step in range(100)]
+    records[50]['image'] = [1, 2, 3]
+    records[60]['loss'] = 2  # an int within a float column
+    log = ColumnarLog.from_records(records)
+
+    assert len(log) == 100
+    assert log == records
+    assert log[50] == records[50]
+    assert log[-1] == records[-1]
+    assert log[10:20] == records[10:20]
+
+    assert log.columns['step'].dtype == np.int64
+    assert log.columns['image'].dtype == object
+    # mixed types are kept as they were tracked
+    assert log.columns['loss'].dtype == object
+    assert type(log[60]['loss']) is int and type(log[61]['loss']) is float
+    mixed = ColumnarLog.from_records([{'a': 1}, {'a': True}, {'a': 2.5}])
+    assert [type(r['a']) for r in mixed] == [int, bool, float]
+
+    steps, losses = log.metric('loss', start=10, stop=20)
+    assert steps.tolist() == list(range(10, 20))
+    assert losses.tolist() == [1 / (step + 1) for step in range(10, 20)]
+    assert log.aggregate('loss', np.max) == 2
+    assert log.metric('image')[0].tolist() == [50]
+
+    # steps default to the row index; an out-of-order step is still found
+    log = ColumnarLog.from_records([{'a': 1}, {'a': 2}, {'a': 3, 'step': 0}])
+    assert log.metric('a')[0].tolist() == [0, 1, 0]
+    assert log.metric('a', stop=1)[1].tolist() == [1, 3]
+
+    # segments overlapping earlier ones (e.g. rewritten) don't duplicate rows
+    log = ColumnarLog.from_records(records)
+    segments = [log.segment(0, 60), log.segment(40, 80), log.segment(80)]
+    assert ColumnarLog.from_segments(segments) == records
+
+
+def test_dir_root_columns(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root)
+    for step in range(10):
+        run.track(step=step, loss=float(step))
+    run.save()
+    run.track(step=10, loss=None)
+    run.save()
+
+    segments = sorted(p.name for p in root.columns_path(run.uuid).iterdir())
+    assert segments == ['000000000000.npz', '000000000010.npz']
+    # merged into one once the run finishes
+    run.finish()
+    segments = sorted(p.name for p in root.columns_path(run.uuid).iterdir())
+    assert segments == ['000000000000.npz']
+
+    loaded = root.load_run(run.uuid)
+    assert loaded.log == run.log
+    assert loaded.log.metric('loss')[1].tolist()[:10] == list(map(float, range(10)))
+
+
+def test_async_write(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    with ThatchRun(experiment='test', root=root, async_write=True) as run:
+        for step in range(100):
+            run.track(step=step, loss=1 / (step + 1))
+        run.flush()
+        assert list(root.read_log(run.uuid)) == run.log
+        run.track(step=100, loss=0.0)
+
+    assert run.writer is not None and run.writer.closed
+    loaded = root.load_run(run.uuid)
+    assert loaded.log == run.log
+    assert loaded.experiment == 'test'
+    assert loaded.end_time == run.end_time
+
+
+def test_async_write_finish(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root, async_write=True)
+    for i in range(30):
+        run.track(loss=float(i))
+        if i % 10 == 9:
+            # each flush writes what's queued as a batch
+            run.flush()
+    assert len(list(root.columns_path(run.uuid).glob('*.npz'))) == 3
+    run.finish()
+    run.finish()
+
+    # implicit steps continue across batches
+    assert root.load_run(run.uuid).log.metric('loss')[0].tolist() == list(range(30))
+    # and the segments of the batches are merged once finished
+    assert len(list(root.columns_path(run.uuid).glob('*.npz'))) == 1
+    assert root.load_run(run.uuid).log == run.log
+    assert run.writer is not None
+    with pytest.raises(RuntimeError, match='closed'):
+        run.writer.put({'loss': 0.0})
+
+
+class _SlowRoot(DirRoot):
+    """A root whose writes wait until `unblock` is set."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.unblock = threading.Event()
+
+    def write_run(self, run):
+        self.unblock.wait()
+        super().write_run(run)
+
+    def write_checkpoint(self, run_uuid, step, state):
+        self.unblock.wait()
+        return super().write_checkpoint(run_uuid, step, state)
+
+
+@pytest.mark.parametrize('backpressure', ['drop', 'coalesce'])
+def test_async_write_backpressure(tmp_path, backpressure):
+    root = _SlowRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root, async_write=True, max_queue=4, backpressure=backpressure)
+    # the writer is stuck writing the run's metadata, so the queue fills up
+    for step in range(20):
+        run.track(step=step, loss=float(step))
+    root.unblock.set()
+    run.finish()
+
+    log = list(root.read_log(run.uuid))
+    assert run.writer is not None
+    if backpressure == 'drop':
+        assert run.writer.dropped > 0
+        assert len(log) == 20 - run.writer.dropped
+        assert root.load_run(run.uuid).summary['async_write']['dropped'] > 0
+    else:
+        assert run.writer.coalesced > 0
+        assert len(log) == 20 - run.writer.coalesced
+        # merged records keep the latest values
+        assert log[-1] == {'step': 19, 'loss': 19.0}
+
+
+def _param_root(root):
+    configs = [
+        {'dropout': 0.1, 'optim': {'name': 'adam', 'lr': 1e-3}, 'scale': 2.0},
+        {'dropout': 0.5, 'optim': {'name': 'sgd', 'lr': 1e-2}},
+        {'dropout': 0.6, 'optim': {'name': 'adam', 'lr': 1e-2}, 'layers': [2, 4]},
+        {'dropout': 'none', 'optim': {'name': 'sgd', 'lr': 1e-3}},
+        {},
+    ]
+    runs = []
+    for i, config in enumerate(configs):
+        run = ThatchRun(
+            tags=['fail'] if i == 2 else [], root=root, config_source=config
+        )
+        run.finish()
+        runs.append(run)
+    return root, [run.uuid for run in runs]
+
+
+_CONDITIONS = [
+    (Param('dropout') > 0.4, [1, 2]),
+    (Param('dropout') != 0.5, [0, 2]),
+    (Param('optim.name') == 'adam', [0, 2]),
+    ((Param('optim.name') == 'sgd') & (Param('optim.lr') < 5e-3), [3]),
+    ((Param('dropout') < 0.2) | (Param('dropout') == 'none'), [0, 3]),
+    (~(Param('optim.name') == 'adam'), [1, 3, 4]),
+    (Param('layers') == [2, 4], [2]),
+    (Param('optim.name').isin(['sgd']), [1, 3]),
+    # numbers compare equal whether int or float, as for ==
+    (Param('scale') == 2, [0]),
+    (Param('scale').isin([2, 'x']), [0]),
+    (Param('dropout').isin([]), []),
+    (Param('layers').exists(), [2]),
+]
+
+
+@pytest.mark.parametrize('condition, expected', _CONDITIONS)
+def test_dir_root_filter(tmp_path, condition, expected):
+    root, uuids = _param_root(DirRoot(tmp_path / '.thatch'))
+    expected = [uuids[i] for i in expected]
+
+    assert root.filter(condition).uuids() == expected
+    # the same as checking each run's config in python
+    assert ThatchRoot.select(root, condition, uuids) == expected
+    assert [uuid for uuid in uuids if condition(root.load_run(uuid))] == expected
+
+
+def test_dir_root_filter_group_by(tmp_path):
+    root, uuids = _param_root(DirRoot(tmp_path / '.thatch'))
+
+    sub_root = root.filter(
+        lambda run: 'fail' not in run.tags,
+        Param('optim.name') == 'adam',
+    )
+    assert sub_root.uuids() == [uuids[0]]
+    assert len(sub_root.filter(Param('dropout') > 0.4)) == 0
+
+    groups = root.group_by('optim.name')
+    assert [(name, g.uuids()) for name, g in groups] == [
+        ('adam', [uuids[0], uuids[2]]),
+        ('sgd', [uuids[1], uuids[3]]),
+        (None, [uuids[4]]),
+    ]
+    groups = root.filter(Param('optim.lr') >= 1e-2).group_by(('optim.name', 'layers'))
+    assert [(key, g.uuids()) for key, g in groups] == [
+        (('sgd', None), [uuids[1]]),
+        (('adam', [2, 4]), [uuids[2]]),
+    ]
+    groups = root.group_by(lambda run: run.tags)
+    assert [len(g) for _, g in groups] == [4, 1]
+
+    # params of a root from before they were indexed are filled in
+    root.con.execute('DROP TABLE run_params')
+    root.con.commit()
+    root = DirRoot(tmp_path / '.thatch')
+    assert root.filter(Param('dropout') > 0.4).uuids() == uuids[1:3]
+
+
+def _write_runs(path, worker, n_runs):
+    root = DirRoot(path)
+    uuids = []
+    for i in range(n_runs):
+        run = ThatchRun(
+            tags=[f'worker{worker}'],
+            root=root,
+            config_source={'worker': worker, 'i': i},
+        )
+        for step in range(20):
+            run.track(step=step, loss=worker + step)
+            if step % 5 == 4:
+                run.save()
+        run.finish()
+        uuids.append(run.uuid)
+    return uuids
+
+
+def test_dir_root_concurrent_writers(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    path = tmp_path / '.thatch'
+    n_workers, n_runs = 8, 10
+    with ProcessPoolExecutor(n_workers, mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(_write_runs, path, worker, n_runs)
+            for worker in range(n_workers)
+        ]
+        uuids = [future.result() for future in futures]
+
+    root = DirRoot(path)
+    assert sorted(root.uuids()) == sorted(u for worker in uuids for u in worker)
+    for worker, worker_uuids in enumerate(uuids):
+        sub_root = root.filter(Param('worker') == worker)
+        assert sorted(sub_root.uuids()) == sorted(worker_uuids)
+        for run in sub_root:
+            assert run.tags == [f'worker{worker}']
+            assert run.end_time is not None
+            assert run.log.metric('loss')[1].tolist() == [worker + s for s in range(20)]
+
+
+def test_dir_root_transaction(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    runs = [ThatchRun(root=root) for _ in range(3)]
+    with root.transaction():
+        for run in runs:
+            run.save()
+    assert root.uuids() == [run.uuid for run in runs]
+
+    # a failed batch leaves nothing behind, but can be written again
+    run = ThatchRun(root=root, config_source={'a': 1})
+    with pytest.raises(ValueError):
+        with root.transaction():
+            run.save()
+            raise ValueError
+    assert len(root) == 3
+    run.save()
+    assert len(root.filter(Param('a') == 1)) == 1
+
+
+def test_dir_root_load_runs(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    runs = []
+    for i in range(6):
+        with ThatchRun(root=root, config_source={'i': i}) as run:
+            for step in range(50):
+                run.track(step=step, loss=i + step, note=f'{i}')
+        runs.append(run)
+    uuids = [run.uuid for run in runs]
+
+    loaded = root.load_runs(uuids, executor='process', max_workers=2)
+    assert [run.uuid for run in loaded] == uuids
+    for run, original in zip(loaded, runs):
+        assert run.log == original.log
+        assert run.config == original.config
+    assert root.log_cache.stats()['misses'] == 6
+
+    # decoded logs are reused until their file changes
+    assert root.load_runs(uuids)[0].log is loaded[0].log
+    assert root.log_cache.stats()['hits'] == 6
+    runs[0].root = root
+    runs[0].track(step=50, loss=0.0)
+    runs[0].save()
+    reloaded = root.load_runs(uuids[:2], executor='thread')
+    assert reloaded[0].log == runs[0].log
+    assert reloaded[1].log is loaded[1].log
+
+    # pools are kept for later calls
+    pools = dict(root._pools)
+    root.log_cache.clear()
+    reloaded = root.load_runs(uuids, executor='process', max_workers=2)
+    assert reloaded[0].log == runs[0].log
+    assert root._pools == pools
+    # and by default, a few logs are decoded in this process
+    root.log_cache.clear()
+    assert root.load_runs(uuids)[1].log == runs[1].log
+    assert root._pools == pools
+
+    # the least recently used logs are evicted to stay within the limit
+    root = DirRoot(tmp_path / '.thatch', cache_bytes=2 * loaded[0].log.nbytes)
+    for uuid in uuids:
+        root.load_run(uuid)
+    stats = root.log_cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 4
+    assert stats['bytes'] <= stats['max_bytes']
+    root.load_run(uuids[-1])
+    assert root.log_cache.stats()['hits'] == 1
+
+    with pytest.raises(KeyError):
+        root.load_runs(['missing'])
+
+
+def test_dir_root_compact(tmp_path, monkeypatch):
+    from thatch.track import compact
+
+    # small enough for the index to span several blocks
+    monkeypatch.setattr(compact, 'INDEX_STRIDE', 8)
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root)
+    for step in range(0, 200, 2):
+        run.track(step=step, loss=step / 2, tag=f'{step}')
+        if step % 50 == 0:
+            run.save()
+    run.finish()
+    unfinished = ThatchRun(root=root)
+    unfinished.track(loss=1.0)
+    unfinished.save()
+    assert root.load_run(run.uuid).log == run.log
+
+    assert root.compact_finished() == [run.uuid]
+    assert root.compact_finished() == []
+    segments = list(root.columns_path(run.uuid).glob('*.npz'))
+    assert [p.name for p in segments] == ['000000000000.npz']
+
+    # the whole log is still there, with the compacted columns memory-mapped
+    # (the log cached before compacting isn't used anymore)
+    loaded = root.load_run(run.uuid)
+    assert loaded.log == run.log
+    assert isinstance(loaded.log.columns['loss'].values, np.memmap)
+
+    steps, values = root.read_metric(run.uuid, 'loss', start=51, stop=101)
+    assert isinstance(values, np.memmap)
+    assert steps.tolist() == list(range(52, 101, 2))
+    assert values.tolist() == [s / 2 for s in range(52, 101, 2)]
+    steps, _ = root.read_metric(run.uuid, 'loss', start=0, stop=40, stride=5)
+    assert steps.tolist() == list(range(0, 40, 10))
+    steps, _ = root.read_metric(run.uuid, 'step', start=190)
+    assert steps.tolist() == [190, 192, 194, 196, 198]
+
+    # logging more after compacting, and compacting again
+    run.track(step=200, loss=100.0, tag='200')
+    run.save()
+    steps, values = root.read_metric(run.uuid, 'loss', start=196)
+    assert steps.tolist() == [196, 198, 200] and values[-1] == 100.0
+    superseded = Compacted.latest(root.run_path(run.uuid))
+    assert superseded is not None
+    assert root.compact(run.uuid)
+    root.log_cache.clear()
+    assert root.load_run(run.uuid).log == run.log
+    # the older compaction is kept for a while, for readers which still use it
+    metrics_path = root.run_path(run.uuid) / 'metrics'
+    assert len(list(metrics_path.iterdir())) == 2
+    assert superseded.metric('loss').read(0, 10)[0].tolist() == [0, 2, 4, 6, 8]
+    assert compact.remove_superseded(root.run_path(run.uuid), grace=0) == [
+        superseded.path.name
+    ]
+    assert len(list(metrics_path.iterdir())) == 1
+
+    # records appended while compacting (e.g. from another process) are kept,
+    # even if the segments read are merged meanwhile
+    from thatch.track import dir_root
+
+    other = DirRoot(tmp_path / '.thatch')
+    calls = []
+
+    def write_compacted(run_path, log):
+        if not calls:
+            other.append_log(run.uuid, [{'step': 206, 'loss': 103.0, 'tag': '206'}])
+            other._merge_segments(run.uuid)
+        calls.append(log.n_rows)
+        return compact.write_compacted(run_path, log)
+
+    monkeypatch.setattr(dir_root, 'write_compacted', write_compacted)
+    run.track(step=202, loss=101.0, tag='202')
+    run.save()
+    run.track(step=204, loss=102.0, tag='204')
+    run.save()
+    assert root.compact(run.uuid)
+    # compacted again after the merge, with the appended record
+    assert calls == [len(run.log), len(run.log) + 1]
+    root.log_cache.clear()
+    steps, values = root.read_metric(run.uuid, 'loss', start=200)
+    assert steps.tolist() == [200, 202, 204, 206] and values[-1] == 103.0
+    assert len(root.load_run(run.uuid).log) == len(run.log) + 1
+    assert [p.name for p in root.columns_path(run.uuid).iterdir()] == [
+        '000000000000.npz'
+    ]
+
+
+def test_dir_root_artifacts(tmp_path):
+    import io
+
+    root = DirRoot(tmp_path / '.thatch')
+    reference = bytes(range(256)) * 10_000
+    file_path = tmp_path / 'reference.bin'
+    file_path.write_bytes(reference)
+
+    runs = [ThatchRun(root=root) for _ in range(3)]
+    digests = {
+        runs[0].save_artifact('reference.bin', reference),
+        runs[1].save_artifact('data/reference.bin', io.BytesIO(reference)),
+        runs[2].save_artifact('reference.bin', file_path),
+    }
+    # stored once, however it's written
+    assert len(digests) == 1
+    assert list(root.objects) == list(digests)
+
+    runs[0].save_artifact('checkpoints/1.ckpt', b'checkpoint')
+    assert root.artifacts(runs[0].uuid) == {
+        'checkpoints/1.ckpt': root.objects.put_bytes(b'checkpoint'),
+        'reference.bin': digests.pop(),
+    }
+    assert root.read_artifact(runs[1].uuid, 'data/reference.bin') == reference
+    with pytest.raises(FileNotFoundError):
+        root.read_artifact(runs[1].uuid, 'reference.bin')
+
+    # contents are only removed once no artifact refers to them
+    root.delete_artifact(runs[0].uuid, 'checkpoints/1.ckpt')
+    root.delete_artifact(runs[0].uuid, 'reference.bin')
+    assert root.gc(grace=3600) == []
+    assert len(root.gc(grace=0)) == 1
+    assert root.read_artifact(runs[2].uuid, 'reference.bin') == reference
+
+
+def test_object_store_threads(tmp_path, monkeypatch):
+    import io
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from thatch.track.objects import ObjectStore
+
+    objects = ObjectStore(tmp_path / 'objects')
+    # temporary files' names don't rely on the clock to be unique
+    monkeypatch.setattr(time, 'monotonic_ns', lambda: 0)
+    blobs = [bytes([i]) * 1_000_000 for i in range(32)]
+
+    def put(i: int) -> str:
+        if i % 2:
+            return objects.put_stream(io.BytesIO(blobs[i]))
+        return objects.put_bytes(blobs[i])
+
+    with ThreadPoolExecutor(8) as pool:
+        digests = list(pool.map(put, range(32)))
+    for i, digest in enumerate(digests):
+        assert objects.read(digest) == blobs[i]
+    assert list((tmp_path / 'objects' / 'tmp').iterdir()) == []
+
+
+def test_dir_root_checkpoints(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root)
+    rng = np.random.default_rng(0)
+    state = {
+        # 4 chunks, unchanged between checkpoints
+        'frozen': rng.standard_normal(1 << 20).astype(np.float32),
+        'weights': np.zeros((32, 32)),
+        'optim': {'lr': 0.1, 'steps': [0]},
+    }
+    run.save_checkpoint(state, step=0)
+    n_objects = len(list(root.objects))
+
+    state['weights'] += 1
+    state['optim']['steps'].append(10)
+    run.save_checkpoint(state, step=10)
+    # the changed weights, the rest of the state, and the manifest
+    assert len(list(root.objects)) == n_objects + 3
+    assert root.checkpoints(run.uuid) == [0, 10]
+
+    step, loaded = run.load_checkpoint()
+    assert step == 10
+    assert np.array_equal(loaded['frozen'], state['frozen'])
+    assert np.array_equal(loaded['weights'], state['weights'])
+    assert loaded['optim'] == state['optim']
+    step, loaded = root.load_checkpoint(run.uuid, step=0)
+    assert step == 0 and not loaded['weights'].any()
+
+    # chunks are kept while a manifest refers to them
+    assert root.gc(grace=0) == []
+    root.delete_artifact(run.uuid, 'checkpoints/0.ckpt')
+    assert len(root.gc(grace=0)) == 3
+    assert run.load_checkpoint(10)[0] == 10
+
+    # structured dtypes keep their fields, including nested and padded ones
+    points = np.zeros(
+        4, dtype=[('x', 'f4'), ('y', 'i8'), ('z', [('a', 'u1'), ('b', '>i2', (2,))])]
+    )
+    points['x'], points['y'] = np.arange(4), -np.arange(4)
+    padded = np.zeros(
+        3,
+        dtype=dict(names=['x', 'y'], formats=['f4', 'i8'], offsets=[0, 8], itemsize=24),
+    )
+    padded['y'] = 7
+    run.save_checkpoint({'points': points, 'padded': padded}, step=20)
+    loaded = run.load_checkpoint(20)[1]
+    assert loaded['points'].dtype == points.dtype
+    assert np.array_equal(loaded['points'], points)
+    assert loaded['padded'].dtype == padded.dtype
+    assert loaded['padded']['y'].tolist() == [7, 7, 7]
+
+    # subclasses are pickled as usual; arrays referred to twice stay shared
+    masked = np.ma.masked_array(np.arange(4.0), mask=[0, 1, 0, 1])
+    shared = np.arange(8)
+    run.save_checkpoint({'masked': masked, 'a': shared, 'b': shared}, step=30)
+    loaded = run.load_checkpoint(30)[1]
+    assert isinstance(loaded['masked'], np.ma.MaskedArray)
+    assert loaded['masked'].mask.tolist() == [False, True, False, True]
+    assert loaded['a'] is loaded['b']
+    assert np.array_equal(loaded['a'], shared)
+
+
+def test_dir_root_checkpoint_tensors(tmp_path):
+    torch = pytest.importorskip('torch')
+    run = ThatchRun(root=DirRoot(tmp_path / '.thatch'))
+    weight = torch.nn.Parameter(torch.arange(6.0).reshape(2, 3))
+    state = {
+        'weight': weight,
+        'same': weight,
+        'half': torch.ones(4, dtype=torch.bfloat16),
+        'mask': torch.zeros(3, dtype=torch.bool),
+    }
+    run.save_checkpoint(state, step=0)
+    loaded = run.load_checkpoint(0)[1]
+    assert isinstance(loaded['weight'], torch.nn.Parameter)
+    assert loaded['weight'].requires_grad
+    assert loaded['weight'] is loaded['same']
+    assert torch.equal(loaded['weight'], weight)
+    assert loaded['half'].dtype == torch.bfloat16
+    assert torch.equal(loaded['half'], state['half'])
+    assert not loaded['mask'].requires_grad
+
+
+def test_async_save(tmp_path):
+    root = _SlowRoot(tmp_path / '.thatch')
+    root.unblock.set()
+    run = ThatchRun(root=root, async_save=True, max_in_flight=2)
+    run.save()
+    root.unblock.clear()
+
+    state = {'weights': np.zeros(16)}
+    futures = [run.save_checkpoint(state, step=0)]
+    # saved as it was when saving
+    state['weights'] += 1
+    futures.append(run.save_checkpoint(state, step=1))
+    # both are in flight, so another save waits for one to finish
+    saving = threading.Thread(target=run.save_artifact, args=('viz.png', b'png'))
+    saving.start()
+    saving.join(0.2)
+    assert saving.is_alive()
+    root.unblock.set()
+    saving.join()
+
+    run.flush()
+    assert all(future.done() for future in futures)
+    assert not root.load_checkpoint(run.uuid, step=0)[1]['weights'].any()
+    step, loaded = run.load_checkpoint()
+    assert step == 1 and np.array_equal(loaded['weights'], state['weights'])
+    assert root.read_artifact(run.uuid, 'viz.png') == b'png'
+
+    # errors are raised from the next call
+    run.save_checkpoint({'unpicklable': lambda: None}, step=2)
+    with pytest.raises(RuntimeError):
+        run.flush()
+    run.finish()
+    assert run.saver is not None and run.saver.closed
+    assert root.checkpoints(run.uuid) == [0, 1]
+    with pytest.raises(RuntimeError, match='closed'):
+        run.save_checkpoint(state, step=3)
+
+
+@pytest.mark.parametrize('condition, expected', _CONDITIONS)
+def test_memory_root_filter(condition, expected):
+    root, uuids = _param_root(MemoryRoot())
+    expected = [uuids[i] for i in expected]
+
+    assert root.filter(condition).uuids() == expected
+    assert ThatchRoot.select(root, condition, uuids) == expected
+    assert [(k, g.uuids()) for k, g in root.group_by('optim.name')] == [
+        ('adam', [uuids[0], uuids[2]]),
+        ('sgd', [uuids[1], uuids[3]]),
+        (None, [uuids[4]]),
+    ]
+
+
+@pytest.mark.parametrize('spill', [False, True])
+def test_memory_root(tmp_path, spill):
+    spill_to = DirRoot(tmp_path / '.thatch') if spill else None
+    # about the size of two runs' logs
+    root = MemoryRoot(max_bytes=32_000, spill_to=spill_to)
+    runs = []
+    for lr in [1e-3, 1e-2, 1e-1]:
+        with ThatchRun(root=root, config_source={'lr': lr}) as run:
+            for step in range(300):
+                run.track(step=step, loss=lr * step)
+            run.save_checkpoint({'w': np.full(4, lr)}, step=300)
+        runs.append(run)
+        assert root.nbytes <= 32_000
+
+    # the oldest finished run made room for the last
+    uuids = [run.uuid for run in runs]
+    assert root.uuids() == (uuids if spill else uuids[1:])
+    assert len(root.filter(Param('lr') < 0.05)) == (2 if spill else 1)
+    for run in runs[0 if spill else 1 :]:
+        assert root.load_run(run.uuid).log == run.log
+        assert root.load_checkpoint(run.uuid)[0] == 300
+    agg = root.aggregate('loss', 'max')
+    assert agg['max'][-1] == pytest.approx(29.9)
+    assert agg['count'][0] == len(root)
+
+
+def test_dir_root_follow(tmp_path):
+    from thatch.track.follow import Follower
+
+    root = DirRoot(tmp_path / '.thatch')
+    run = ThatchRun(root=root, config_source={'lr': 0.1})
+    run.track(step=0, loss=1.0)
+    run.save()
+    follower = Follower(root, predicates=(Param('lr') > 0.01,))
+    assert follower.poll() == [(run.uuid, [{'step': 0, 'loss': 1.0}])]
+    assert follower.poll() == []
+
+    # runs started since are followed too, if they match
+    other = ThatchRun(root=root, config_source={'lr': 0.001})
+    other.track(step=0, loss=2.0)
+    other.save()
+    new = ThatchRun(root=root, config_source={'lr': 1.0})
+    new.track(step=0, loss=3.0)
+    new.save()
+    run.track(step=1, loss=0.5)
+    run.finish()
+    assert follower.poll() == [
+        (run.uuid, [{'step': 1, 'loss': 0.5}]),
+        (new.uuid, [{'step': 0, 'loss': 3.0}]),
+    ]
+    assert list(follower.tails) == [new.uuid]
+    assert list(root.follow(run.uuid, from_start=False)) == []
+
+    records = []
+    following = threading.Thread(
+        target=lambda: records.extend(root.follow(new.uuid, interval=0.01))
+    )
+    following.start()
+    for step in range(1, 50):
+        new.track(step=step, loss=3.0 / (step + 1))
+        if step % 10 == 0:
+            new.save()
+    new.finish()
+    following.join(5)
+    assert not following.is_alive()
+    assert records == new.log
+
+
+def test_dir_root_metric_summary(tmp_path):
+    root = DirRoot(tmp_path / '.thatch')
+    with ThatchRun(root=root) as run:
+        for step in range(5000):
+            run.track(step=step, loss=np.sin(step / 100) + step % 7)
+    _, values = root.read_metric(run.uuid, 'loss')
+
+    # computed from the raw values, before compacting
+    summary = root.read_metric_summary(run.uuid, 'loss', points=100)
+    assert len(summary['step']) <= 100
+    assert summary['count'].sum() == 5000
+    assert summary['min'].min() == values.min()
+    assert summary['max'].max() == values.max()
+    assert np.average(summary['mean'], weights=summary['count']) == pytest.approx(
+        values.mean()
+    )
+    # points of the series itself
+    assert np.array_equal(values[summary['lttb_step']], summary['lttb_value'])
+
+    assert root.compact(run.uuid)
+    metric = Compacted.latest(root.run_path(run.uuid)).metric('loss')
+    assert metric.levels == [4, 16, 64]
+    summary = root.read_metric_summary(run.uuid, 'loss', points=100)
+    assert 25 <= len(summary['step']) <= 100 and summary['count'].sum() == 5000
+    for points in [1250, 10_000]:
+        # a level as it is (or the raw values), the same as computed from raw
+        expected = ThatchRoot.read_metric_summary(root, run.uuid, 'loss', points)
+        summary = root.read_metric_summary(run.uuid, 'loss', points)
+        for name in expected:
+            assert np.allclose(summary[name], expected[name]), (points, name)
+    summary = root.read_metric_summary(run.uuid, 'loss', 100, start=1000, stop=2000)
+    assert summary['step'][0] == 1000 and summary['count'].sum() == 1000
+
+
+@pytest.mark.parametrize('async_write', [False, True])
+def test_resource_sampler(tmp_path, async_write):
+    import subprocess
+    import sys
+    import time
+
+    root = DirRoot(tmp_path / '.thatch')
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+    try:
+        with ThatchRun(
+            root=root, sample_resources=0.01, async_write=async_write
+        ) as run:
+            for step in range(20):
+                # with implicit steps, which samples mustn't shift
+                run.track(loss=1 / (step + 1))
+                time.sleep(0.01)
+    finally:
+        child.kill()
+        child.wait()
+
+    overhead = run.summary['resource_sampler']
+    assert overhead['samples'] >= 1 and overhead['cpu_fraction'] < 1
+    log = root.load_run(run.uuid).log
+    # a separate stream, which doesn't add rows to the tracked records
+    assert len(log) == 20 and 'sys/rss' not in log
+    assert list(log.metric('loss')[0]) == list(range(20))
+    assert run.streams['sys'] == root.load_stream(run.uuid, 'sys')
+    samples = root.load_stream(run.uuid, 'sys')
+    _, rss = samples.metric('sys/rss')
+    assert len(rss) == overhead['samples'] and (rss > 0).all()
+    assert samples.metric('sys/children')[1].max() >= 1
+    assert (np.diff(samples.metric('sys/time')[1]) > 0).all()
+    assert len(root.load_stream(run.uuid, 'missing')) == 0
+
+
+def test_resource_sampler_errors(monkeypatch):
+    import time
+
+    import psutil
+
+    from thatch.track.sampler import ResourceSampler
+
+    def denied(self):
+        raise psutil.AccessDenied(self.pid)
+
+    monkeypatch.setattr(psutil.Process, 'num_threads', denied)
+    sampler = ResourceSampler(interval=0.01, batch_size=1000)
+    time.sleep(0.05)
+    samples = sampler.stop()
+    # the other metrics are still sampled, and none are lost unbatched
+    assert len(samples) == sampler.n_samples >= 2
+    assert all('sys/rss' in s and 'sys/threads' not in s for s in samples)
+
+    mem_root = MemoryRoot()
+    with ThatchRun(root=mem_root, sample_resources=0.01) as run:
+        run.track(loss=1.0)
+        time.sleep(0.03)
+    assert len(mem_root.load_run(run.uuid).log) == 1
+    assert mem_root.load_stream(run.uuid, 'sys') == run.streams['sys']
+
+
+def test_step_timing(tmp_path):
+    import time
+
+    from thatch.track.timing import Sketch
+
+    root = DirRoot(tmp_path / '.thatch')
+    with ThatchRun(root=root, timing_every=10) as run:
+        for step in range(25):
+            # with implicit steps, which timing records mustn't shift
+            run.track(loss=1 / (step + 1))
+            with run.timer('load'):
+                time.sleep(0.002)
+            run.step()
+
+    log = root.load_run(run.uuid).log
+    assert len(log) == 25 and log.metric('loss')[0].tolist() == list(range(25))
+    timing = root.load_stream(run.uuid, 'timing')
+    # every 10 steps, and the rest when finishing
+    assert timing.metric('timing/steps_per_sec')[0].tolist() == [10, 20, 25]
+    p50 = timing.metric('timing/load/p50')[1]
+    assert ((p50 >= 0.002) & (p50 < 0.05)).all()
+    summary = run.summary['timing']
+    assert summary['steps'] == 25 and summary['load']['count'] == 25
+    assert summary['step']['p50'] >= summary['load']['p50']
+
+    with ThatchRun(timing_every=1) as run:
+        for step in range(3):
+            run.track(loss=float(step))
+            run.step()
+    assert run.log == [{'loss': 0.0}, {'loss': 1.0}, {'loss': 2.0}]
+    assert len(run.streams['timing']) == 3
+
+    values = np.random.default_rng(0).lognormal(-5, 1, 10_000)
+    sketch = Sketch()
+    for value in values:
+        sketch.add(value)
+    expected = np.quantile(values, [0.5, 0.9, 0.99])
+    np.testing.assert_allclose(sketch.quantiles([0.5, 0.9, 0.99]), expected, rtol=0.02)